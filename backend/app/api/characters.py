@@ -1,18 +1,41 @@
 """
 Character management API endpoints
+
+Handlers run on the async session from ``get_async_db``, so a slow query
+awaits the database instead of blocking the event loop.
 """
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import Optional, List
-import json
+from datetime import timedelta
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import BaseModel, Field, ValidationError
+from typing import Optional, List, Tuple
+import os
 
-from app.database import get_db
-from app.models.character import Character
+from app.database import get_async_db
+from app.models.character import (
+    CHARACTER_CHANGES, CHARACTER_FIELDS, PURGED_TOMBSTONES, ChangeCounter, Character, CharacterTombstone,
+    bump_change_version, purge_through, utcnow,
+)
+from app.responses import EncodedPayload, dumps
+from app.services import hit_points
+from app.services.character_cache import character_cache
+from app.services.table_hub import table_hub
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 100
+
+# Rows per executemany/transaction when importing, and per query when exporting
+TRANSFER_BATCH_SIZE = 500
+MAX_IMPORT_LINE_BYTES = 1024 * 1024
+MAX_REPORTED_ERRORS = 100
+
+# How long deletions are remembered for the /changes feed
+TOMBSTONE_RETENTION = timedelta(days=int(os.getenv("CHARACTER_TOMBSTONE_DAYS", "30")))
+
 
 class CharacterCreate(BaseModel):
     """Request model for creating a character"""
@@ -34,6 +57,13 @@ class CharacterCreate(BaseModel):
     skills: List[str] = []
     feats: List[str] = []
     inventory: List[str] = []
+    
+    def to_row(self) -> dict:
+        """Column values for a new character"""
+        row = self.model_dump()
+        if row["hit_points"] is None:
+            row["hit_points"] = row["max_hit_points"]
+        return row
 
 
 class CharacterUpdate(BaseModel):
@@ -60,117 +90,446 @@ class CharacterUpdate(BaseModel):
 
 class DamageRequest(BaseModel):
     """Request model for applying damage"""
-    damage: int
+    damage: int = Field(ge=0)
+    table_id: Optional[str] = None
 
 
 class HealRequest(BaseModel):
     """Request model for healing"""
-    healing: int
+    healing: int = Field(ge=0)
+    table_id: Optional[str] = None
+
+
+class DamageTarget(BaseModel):
+    """Damage dealt to one character of an area effect"""
+    character_id: int
+    damage: int = Field(ge=0)
+
+
+class AreaDamageRequest(BaseModel):
+    """Request model for damaging many characters at once"""
+    character_ids: List[int] = []
+    damage: int = Field(0, ge=0)
+    targets: List[DamageTarget] = []
+    table_id: Optional[str] = None
+
+
+# Every column, read back with RETURNING or a projected select; the async
+# session cannot lazy-load the deferred JSON columns of an ORM instance
+CHARACTER_COLUMNS = tuple(Character.__table__.c[field] for field in CHARACTER_FIELDS)
 
 
 @router.post("")
-async def create_character(character: CharacterCreate, db: Session = Depends(get_db)):
+async def create_character(character: CharacterCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new character"""
-    db_character = Character(
-        name=character.name,
-        ancestry=character.ancestry,
-        background=character.background,
-        class_name=character.class_name,
-        level=character.level,
-        strength=character.strength,
-        dexterity=character.dexterity,
-        constitution=character.constitution,
-        intelligence=character.intelligence,
-        wisdom=character.wisdom,
-        charisma=character.charisma,
-        hit_points=character.hit_points if character.hit_points is not None else character.max_hit_points,
-        max_hit_points=character.max_hit_points,
-        armor_class=character.armor_class,
-        initiative=character.initiative,
-        skills=json.dumps(character.skills),
-        feats=json.dumps(character.feats),
-        inventory=json.dumps(character.inventory)
-    )
+    await db.execute(bump_change_version())
+    statement = insert(Character.__table__).values(character.to_row()).returning(*CHARACTER_COLUMNS)
+    row = (await db.execute(statement)).one()
+    await db.commit()
+    
+    return Character.row_to_dict(row, CHARACTER_FIELDS)
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate a comma-separated ``fields`` projection (``id`` is always included)"""
+    if not fields:
+        return list(CHARACTER_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in CHARACTER_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s) {unknown}. Must be among: {list(CHARACTER_FIELDS)}"
+        )
+    return ["id"] + [f for f in dict.fromkeys(requested) if f != "id"]
+
+
+@router.post("/import")
+async def import_characters(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Import characters from an NDJSON body (one character object per line)
     
-    db.add(db_character)
-    db.commit()
-    db.refresh(db_character)
+    The body is read as a stream and rows are inserted in batches with
+    executemany, one transaction per batch, so memory stays flat for any
+    roster size. Invalid lines are skipped and reported; ids, timestamps
+    and unknown keys in the input are ignored, so an export can be
+    imported as-is.
+    """
+    table = Character.__table__
+    batch: List[dict] = []
+    imported = 0
+    failed = 0
+    errors: List[dict] = []
     
-    return db_character.to_dict()
+    async def flush():
+        nonlocal imported
+        if batch:
+            await db.execute(bump_change_version())
+            await db.execute(insert(table), batch)
+            await db.commit()
+            imported += len(batch)
+            batch.clear()
+    
+    def reject(line_number: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line_number, "error": message})
+    
+    async def handle(line_number: int, line: bytes):
+        if not line.strip():
+            return
+        try:
+            batch.append(CharacterCreate.model_validate_json(line).to_row())
+        except ValidationError as e:
+            reject(line_number, "; ".join(
+                f"{'.'.join(str(part) for part in error['loc']) or 'line'}: {error['msg']}"
+                for error in e.errors()
+            ))
+            return
+        if len(batch) >= TRANSFER_BATCH_SIZE:
+            await flush()
+    
+    buffer = b""
+    line_number = 0
+    skipping = False  # inside an over-long line
+    async for chunk in request.stream():
+        if skipping:
+            # Drop the rest of the over-long line, already reported once
+            newline = chunk.find(b"\n")
+            if newline < 0:
+                continue
+            chunk = chunk[newline + 1:]
+            line_number += 1
+            skipping = False
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            await handle(line_number, line)
+        if len(buffer) > MAX_IMPORT_LINE_BYTES:
+            reject(line_number + 1, f"Line exceeds {MAX_IMPORT_LINE_BYTES} bytes")
+            buffer = b""
+            skipping = True
+    if buffer and not skipping:
+        await handle(line_number + 1, buffer)
+    await flush()
+    
+    return {
+        "imported": imported,
+        "failed": failed,
+        "errors": errors
+    }
+
+
+@router.get("/export")
+async def export_characters(fields: Optional[str] = None, db: AsyncSession = Depends(get_async_db)):
+    """
+    Stream every character as NDJSON, in id order
+    
+    - **fields**: Comma-separated columns to export (default: all)
+    """
+    columns = parse_fields(fields)
+    selected = [getattr(Character, field) for field in columns]
+    # The request's session is closed before the body streams, so read
+    # through a connection of our own, one keyset page at a time
+    engine = db.bind
+    
+    async def stream():
+        async with engine.connect() as connection:
+            last_id = None
+            while True:
+                query = select(*selected).order_by(Character.id).limit(TRANSFER_BATCH_SIZE)
+                if last_id is not None:
+                    query = query.where(Character.id > last_id)
+                rows = (await connection.execute(query)).all()
+                if not rows:
+                    return
+                for row in rows:
+                    yield dumps(Character.row_to_dict(row, columns)) + b"\n"
+                last_id = rows[-1][0]
+    
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="characters.ndjson"'},
+    )
 
 
 @router.get("")
-async def list_characters(db: Session = Depends(get_db)):
-    """List all characters"""
-    characters = db.query(Character).all()
-    return [char.to_dict() for char in characters]
+async def list_characters(
+    response: Response,
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    fields: Optional[str] = None,
+    level: Optional[int] = None,
+    min_level: Optional[int] = None,
+    max_level: Optional[int] = None,
+    class_name: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    carrying: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    List characters in id order
+    
+    - **cursor** / **limit**: Keyset pagination; pass the **X-Next-Cursor**
+      response header as the next request's cursor. Pages hold 100
+      characters unless **limit** is set; with neither parameter every
+      character is returned
+    - **fields**: Comma-separated columns to return, e.g. ``name,level``
+    - **level**, **min_level**, **max_level**, **class_name**, **name_prefix**:
+      Indexed filters (name prefix is case-insensitive; on SQLite only for
+      ASCII letters)
+    - **carrying**: Only characters with this exact item in their inventory
+    """
+    columns = parse_fields(fields)
+    query = select(*(getattr(Character, field) for field in columns))
+    if cursor is not None:
+        query = query.where(Character.id > cursor)
+    if level is not None:
+        query = query.where(Character.level == level)
+    if min_level is not None:
+        query = query.where(Character.level >= min_level)
+    if max_level is not None:
+        query = query.where(Character.level <= max_level)
+    if class_name is not None:
+        query = query.where(Character.class_name == class_name)
+    if name_prefix:
+        query = query.where(Character.name_starts_with(name_prefix, db.bind.dialect.name))
+    if carrying is not None:
+        try:
+            query = query.where(Character.carrying(carrying, db.bind.dialect.name))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    query = query.order_by(Character.id)
+    if cursor is None and limit is None:
+        # Unpaginated listing, as before pagination was added
+        return [Character.row_to_dict(row, columns) for row in (await db.execute(query)).all()]
+    limit = limit or DEFAULT_PAGE_SIZE
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1][0])
+    return [Character.row_to_dict(row, columns) for row in rows]
+
+
+def version_token(change_version: int, character_id: int) -> str:
+    """Opaque /changes position: a row's change version and id"""
+    return f"{change_version}.{character_id}"
+
+
+def parse_version_token(token: str) -> Tuple[int, int]:
+    """Inverse of ``version_token``"""
+    try:
+        version, _, character_id = token.partition(".")
+        return int(version), int(character_id or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid version token '{token}'")
+
+
+@router.get("/changes")
+async def character_changes(
+    since: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=1000),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Characters created, updated or deleted since a version
+    
+    - **since**: The **version** of the previous response (omit to get everything)
+    - **limit**: Maximum changed characters per response; ask again with the
+      returned version while **more** is true
+    - **fields**: Comma-separated columns to return for changed characters
+    
+    Apply **deleted** before **characters** (a deleted id can be reused).
+    **resync** is true when deletions that old are no longer remembered,
+    and the client should reload the full list.
+    
+    Versions come from a counter bumped inside each write transaction and
+    locked until it commits, so they follow commit order: a transaction
+    still in flight can never commit behind a version already returned.
+    """
+    columns = parse_fields(fields)
+    query = select(*(getattr(Character, field) for field in columns), Character.change_version)
+    tombstones = select(CharacterTombstone.character_id, CharacterTombstone.change_version)
+    resync = False
+    if since is not None:
+        version, last_id = parse_version_token(since)
+        query = query.where(or_(
+            Character.change_version > version,
+            and_(Character.change_version == version, Character.id > last_id),
+        ))
+        tombstones = tombstones.where(CharacterTombstone.change_version > version)
+        counters = dict((await db.execute(select(ChangeCounter.name, ChangeCounter.value))).all())
+        # Deletions that old are forgotten, or the token is not from this database
+        resync = not counters.get(PURGED_TOMBSTONES, 0) <= version <= counters.get(CHARACTER_CHANGES, 0)
+    
+    rows = (await db.execute(query.order_by(Character.change_version, Character.id).limit(limit + 1))).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    deleted = (await db.execute(tombstones.order_by(CharacterTombstone.change_version))).all()
+    
+    token = since
+    if rows:
+        token = version_token(rows[-1].change_version, rows[-1][0])
+    if deleted and not more:
+        # Every change up to now was returned, so the newest deletion may move the cursor on
+        latest = deleted[-1].change_version
+        if token is None or latest > parse_version_token(token)[0]:
+            token = version_token(latest, 0)
+    changed = {row[0] for row in rows}
+    return {
+        "characters": [Character.row_to_dict(row, columns) for row in rows],
+        "deleted": [row.character_id for row in deleted if row.character_id not in changed],
+        "version": token,
+        "more": more,
+        "resync": resync
+    }
+
+
+@router.get("/cache")
+async def character_cache_stats():
+    """Hit/miss statistics of the character read cache"""
+    return character_cache.cache_info()
 
 
 @router.get("/{character_id}")
-async def get_character(character_id: int, db: Session = Depends(get_db)):
-    """Get a specific character"""
-    character = db.query(Character).filter(Character.id == character_id).first()
-    if not character:
-        raise HTTPException(status_code=404, detail="Character not found")
-    return character.to_dict()
+async def get_character(
+    character_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get a specific character
+    
+    Served from a read-through cache that every write invalidates.
+    Responses carry a strong ETag; send it back in **If-None-Match** to get
+    304 Not Modified while the character is unchanged.
+    """
+    payload = character_cache.get(character_id)
+    if payload is None:
+        version = character_cache.version(character_id)
+        row = (await db.execute(select(*CHARACTER_COLUMNS).where(Character.id == character_id))).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Character not found")
+        payload = EncodedPayload(
+            dumps(Character.row_to_dict(row, CHARACTER_FIELDS)),
+            Character.etag(character_id, row.updated_at),
+        )
+        character_cache.put(character_id, version, payload)
+    return payload.response(if_none_match)
 
 
 @router.put("/{character_id}")
 async def update_character(
     character_id: int,
     character_update: CharacterUpdate,
-    db: Session = Depends(get_db)
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a character"""
-    character = db.query(Character).filter(Character.id == character_id).first()
-    if not character:
+    # Update fields if provided, and read the row back in the same statement
+    update_data = character_update.model_dump(exclude_unset=True)
+    if update_data:
+        await db.execute(bump_change_version())
+        statement = (
+            update(Character.__table__)
+            .where(Character.id == character_id)
+            .values(update_data)
+            .returning(*CHARACTER_COLUMNS)
+        )
+    else:
+        statement = select(*CHARACTER_COLUMNS).where(Character.id == character_id)
+    row = (await db.execute(statement)).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Character not found")
+    await db.commit()
+    character_cache.invalidate(character_id)
     
-    # Update fields if provided
-    update_data = character_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        if field in ["skills", "feats", "inventory"]:
-            setattr(character, field, json.dumps(value))
-        else:
-            setattr(character, field, value)
-    
-    db.commit()
-    db.refresh(character)
-    
-    return character.to_dict()
+    response.headers["ETag"] = Character.etag(character_id, row.updated_at)
+    return Character.row_to_dict(row, CHARACTER_FIELDS)
 
 
 @router.delete("/{character_id}")
-async def delete_character(character_id: int, db: Session = Depends(get_db)):
+async def delete_character(character_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a character"""
-    character = db.query(Character).filter(Character.id == character_id).first()
-    if not character:
+    await db.execute(bump_change_version())
+    statement = delete(Character.__table__).where(Character.id == character_id).returning(Character.name)
+    name = (await db.execute(statement)).scalar()
+    if name is None:
         raise HTTPException(status_code=404, detail="Character not found")
+    # Remember the deletion for /changes, and forget ones past retention
+    deleted_at = utcnow()
+    await db.execute(insert(CharacterTombstone).values(character_id=character_id, deleted_at=deleted_at))
+    expired = (
+        delete(CharacterTombstone)
+        .where(CharacterTombstone.deleted_at < deleted_at - TOMBSTONE_RETENTION)
+        .returning(CharacterTombstone.change_version)
+    )
+    purged = [version for version in (await db.execute(expired)).scalars() if version is not None]
+    if purged:
+        await db.execute(purge_through(max(purged)))
+    await db.commit()
+    character_cache.invalidate(character_id)
+    
+    return {"message": f"Character {name} deleted"}
+
+
+def hit_points_changed(characters: List[dict], table_id: Optional[str]):
+    """Invalidate cached sheets and tell the table about new hit points"""
+    character_cache.invalidate(*(character["id"] for character in characters))
+    for character in characters:
+        table_hub.publish(
+            table_id,
+            "hit_points",
+            {field: character[field] for field in ("id", "name", "hit_points", "max_hit_points")},
+            key=("hit_points", character["id"]),
+        )
+
+
+@router.post("/damage")
+async def apply_area_damage(request: AreaDamageRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Damage many characters at once, e.g. a fireball
+    
+    - **character_ids** / **damage**: The same damage to every listed character
+    - **targets**: Per-character damage (e.g. halved on a successful save)
+    - **table_id**: Table whose live session is told about the new hit points
     
-    db.delete(character)
-    db.commit()
+    All targets are updated by one statement in one transaction.
+    """
+    damage = {character_id: request.damage for character_id in request.character_ids}
+    damage.update((target.character_id, target.damage) for target in request.targets)
+    if not damage:
+        raise HTTPException(status_code=400, detail="Provide character_ids or targets")
     
-    return {"message": f"Character {character.name} deleted"}
+    characters, missing = await db.run_sync(hit_points.apply_damage, damage)
+    hit_points_changed(characters, request.table_id)
+    return {
+        "message": f"Applied damage to {len(characters)} characters",
+        "characters": characters,
+        "missing": missing
+    }
 
 
 @router.post("/{character_id}/damage")
 async def apply_damage(
     character_id: int,
     damage_request: DamageRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Apply damage to a character"""
-    character = db.query(Character).filter(Character.id == character_id).first()
-    if not character:
+    characters, _ = await db.run_sync(hit_points.apply_damage, {character_id: damage_request.damage})
+    hit_points_changed(characters, damage_request.table_id)
+    if not characters:
         raise HTTPException(status_code=404, detail="Character not found")
     
-    character.hit_points = max(0, character.hit_points - damage_request.damage)
-    db.commit()
-    db.refresh(character)
-    
     return {
         "message": f"Applied {damage_request.damage} damage",
-        "character": character.to_dict()
+        "character": characters[0]
     }
 
 
@@ -178,18 +537,15 @@ async def apply_damage(
 async def heal_character(
     character_id: int,
     heal_request: HealRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Heal a character"""
-    character = db.query(Character).filter(Character.id == character_id).first()
-    if not character:
+    characters, _ = await db.run_sync(hit_points.apply_healing, {character_id: heal_request.healing})
+    hit_points_changed(characters, heal_request.table_id)
+    if not characters:
         raise HTTPException(status_code=404, detail="Character not found")
     
-    character.hit_points = min(character.max_hit_points, character.hit_points + heal_request.healing)
-    db.commit()
-    db.refresh(character)
-    
     return {
         "message": f"Healed {heal_request.healing} hit points",
-        "character": character.to_dict()
+        "character": characters[0]
     }
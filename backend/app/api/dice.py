@@ -2,9 +2,15 @@
 Dice rolling API endpoints
 """
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from app.services.dice_service import dice_service
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel, Field
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.database import get_db
+from app.services.dice_distribution import summarize
+from app.services.dice_service import MAX_BATCH_SIZE, dice_service
+from app.services.roll_log import query_roll_log, roll_log_writer
 
 router = APIRouter()
 
@@ -12,63 +18,204 @@ router = APIRouter()
 class DiceRollRequest(BaseModel):
     """Request model for dice rolls"""
     notation: str
+    critical: bool = False
+    table_id: Optional[str] = None
+    seed: Optional[int] = None
+
+
+class ReseedRequest(BaseModel):
+    """Request model for re-seeding a table's dice stream"""
+    seed: Optional[int] = None
 
 
 @router.post("/roll")
 async def roll_dice(request: DiceRollRequest):
     """
     Roll dice with standard notation (e.g., "2d6+3", "1d20-1")
+    
+    Also supports multiple terms ("2d6+1d4+3"), keep/drop ("4d6kh3"),
+    exploding dice ("1d6!") and the fatal/deadly traits ("1d8+4 fatal d12"),
+    which apply when **critical** is set.
     """
     try:
-        result = dice_service.roll_dice(request.notation)
+        result = dice_service.roll_dice(
+            request.notation,
+            critical=request.critical,
+            table_id=request.table_id,
+            seed=request.seed,
+        )
         return result
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+class DiceBatchRequest(BaseModel):
+    """Request model for batch dice rolls"""
+    notations: Optional[List[str]] = None
+    notation: Optional[str] = None
+    count: int = Field(1, ge=1, le=MAX_BATCH_SIZE)
+    critical: bool = False
+    detail: bool = False
+    table_id: Optional[str] = None
+    seed: Optional[int] = None
+
+
+@router.post("/roll/batch")
+async def roll_dice_batch(request: DiceBatchRequest):
+    """
+    Roll many dice expressions in one request
+    
+    - **notations**: One notation per roll (e.g., NPC initiatives)
+    - **notation** / **count**: Repeat a single notation ``count`` times
+    - **detail**: Include the individual dice of every roll
+    """
+    try:
+        return dice_service.roll_batch(
+            notations=request.notations,
+            notation=request.notation,
+            count=request.count,
+            critical=request.critical,
+            detail=request.detail,
+            table_id=request.table_id,
+            seed=request.seed,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/roll/advantage")
-async def roll_with_advantage():
+async def roll_with_advantage(table_id: Optional[str] = None, seed: Optional[int] = None):
     """
     Roll d20 with advantage (roll twice, take highest)
     """
-    result = dice_service.roll_with_advantage()
+    result = dice_service.roll_with_advantage(table_id=table_id, seed=seed)
     return result
 
 
 @router.post("/roll/disadvantage")
-async def roll_with_disadvantage():
+async def roll_with_disadvantage(table_id: Optional[str] = None, seed: Optional[int] = None):
     """
     Roll d20 with disadvantage (roll twice, take lowest)
     """
-    result = dice_service.roll_with_disadvantage()
+    result = dice_service.roll_with_disadvantage(table_id=table_id, seed=seed)
     return result
 
 
+@router.get("/tables/{table_id}/rng")
+async def get_table_seed(table_id: str):
+    """
+    Get the seed of a table's last ended dice session
+    
+    Re-seeding the table with this seed replays that session's rolls. The
+    live session's seed is never returned, since it would predict every
+    roll still to come; **active** tells whether one is running.
+    """
+    info = dice_service.session_info(table_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"No dice session at table '{table_id}'")
+    return {"table_id": table_id, **info}
+
+
+@router.delete("/tables/{table_id}/rng")
+async def end_table_session(table_id: str):
+    """
+    End a table's dice session and reveal its seed for replay
+    
+    The table's next roll starts a new session with a fresh seed.
+    """
+    seed = dice_service.end_session(table_id)
+    if seed is None:
+        raise HTTPException(status_code=404, detail=f"No dice session at table '{table_id}'")
+    return {"table_id": table_id, "seed": seed}
+
+
+@router.put("/tables/{table_id}/rng")
+async def reseed_table(table_id: str, request: ReseedRequest):
+    """
+    Re-seed a table's dice stream (a fresh seed is drawn when omitted)
+    """
+    seed = dice_service.reseed(table_id, request.seed)
+    return {"table_id": table_id, "seed": seed}
+
+
 @router.get("/history")
-async def get_roll_history():
+async def get_roll_history(
+    table_id: Optional[str] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
     """
-    Get history of all rolls in current session
+    Get recent rolls for a table, newest first
+    
+    Pass the returned **next_cursor** as **cursor** to read older rolls.
+    Only the most recent rolls of each table are retained.
     """
-    history = dice_service.get_history()
-    return {"history": history, "count": len(history)}
+    return dice_service.history_page(table_id=table_id, cursor=cursor, limit=limit)
 
 
 @router.delete("/history")
-async def clear_roll_history():
+async def clear_roll_history(table_id: Optional[str] = None):
     """
-    Clear roll history
+    Clear roll history for a table
     """
-    dice_service.clear_history()
+    dice_service.clear_history(table_id=table_id)
     return {"message": "Roll history cleared"}
 
 
+@router.get("/log")
+def get_roll_log(
+    table_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """
+    Get persisted rolls in a time range, newest first
+    
+    Unlike **/dice/history**, the log survives restarts.
+    """
+    # A plain def: waiting for the writer and the sync query run in the threadpool
+    roll_log_writer.flush()
+    rolls = query_roll_log(table_id=table_id, since=since, until=until, limit=limit, db=db)
+    return {"rolls": rolls, "count": len(rolls)}
+
+
 @router.get("/average/{notation}")
-async def calculate_average(notation: str):
+async def calculate_average(notation: str, critical: bool = False):
     """
     Calculate average roll for given notation
     """
     try:
-        avg = dice_service.calculate_average(notation)
+        avg = dice_service.calculate_average(notation, critical=critical)
         return {"notation": notation, "average": avg}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/distribution/{notation}")
+async def calculate_distribution(
+    notation: str,
+    critical: bool = False,
+    dc: Optional[List[int]] = Query(None),
+    percentiles: Optional[List[float]] = Query(None),
+    include_pmf: bool = True,
+):
+    """
+    Calculate the exact probability distribution for given notation
+    
+    - **dc**: One or more DCs; returns the chance to meet or beat each
+    - **percentiles**: Percentiles to report (defaults to 5, 25, 50, 75, 95)
+    - **include_pmf**: Include the full PMF/CDF, indexed from **min**
+    """
+    try:
+        distribution = dice_service.calculate_distribution(notation, critical=critical)
+        summary = summarize(
+            distribution,
+            percentiles=percentiles or [5, 25, 50, 75, 95],
+            dcs=dc,
+            include_pmf=include_pmf,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"notation": notation, "critical": critical, **summary}
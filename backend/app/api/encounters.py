@@ -2,21 +2,55 @@
 Encounter generation API endpoints
 """
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
-from app.services.encounter_service import encounter_service
-from app.services.bestiary import BESTIARY, get_monster_by_name, get_monsters_by_type
+from app.database import get_async_db
+from app.models.character import Character
+from app.responses import EncodedCache, dumps
+from app.services.combat_simulator import Combatant, combat_simulator
+from app.services.encounter_service import MAX_BATCH_SIZE, encounter_service
+from app.services.table_hub import table_hub
+from app.services.bestiary import bestiary, get_monster_by_name, get_monsters_by_type, reload_bestiary
+from app.services.bestiary_store import SUMMARY_FIELDS
 
 router = APIRouter()
 
+BESTIARY_PAGE_SIZE = 100
 
-class EncounterRequest(BaseModel):
-    """Request model for encounter generation"""
+# Encoded bestiary pages, stat blocks and type lists, until the next reload
+bestiary_payloads = EncodedCache(bestiary, max_size=512)
+
+
+class EncounterSpec(BaseModel):
+    """Party and constraints for one encounter"""
     party_level: int
-    party_size: int = 4
+    party_size: int = Field(4, ge=1)
     difficulty: str = "moderate"
+    tolerance: int = 0
+    max_monsters: Optional[int] = None
+    required_types: List[str] = []
+    allow_duplicates: bool = True
+
+
+class EncounterRequest(EncounterSpec):
+    """Request model for encounter generation"""
+    seed: Optional[int] = None
+    table_id: Optional[str] = None
+
+
+class EncounterBatchRequest(BaseModel):
+    """Request model for batch encounter generation"""
+    specs: Optional[List[EncounterSpec]] = None
+    spec: Optional[EncounterSpec] = None
+    count: int = Field(1, ge=1, le=MAX_BATCH_SIZE)
+    seed: Optional[int] = None
+    table_id: Optional[str] = None
 
 
 @router.post("/generate")
@@ -27,48 +61,273 @@ async def generate_encounter(request: EncounterRequest):
     - **party_level**: Average level of the party (1-20)
     - **party_size**: Number of characters (1-10)
     - **difficulty**: One of: trivial, low, moderate, severe, extreme
+    - **seed**: Optional seed for a reproducible encounter
+    - **table_id**: Table whose dice stream is used and whose live session
+      receives the encounter
+    - **tolerance**: XP the encounter may fall short of the budget
+    - **max_monsters**: Maximum number of monsters (default: 2 per PC)
+    - **required_types**: Creature types that must each appear
+    - **allow_duplicates**: Allow the same monster more than once
     """
     try:
         encounter = encounter_service.generate_encounter(
             party_level=request.party_level,
             party_size=request.party_size,
-            difficulty=request.difficulty
+            difficulty=request.difficulty,
+            seed=request.seed,
+            table_id=request.table_id,
+            tolerance=request.tolerance,
+            max_monsters=request.max_monsters,
+            required_types=request.required_types,
+            allow_duplicates=request.allow_duplicates,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    table_hub.publish(request.table_id, "encounter", encounter)
+    return encounter
+
+
+class PartyMember(BaseModel):
+    """Inline PC stats for a simulation"""
+    name: str
+    level: int = 1
+    strength: int = 10
+    dexterity: int = 10
+    hit_points: Optional[int] = None
+    max_hit_points: int = 10
+    armor_class: int = 10
+    initiative: int = 0
+
+
+class SimulationRequest(BaseModel):
+    """Request model for combat simulation"""
+    monsters: List[str]
+    character_ids: List[int] = []
+    party: List[PartyMember] = []
+    max_trials: int = Field(10000, ge=1, le=100000)
+    time_budget_ms: int = Field(500, ge=10, le=10000)
+    precision: float = Field(0.02, gt=0, le=0.5)
+    seed: Optional[int] = None
+
+
+@router.post("/simulate")
+async def simulate_encounter(request: SimulationRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Estimate an encounter's difficulty by Monte Carlo simulation
+    
+    - **monsters**: Bestiary names, repeated for multiples
+    - **character_ids** / **party**: Saved characters and/or inline PC stats
+    - **max_trials**: Upper bound on simulated fights
+    - **time_budget_ms**: Stop starting new trials after this long
+    - **precision**: Stop once win and death rates are known to +/- this (95% CI)
+    - **seed**: Optional seed for reproducible trials
+    """
+    party = [Combatant.from_character(member) for member in request.party]
+    if request.character_ids:
+        query = select(Character).where(Character.id.in_(request.character_ids))
+        characters = (await db.execute(query)).scalars().all()
+        found = {character.id: character for character in characters}
+        missing = [cid for cid in request.character_ids if cid not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Character(s) {missing} not found")
+        party.extend(Combatant.from_character(found[cid]) for cid in request.character_ids)
+    
+    monsters = []
+    for name in request.monsters:
+        monster = get_monster_by_name(name)
+        if not monster:
+            raise HTTPException(status_code=404, detail=f"Monster '{name}' not found")
+        monsters.append(Combatant.from_monster(monster))
+    
+    try:
+        result = await run_in_threadpool(
+            combat_simulator.simulate,
+            party,
+            monsters,
+            max_trials=request.max_trials,
+            time_budget=request.time_budget_ms / 1000,
+            precision=request.precision,
+            seed=request.seed,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "party": [member.name for member in party],
+        "monsters": [monster.name for monster in monsters],
+        **result
+    }
+
+
+@router.post("/generate/batch")
+async def generate_encounter_batch(request: EncounterBatchRequest):
+    """
+    Generate many encounters, e.g. every room of a dungeon
+    
+    - **specs**: One encounter spec per room
+    - **spec** / **count**: Repeat a single spec ``count`` times
+    - **seed**: Optional seed for a reproducible batch
+    
+    Streams NDJSON in completion order: one ``{"index", "seed", "encounter"}``
+    line per encounter (or ``{"index", "seed", "error"}`` if its spec is
+    unsatisfiable). Pass an entry's seed to **/generate** to re-roll it alone.
+    Each encounter also goes to the table's live session as it is streamed.
+    """
+    try:
+        results = encounter_service.generate_batch(
+            specs=[spec.model_dump() for spec in request.specs] if request.specs is not None else None,
+            spec=request.spec.model_dump() if request.spec is not None else None,
+            count=request.count,
+            seed=request.seed,
+            table_id=request.table_id,
         )
-        return encounter
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    
+    def stream():
+        for result in results:
+            if "encounter" in result:
+                table_hub.publish(request.table_id, "encounter", result["encounter"])
+            yield dumps(result) + b"\n"
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate a comma-separated ``fields`` projection"""
+    if not fields:
+        return list(SUMMARY_FIELDS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in SUMMARY_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown field(s) {unknown}. Must be among: {list(SUMMARY_FIELDS)}"
+        )
+    return requested
 
 
 @router.get("/bestiary")
-async def get_bestiary():
+async def get_bestiary(
+    cursor: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    fields: Optional[str] = None,
+    type: Optional[str] = None,
+    min_cr: Optional[float] = None,
+    max_cr: Optional[float] = None,
+    name_prefix: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    if_none_match: Optional[str] = Header(None),
+):
     """
-    Get all monsters in the bestiary
+    List monsters in the bestiary
+    
+    - **cursor** / **limit**: Pass the returned **next_cursor** to get the next page
+      (JSON pages default to 100 monsters; NDJSON streams every match)
+    - **fields**: Comma-separated projection, e.g. ``name,cr,xp``
+    - **type**, **min_cr**, **max_cr**, **name_prefix**: Indexed filters
+    - **format**: ``ndjson`` streams one monster per line instead
+    
+    JSON pages carry a strong ETag; send it back in **If-None-Match** to get
+    304 Not Modified until the bestiary is reloaded with different data.
     """
+    columns = parse_fields(fields)
+    if limit is None and format == "json":
+        limit = BESTIARY_PAGE_SIZE
+    if format == "json":
+        payload = bestiary_payloads.get(
+            ("page", tuple(columns), type, min_cr, max_cr, name_prefix, cursor, limit),
+            lambda: bestiary_page(columns, type, min_cr, max_cr, name_prefix, cursor, limit),
+        )
+        return payload.response(if_none_match)
+    
+    rows = bestiary.query(
+        monster_type=type,
+        min_cr=min_cr,
+        max_cr=max_cr,
+        name_prefix=name_prefix,
+    )
+    page, next_cursor = bestiary.page(rows, cursor, limit)
+    store = bestiary.store
+    
+    def stream():
+        for row in page:
+            yield dumps(store.project(row, columns)) + b"\n"
+    headers = {"X-Next-Cursor": str(next_cursor)} if next_cursor is not None else {}
+    return StreamingResponse(stream(), media_type="application/x-ndjson", headers=headers)
+
+
+def bestiary_page(columns, monster_type, min_cr, max_cr, name_prefix, cursor, limit) -> dict:
+    """One JSON page of the bestiary listing"""
+    rows = bestiary.query(
+        monster_type=monster_type,
+        min_cr=min_cr,
+        max_cr=max_cr,
+        name_prefix=name_prefix,
+    )
+    page, next_cursor = bestiary.page(rows, cursor, limit)
+    store = bestiary.store
+    monsters = [store.project(row, columns) for row in page]
     return {
-        "monsters": BESTIARY,
-        "count": len(BESTIARY)
+        "monsters": monsters,
+        "count": len(monsters),
+        "total": len(rows),
+        "next_cursor": next_cursor
+    }
+
+
+@router.post("/bestiary/reload")
+async def reload_bestiary_endpoint():
+    """
+    Reload creature dumps after adding or editing files in the data directory
+    
+    Only the server process that handles the request reloads; restart the
+    server to reload every worker process.
+    """
+    return await run_in_threadpool(reload_bestiary)
+
+
+@router.get("/bestiary/search")
+async def search_bestiary(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    fields: Optional[str] = None,
+):
+    """
+    Ranked, typo-tolerant monster search
+
+    - **q**: Words to match against names, types and stat-block text.
+      The last word also matches as a prefix (search-as-you-type)
+    - **limit**: Maximum number of results
+    - **fields**: Comma-separated projection, e.g. ``name,cr,xp``
+    """
+    results = bestiary.search(q, limit, parse_fields(fields))
+    return {
+        "query": q,
+        "results": results,
+        "count": len(results)
     }
 
 
 @router.get("/bestiary/{monster_name}")
-async def get_monster(monster_name: str):
+async def get_monster(monster_name: str, if_none_match: Optional[str] = Header(None)):
     """
     Get details for a specific monster
     """
-    monster = get_monster_by_name(monster_name)
-    if not monster:
+    payload = bestiary_payloads.get(("monster", monster_name), lambda: get_monster_by_name(monster_name))
+    if payload is None:
         raise HTTPException(status_code=404, detail=f"Monster '{monster_name}' not found")
-    return monster
+    return payload.response(if_none_match)
 
 
 @router.get("/bestiary/type/{monster_type}")
-async def get_monsters_by_type_endpoint(monster_type: str):
+async def get_monsters_by_type_endpoint(monster_type: str, if_none_match: Optional[str] = Header(None)):
     """
     Get all monsters of a specific type
     """
-    monsters = get_monsters_by_type(monster_type)
-    return {
-        "type": monster_type,
-        "monsters": monsters,
-        "count": len(monsters)
-    }
+    def build():
+        monsters = get_monsters_by_type(monster_type)
+        return {
+            "type": monster_type,
+            "monsters": monsters,
+            "count": len(monsters)
+        }
+    return bestiary_payloads.get(("type", monster_type), build).response(if_none_match)
@@ -0,0 +1,287 @@
+"""
+Initiative tracker API endpoints
+"""
+
+from collections import Counter
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel, Field
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional
+
+from app.database import get_async_db
+from app.models.character import Character
+from app.models.initiative import InitiativeSnapshot
+from app.services.bestiary import get_monster_by_name
+from app.services.combat_simulator import Combatant
+from app.services.initiative_tracker import MONSTER, PC, InitiativeTracker, initiative_service
+from app.services.table_hub import table_hub
+
+router = APIRouter()
+
+
+class CombatantSpec(BaseModel):
+    """Inline combatant, e.g. a summon or a PC without a saved sheet"""
+    name: str
+    side: str = Field(MONSTER, pattern=f"^({MONSTER}|{PC})$")
+    modifier: int = 0
+    initiative: Optional[int] = None
+    hp: Optional[int] = None
+
+
+class CombatRequest(BaseModel):
+    """Request model for starting a combat or adding combatants"""
+    character_ids: List[int] = []
+    monsters: List[str] = []
+    combatants: List[CombatantSpec] = []
+    seed: Optional[int] = None
+
+
+class ReadyRequest(BaseModel):
+    """Request model for readying an action"""
+    trigger: str = Field(min_length=1, max_length=200)
+
+
+async def gather_combatants(request: CombatRequest, db: AsyncSession) -> List[Dict]:
+    """Saved characters, bestiary monsters and inline combatants of a request"""
+    combatants = []
+    if request.character_ids:
+        query = select(Character.id, Character.name, Character.initiative, Character.hit_points).where(
+            Character.id.in_(request.character_ids)
+        )
+        found = {row.id: row for row in (await db.execute(query)).all()}
+        missing = [cid for cid in request.character_ids if cid not in found]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Character(s) {missing} not found")
+        for character_id in request.character_ids:
+            row = found[character_id]
+            combatants.append({
+                "name": row.name,
+                "side": PC,
+                "modifier": row.initiative or 0,
+                "character_id": row.id,
+                "hp": row.hit_points,
+            })
+
+    # Number repeated monsters: "Goblin Warrior 1", "Goblin Warrior 2", ...
+    repeats = Counter(name.casefold() for name in request.monsters)
+    seen = Counter()
+    for name in request.monsters:
+        monster = get_monster_by_name(name)
+        if not monster:
+            raise HTTPException(status_code=404, detail=f"Monster '{name}' not found")
+        label = monster["name"]
+        if repeats[name.casefold()] > 1:
+            seen[name.casefold()] += 1
+            label = f"{label} {seen[name.casefold()]}"
+        combatants.append({
+            "name": label,
+            "side": MONSTER,
+            "modifier": Combatant.from_monster(monster).initiative,
+            "hp": monster.get("hp"),
+        })
+
+    combatants.extend(spec.model_dump() for spec in request.combatants)
+    return combatants
+
+
+async def snapshot_version(table_id: str, db: AsyncSession) -> Optional[int]:
+    """Version of the table's stored combat, or None if there is none"""
+    query = select(InitiativeSnapshot.version).where(InitiativeSnapshot.table_id == table_id)
+    return (await db.execute(query)).scalar()
+
+
+async def load_tracker(table_id: str, db: AsyncSession) -> InitiativeTracker:
+    """
+    The table's combat as last saved
+
+    The stored version is checked on every request, so the tracker held in
+    memory is only reused while no other worker has saved over it or ended
+    the combat; otherwise it is restored from the snapshot.
+    """
+    version = await snapshot_version(table_id, db)
+    tracker = initiative_service.get(table_id)
+    if tracker is not None and tracker.version == version:
+        return tracker
+    snapshot = await db.get(InitiativeSnapshot, table_id) if version is not None else None
+    if snapshot is None:
+        if tracker is not None:
+            initiative_service.discard(table_id, tracker)
+        raise HTTPException(status_code=404, detail=f"No combat at table '{table_id}'")
+    tracker = InitiativeTracker.from_snapshot(snapshot.state)
+    tracker.version = snapshot.version
+    initiative_service.put(table_id, tracker)
+    return tracker
+
+
+def turn(tracker: InitiativeTracker) -> Dict:
+    """Round, current combatant and who is up next"""
+    current = tracker.participants.get(tracker.current) if tracker.current is not None else None
+    up_next = tracker.up_next()
+    return {
+        "round": tracker.round,
+        "current": current.to_dict() if current else None,
+        "up_next": up_next.to_dict() if up_next else None,
+    }
+
+
+async def save(table_id: str, tracker: InitiativeTracker, db: AsyncSession) -> Dict:
+    """
+    Snapshot the combat (one row) and tell the table whose turn it is
+
+    The write only lands on the version the tracker was loaded at, so a
+    combat changed or ended meanwhile, by this worker or another, is never
+    overwritten: the request gets a 409. Routes change the tracker held in
+    memory before saving, so if the write fails for any reason it is
+    dropped and the next request restores the stored snapshot.
+    """
+    try:
+        state = tracker.snapshot()
+        if tracker.version:
+            result = await db.execute(
+                update(InitiativeSnapshot)
+                .where(InitiativeSnapshot.table_id == table_id, InitiativeSnapshot.version == tracker.version)
+                .values(state=state, version=tracker.version + 1)
+            )
+            saved = result.rowcount == 1
+        else:
+            db.add(InitiativeSnapshot(table_id=table_id, state=state, version=1))
+            try:
+                await db.flush()
+                saved = True
+            except IntegrityError:
+                saved = False
+        if not saved:
+            await db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail=f"Combat at table '{table_id}' changed or ended meanwhile; reload it and retry",
+            )
+        await db.commit()
+    except BaseException:
+        initiative_service.discard(table_id, tracker)
+        raise
+    tracker.version += 1
+    summary = turn(tracker)
+    table_hub.publish(table_id, "initiative", summary, key=("initiative",))
+    return summary
+
+
+@router.post("/{table_id}")
+async def start_combat(table_id: str, request: CombatRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Start a combat, rolling initiative for everyone in one batch
+
+    - **character_ids**: Saved characters (their initiative modifier is used)
+    - **monsters**: Bestiary names, repeated for multiples
+    - **combatants**: Inline combatants; set **initiative** to skip the roll
+    - **seed**: Optional seed for reproducible initiative
+
+    Replaces any combat already running at the table.
+    """
+    combatants = await gather_combatants(request, db)
+    version = await snapshot_version(table_id, db)
+    try:
+        tracker = initiative_service.start(combatants, table_id=table_id, seed=request.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Replace the stored combat as it was when the request started
+    tracker.version = version or 0
+    await save(table_id, tracker, db)
+    return tracker.order()
+
+
+@router.get("/{table_id}")
+async def get_combat(table_id: str, db: AsyncSession = Depends(get_async_db)):
+    """Get the full turn order of a table's combat"""
+    tracker = await load_tracker(table_id, db)
+    return tracker.order()
+
+
+@router.delete("/{table_id}")
+async def end_combat(table_id: str, db: AsyncSession = Depends(get_async_db)):
+    """End a table's combat"""
+    ended = initiative_service.end(table_id)
+    result = await db.execute(delete(InitiativeSnapshot).where(InitiativeSnapshot.table_id == table_id))
+    await db.commit()
+    if not ended and not result.rowcount:
+        raise HTTPException(status_code=404, detail=f"No combat at table '{table_id}'")
+    return {"message": f"Combat at table '{table_id}' ended"}
+
+
+@router.post("/{table_id}/next")
+async def next_turn(table_id: str, db: AsyncSession = Depends(get_async_db)):
+    """End the current turn and start the next (a new round when everyone has acted)"""
+    tracker = await load_tracker(table_id, db)
+    try:
+        tracker.advance()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await save(table_id, tracker, db)
+
+
+@router.post("/{table_id}/combatants")
+async def add_combatants(table_id: str, request: CombatRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Add combatants mid-fight, e.g. summons or reinforcements
+
+    Those whose initiative has already come up this round act from the next.
+    """
+    # Load the tracker last, so nothing awaits between loading and changing it
+    combatants = await gather_combatants(request, db)
+    tracker = await load_tracker(table_id, db)
+    try:
+        added = initiative_service.roll_in(tracker, combatants, table_id=table_id, seed=request.seed)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"added": [participant.to_dict() for participant in added], **await save(table_id, tracker, db)}
+
+
+@router.delete("/{table_id}/combatants/{combatant_id}")
+async def remove_combatant(table_id: str, combatant_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Remove a combatant, e.g. a defeated minion"""
+    tracker = await load_tracker(table_id, db)
+    try:
+        removed = tracker.remove(combatant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"removed": removed.to_dict(), **await save(table_id, tracker, db)}
+
+
+@router.post("/{table_id}/combatants/{combatant_id}/delay")
+async def delay_turn(table_id: str, combatant_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Delay: leave the order until resuming after some later turn"""
+    tracker = await load_tracker(table_id, db)
+    try:
+        tracker.delay(combatant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await save(table_id, tracker, db)
+
+
+@router.post("/{table_id}/combatants/{combatant_id}/resume")
+async def resume_turn(table_id: str, combatant_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Return from Delay; the combatant acts right after the current turn"""
+    tracker = await load_tracker(table_id, db)
+    try:
+        tracker.resume(combatant_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await save(table_id, tracker, db)
+
+
+@router.post("/{table_id}/combatants/{combatant_id}/ready")
+async def ready_action(
+    table_id: str,
+    combatant_id: int,
+    request: ReadyRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Ready an action with a trigger; it lapses at the combatant's next turn"""
+    tracker = await load_tracker(table_id, db)
+    try:
+        tracker.ready(combatant_id, request.trigger)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await save(table_id, tracker, db)
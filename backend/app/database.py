@@ -1,23 +1,176 @@
 """
 Database configuration and session management
+
+The engine is built from a per-backend profile:
+- SQLite: WAL journaling, synchronous=NORMAL, a page cache, memory-mapped
+  I/O and a busy timeout, set on every new connection, plus a connection
+  pool so readers run concurrently with the writer
+- Postgres: a sized connection pool with pre-ping and recycling
+Every setting can be overridden through environment variables.
+
+Route handlers use the async engine (aiosqlite / asyncpg) through
+``get_async_db``; the sync engine and ``get_db`` remain for scripts,
+background threads and startup DDL.
 """
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 import os
 
 # Get database URL from environment or use default
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/sqlite/pathfinder.db")
 
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+# SQLite profile
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Pool sizing (SQLite files and Postgres)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+def sqlite_pragmas() -> dict:
+    """PRAGMAs applied to every new SQLite connection"""
+    return {
+        "journal_mode": SQLITE_JOURNAL_MODE,
+        "synchronous": SQLITE_SYNCHRONOUS,
+        "busy_timeout": SQLITE_BUSY_TIMEOUT_MS,
+        # Negative sizes are in KiB
+        "cache_size": -SQLITE_CACHE_SIZE_KB,
+        "mmap_size": SQLITE_MMAP_SIZE,
+        "temp_store": "MEMORY",
+    }
+
+
+def is_memory_sqlite(url) -> bool:
+    """Whether a SQLite URL points at an in-memory database"""
+    database = url.database
+    return not database or database == ":memory:" or "mode=memory" in str(url)
+
+
+def engine_options(database_url: str) -> dict:
+    """
+    ``create_engine`` keyword arguments for a database URL's profile
+
+    Args:
+        database_url: SQLAlchemy database URL
+
+    Returns:
+        Dictionary of engine options
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False}}
+        if is_memory_sqlite(url):
+            # Every connection would otherwise get its own empty database
+            options["poolclass"] = StaticPool
+        else:
+            options.update(
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+            )
+        return options
+    if url.get_backend_name() == "postgresql":
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+        }
+    return {"pool_pre_ping": True}
+
+
+def apply_sqlite_pragmas(engine, pragmas: dict):
+    """Run ``pragmas`` on every connection the engine opens"""
+    memory = is_memory_sqlite(engine.url)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                # WAL and mmap do not apply to in-memory databases
+                if memory and name in ("journal_mode", "mmap_size"):
+                    continue
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def async_database_url(database_url: str) -> str:
+    """
+    The same database with its backend's async driver
+
+    ``sqlite://`` becomes ``sqlite+aiosqlite://`` and ``postgresql://``
+    becomes ``postgresql+asyncpg://``; other URLs are returned unchanged.
+    """
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or url.get_driver_name() == driver:
+        return database_url
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def create_database_engine(database_url: str = DATABASE_URL, **overrides):
+    """
+    Create an engine using the profile for its backend
+
+    Args:
+        database_url: SQLAlchemy database URL
+        **overrides: Options replacing the profile's defaults
+
+    Returns:
+        SQLAlchemy Engine
+    """
+    engine = create_engine(database_url, **{**engine_options(database_url), **overrides})
+    if engine.dialect.name == "sqlite":
+        apply_sqlite_pragmas(engine, sqlite_pragmas())
+    return engine
+
+
+def create_async_database_engine(database_url: str = DATABASE_URL, **overrides):
+    """
+    Create an async engine using the profile for its backend
+
+    Args:
+        database_url: SQLAlchemy database URL (sync or async driver)
+        **overrides: Options replacing the profile's defaults
+
+    Returns:
+        SQLAlchemy AsyncEngine
+    """
+    database_url = async_database_url(database_url)
+    options = engine_options(database_url)
+    if "pool_size" in options and make_url(database_url).get_backend_name() == "sqlite":
+        # aiosqlite defaults to NullPool for files; keep the sized pool
+        options["poolclass"] = AsyncAdaptedQueuePool
+    engine = create_async_engine(database_url, **{**options, **overrides})
+    if engine.dialect.name == "sqlite":
+        apply_sqlite_pragmas(engine.sync_engine, sqlite_pragmas())
+    return engine
+
+
 # Create engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
-)
+engine = create_database_engine(DATABASE_URL)
+async_engine = create_async_database_engine(os.getenv("ASYNC_DATABASE_URL", DATABASE_URL))
 
-# Create session factory
+# Create session factories
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay usable after commit; lazy loads are not possible without a greenlet
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Create base class for models
 Base = declarative_base()
@@ -33,3 +186,12 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Dependency function to get an async database session
+    Usage: db: AsyncSession = Depends(get_async_db)
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
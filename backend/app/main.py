@@ -3,19 +3,83 @@ Handy Haversack Haverdashery - Pathfinder 2e Companion App
 Main FastAPI application entry point
 """
 
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import engine, Base
-from app.api import dice, characters, encounters
+from sqlalchemy import func, inspect, text, update
+from sqlalchemy.schema import CreateIndex
+from app.database import async_engine, engine, Base
+from app.models.character import Character, CharacterTombstone, bump_change_version, current_change_version
+from app.api import dice, characters, encounters, initiative
+from app.responses import FastJSONResponse
+from app.services.combat_simulator import combat_simulator
+from app.services.dice_service import dice_service
+from app.services.encounter_service import encounter_service
+from app.services.roll_log import roll_log_writer
+from app.services.table_hub import table_hub
+from app.services.worker_pool import worker_pool
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# Columns added to tables that older databases already have
+NEWER_COLUMNS = (Character.__table__.c.change_version, CharacterTombstone.__table__.c.change_version)
+
+# create_all skips tables that already exist, so add any newer columns and indexes
+with engine.begin() as connection:
+    inspector = inspect(connection)
+    for column in NEWER_COLUMNS:
+        if column.name not in {c["name"] for c in inspector.get_columns(column.table.name)}:
+            column_type = column.type.compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {column.table.name} ADD COLUMN {column.name} {column_type}"))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            # Invoked as a DDL listener so ddl_if() dialect conditions apply
+            CreateIndex(index, if_not_exists=True)(index, connection)
+    # Rows written before updated_at became the version stamp get their creation
+    # time, and rows from before the change counter its current version
+    connection.execute(bump_change_version())
+    connection.execute(
+        update(Character.__table__)
+        .where(Character.updated_at.is_(None))
+        .values(updated_at=func.coalesce(Character.created_at, func.now()))
+    )
+    connection.execute(
+        update(Character.__table__)
+        .where(Character.change_version.is_(None))
+        .values(change_version=current_change_version())
+    )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: persist rolls through the batched background writer
+    roll_log_writer.start()
+    dice_service.roll_log = roll_log_writer
+    # Broadcast rolls, HP changes and encounters to live table sessions
+    table_hub.start()
+    dice_service.hub = table_hub
+    # Spawn the simulation and batch-generation workers up front
+    if combat_simulator.workers > 1 or encounter_service.workers > 1:
+        encounter_service.start_pool()
+    yield
+    # Shutdown: flush pending rolls and stop the worker pool
+    dice_service.hub = None
+    table_hub.stop()
+    dice_service.roll_log = None
+    roll_log_writer.stop()
+    worker_pool.shutdown()
+    await async_engine.dispose()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Handy Haversack Haverdashery API",
     description="API for Pathfinder 2e companion application",
     version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Configure CORS
@@ -25,12 +89,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the browser client read pagination cursors and version stamps
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Include routers
 app.include_router(dice.router, prefix="/dice", tags=["dice"])
 app.include_router(characters.router, prefix="/characters", tags=["characters"])
 app.include_router(encounters.router, prefix="/encounters", tags=["encounters"])
+app.include_router(initiative.router, prefix="/initiative", tags=["initiative"])
+
+
+@app.websocket("/ws/tables/{table_id}")
+async def table_session(websocket: WebSocket, table_id: str):
+    """
+    Live feed of a table's dice rolls, hit point changes and encounters
+    
+    Every message is a JSON object with ``type``, ``table_id`` and ``data``.
+    A ``resync`` message means events were dropped because the client fell
+    behind; reload state over HTTP.
+    """
+    await table_hub.serve(websocket, table_id)
 
 
 @app.get("/health")
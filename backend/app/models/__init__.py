@@ -2,6 +2,8 @@
 Models package initialization
 """
 
-from app.models.character import Character
+from app.models.character import Character, CharacterTombstone
+from app.models.initiative import InitiativeSnapshot
+from app.models.roll_log import RollLog
 
-__all__ = ["Character"]
+__all__ = ["Character", "CharacterTombstone", "InitiativeSnapshot", "RollLog"]
@@ -2,15 +2,107 @@
 Character database model
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import (
+    DDL, JSON, BigInteger, Column, Integer, String, DateTime, Index, and_, case, event, exists, select,
+    type_coerce, update,
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from app.database import Base
 
 
+JSON_FIELDS = ("skills", "feats", "inventory")
+# Deferred group of the JSON columns: loaded together, and only on access
+JSON_GROUP = "collections"
+
+# JSON1 text on SQLite, binary JSONB (indexable with GIN) on Postgres
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# Counter rows: the last change version handed out, and the newest
+# version of a deletion that is no longer remembered
+CHARACTER_CHANGES = "characters"
+PURGED_TOMBSTONES = "character_tombstones_purged"
+
+
+def utcnow() -> datetime:
+    """Current time, set Python-side so every write gets a microsecond stamp"""
+    return datetime.now(timezone.utc)
+
+
+def version_of(stamp: datetime) -> int:
+    """Microseconds since the epoch of a stamp (naive stamps are UTC)"""
+    if stamp is None:
+        return 0
+    if stamp.tzinfo is None:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return (stamp - EPOCH) // timedelta(microseconds=1)
+
+
+def stamp_of(version: int) -> datetime:
+    """Inverse of ``version_of``"""
+    return EPOCH + timedelta(microseconds=version)
+
+
+class ChangeCounter(Base):
+    """Named counters, bumped inside the transactions they version"""
+    
+    __tablename__ = "change_counters"
+    
+    name = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+
+event.listen(ChangeCounter.__table__, "after_create", DDL(
+    f"INSERT INTO change_counters (name, value) VALUES ('{CHARACTER_CHANGES}', 0), ('{PURGED_TOMBSTONES}', 0)"
+))
+
+
+def bump_change_version():
+    """
+    Statement taking the next change version for the current transaction
+    
+    Run it before writing characters or tombstones: the rows written get
+    the new value. The counter row stays locked until commit, so a later
+    version can never commit before an earlier one.
+    """
+    return (
+        update(ChangeCounter.__table__)
+        .where(ChangeCounter.name == CHARACTER_CHANGES)
+        .values(value=ChangeCounter.value + 1)
+    )
+
+
+def current_change_version():
+    """SQL expression for the transaction's change version"""
+    return select(ChangeCounter.value).where(ChangeCounter.name == CHARACTER_CHANGES).scalar_subquery()
+
+
+def purge_through(version: int):
+    """Statement recording that deletions up to ``version`` are forgotten"""
+    counter = ChangeCounter.value
+    return (
+        update(ChangeCounter.__table__)
+        .where(ChangeCounter.name == PURGED_TOMBSTONES)
+        .values(value=case((counter < version, version), else_=counter))
+    )
+
+
 class Character(Base):
     """Character model for Pathfinder 2e characters"""
     
     __tablename__ = "characters"
+    __table_args__ = (
+        # Keyset pagination on id within a level or class filter
+        Index("ix_characters_level_id", "level", "id"),
+        Index("ix_characters_class_id", "class_name", "id"),
+        # Delta feed: rows changed since a change version
+        Index("ix_characters_change_version_id", "change_version", "id"),
+    )
     
     # Primary Key
     id = Column(Integer, primary_key=True, index=True)
@@ -36,38 +128,95 @@ class Character(Base):
     armor_class = Column(Integer, default=10)
     initiative = Column(Integer, default=0)
     
-    # Additional Data (stored as JSON strings)
-    skills = Column(Text, default="[]")  # JSON array
-    feats = Column(Text, default="[]")   # JSON array
-    inventory = Column(Text, default="[]")  # JSON array
+    # Additional Data (JSON arrays)
+    skills = deferred(Column(JSONType, default=list), group=JSON_GROUP)
+    feats = deferred(Column(JSONType, default=list), group=JSON_GROUP)
+    inventory = deferred(Column(JSONType, default=list), group=JSON_GROUP)
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Version stamp: set on insert and bumped by every UPDATE, including Core ones
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+    # Commit-ordered version for the delta feed, taken from the change counter
+    change_version = Column(BigInteger, default=current_change_version(), onupdate=current_change_version())
+    
+    @staticmethod
+    def serialize_field(field: str, value):
+        """Convert one column value to its API representation"""
+        if field in JSON_FIELDS:
+            return value if value is not None else []
+        if field in ("created_at", "updated_at"):
+            return value.isoformat() if value else None
+        return value
+    
+    @classmethod
+    def row_to_dict(cls, row, fields):
+        """Convert a projected row (selected ``fields``, in order) to a dictionary"""
+        return {field: cls.serialize_field(field, value) for field, value in zip(fields, row)}
+    
+    @classmethod
+    def carrying(cls, item: str, dialect: str):
+        """
+        SQL condition matching characters whose inventory contains ``item``
+        
+        Raises:
+            ValueError: If the database has no JSON containment support here
+        """
+        if dialect == "postgresql":
+            # jsonb @> is served by the GIN index
+            return type_coerce(cls.inventory, JSONB).contains([item])
+        if dialect == "sqlite":
+            items = func.json_each(cls.inventory).table_valued("value")
+            return exists().select_from(items).where(items.c.value == item)
+        raise ValueError(f"Inventory queries are not supported on {dialect}")
+    
+    @classmethod
+    def name_starts_with(cls, prefix: str, dialect: str):
+        """
+        Case-insensitive SQL condition on the start of the name
+        
+        A range on lower(name) can use its index, unlike LIKE. The prefix is
+        lowered the way the database's lower() is: SQLite's only folds ASCII,
+        so there non-ASCII letters have to match in their stored case.
+        """
+        if dialect == "sqlite":
+            prefix = "".join(char.lower() if char.isascii() else char for char in prefix)
+        else:
+            prefix = prefix.lower()
+        lowered = func.lower(cls.name)
+        return and_(lowered >= prefix, lowered < prefix + "\U0010ffff")
+    
+    @staticmethod
+    def etag(character_id: int, updated_at) -> str:
+        """Strong ETag of a character's current version"""
+        return f'"{character_id}.{version_of(updated_at)}"'
     
     def to_dict(self):
         """Convert model to dictionary"""
-        import json
-        return {
-            "id": self.id,
-            "name": self.name,
-            "ancestry": self.ancestry,
-            "background": self.background,
-            "class_name": self.class_name,
-            "level": self.level,
-            "strength": self.strength,
-            "dexterity": self.dexterity,
-            "constitution": self.constitution,
-            "intelligence": self.intelligence,
-            "wisdom": self.wisdom,
-            "charisma": self.charisma,
-            "hit_points": self.hit_points,
-            "max_hit_points": self.max_hit_points,
-            "armor_class": self.armor_class,
-            "initiative": self.initiative,
-            "skills": json.loads(self.skills) if self.skills else [],
-            "feats": json.loads(self.feats) if self.feats else [],
-            "inventory": json.loads(self.inventory) if self.inventory else [],
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
-        }
+        return {field: self.serialize_field(field, getattr(self, field)) for field in CHARACTER_FIELDS}
+
+
+class CharacterTombstone(Base):
+    """Deleted character id, kept so the delta feed can report deletions"""
+    
+    __tablename__ = "character_tombstones"
+    
+    id = Column(Integer, primary_key=True)
+    character_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=False, default=utcnow, index=True)
+    change_version = Column(BigInteger, default=current_change_version(), index=True)
+
+
+# Case-insensitive name prefix search
+Index("ix_characters_name_lower", func.lower(Character.name))
+
+# Inventory containment (@>) on Postgres
+Index(
+    "ix_characters_inventory",
+    Character.inventory,
+    postgresql_using="gin",
+    postgresql_ops={"inventory": "jsonb_path_ops"},
+).ddl_if(dialect="postgresql")
+
+# Every column, in API order (the change version is internal to /changes)
+CHARACTER_FIELDS = tuple(column.name for column in Character.__table__.columns if column.name != "change_version")
@@ -0,0 +1,20 @@
+"""
+Initiative snapshot database model
+"""
+
+from sqlalchemy import Column, DateTime, Integer, String
+
+from app.database import Base
+from app.models.character import JSONType, utcnow
+
+
+class InitiativeSnapshot(Base):
+    """Latest state of a table's combat, so it survives a restart"""
+    
+    __tablename__ = "initiative_snapshots"
+    
+    table_id = Column(String(100), primary_key=True)
+    state = Column(JSONType, nullable=False)
+    # Bumped on every save; a write only lands on the version it was based on
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
@@ -0,0 +1,36 @@
+"""
+Roll log database model
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from app.database import Base
+
+
+class RollLog(Base):
+    """Persistent record of a single dice roll"""
+    
+    __tablename__ = "roll_log"
+    __table_args__ = (
+        Index("ix_roll_log_table_created", "table_id", "created_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    table_id = Column(String(100), nullable=False, default="default")
+    notation = Column(String(100), nullable=False)
+    kind = Column(String(20), nullable=False, default="roll")
+    total = Column(Integer, nullable=False)
+    rolls = Column(Text, default="[]")  # JSON array
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    
+    def to_dict(self):
+        """Convert model to dictionary"""
+        import json
+        return {
+            "id": self.id,
+            "table_id": self.table_id,
+            "notation": self.notation,
+            "type": self.kind,
+            "total": self.total,
+            "rolls": json.loads(self.rolls) if self.rolls else [],
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
@@ -0,0 +1,158 @@
+"""
+Fast JSON serialization for API responses
+
+Responses are encoded with orjson when it is installed, and with the
+standard library ``json`` module otherwise. Payloads that only change when
+the bestiary is reloaded are encoded once and served as ready-made bytes
+from an ``EncodedCache``, together with a strong ETag so conditional GETs
+can be answered with 304 Not Modified.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None
+
+
+JSON_MEDIA_TYPE = "application/json"
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(value) -> bytes:
+    """Encode a JSON-compatible value as compact UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.dumps(value, option=_ORJSON_OPTIONS)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with ``dumps`` (orjson when available)"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def encoded_response(body: bytes, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Response for an already-encoded JSON body"""
+    return Response(content=body, status_code=status_code, headers=headers, media_type=JSON_MEDIA_TYPE)
+
+
+def content_etag(body: bytes) -> str:
+    """Strong ETag derived from a response body"""
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an ``If-None-Match`` header matches ``etag``
+
+    Uses the weak comparison RFC 9110 prescribes for If-None-Match, so a
+    ``W/`` prefix on either side is ignored.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str) -> Response:
+    """304 Not Modified response for a matching conditional GET"""
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+class EncodedPayload(NamedTuple):
+    """Encoded JSON body and its ETag"""
+    body: bytes
+    etag: str
+
+    def response(self, if_none_match: Optional[str] = None) -> Response:
+        """The payload, or 304 if the client already has this version"""
+        if etag_matches(if_none_match, self.etag):
+            return not_modified(self.etag)
+        return encoded_response(self.body, headers={"ETag": self.etag})
+
+
+class EncodedCache:
+    """
+    LRU cache of encoded JSON payloads, emptied whenever ``source.generation``
+    changes (e.g. the bestiary is reloaded)
+    """
+
+    def __init__(self, source, max_size: int = 256):
+        self.source = source
+        self.max_size = max_size
+        self._payloads: "OrderedDict[tuple, EncodedPayload]" = OrderedDict()
+        self._generation = None
+        self._hits = 0
+        self._misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, build: Callable[[], object]) -> Optional[EncodedPayload]:
+        """
+        Encoded payload for ``key``, building and encoding it on a miss
+
+        Args:
+            key: Hashable description of the payload
+            build: Returns the value to encode, or None if there is none
+
+        Returns:
+            EncodedPayload, or None if ``build`` returned None
+        """
+        generation = self.source.generation
+        with self._lock:
+            if self._generation != generation:
+                self._payloads.clear()
+                self._generation = generation
+            payload = self._payloads.get(key)
+            if payload is not None:
+                self._payloads.move_to_end(key)
+                self._hits += 1
+                return payload
+            self._misses += 1
+
+        value = build()
+        if value is None:
+            return None
+        body = dumps(value)
+        payload = EncodedPayload(body, content_etag(body))
+        with self._lock:
+            # Drop payloads built from a bestiary that was reloaded meanwhile
+            if self._generation == generation == self.source.generation and self.max_size > 0:
+                self._payloads[key] = payload
+                if len(self._payloads) > self.max_size:
+                    self._payloads.popitem(last=False)
+        return payload
+
+    def cache_info(self) -> Dict:
+        """Payload cache statistics"""
+        with self._lock:
+            return {
+                "size": len(self._payloads),
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "generation": self._generation,
+            }
+
+    def clear(self):
+        """Drop every cached payload"""
+        with self._lock:
+            self._payloads.clear()
@@ -3,6 +3,8 @@ Bestiary data for Pathfinder 2e monsters
 Each monster has: name, CR, XP, type, and basic stats
 """
 
+from app.services.bestiary_store import Bestiary
+
 BESTIARY = [
     # CR 0-1 Creatures
     {"name": "Goblin Warrior", "cr": 0.5, "xp": 20, "type": "Humanoid", "hp": 15, "ac": 16},
@@ -48,19 +50,31 @@ BESTIARY = [
 ]
 
 
+# Built-in monsters plus every creature dump in data/json
+bestiary = Bestiary(BESTIARY)
+
+
 def get_monster_by_name(name: str) -> dict:
     """Get monster by name"""
-    for monster in BESTIARY:
-        if monster["name"].lower() == name.lower():
-            return monster
-    return None
+    return bestiary.get(name)
 
 
 def get_monsters_by_type(monster_type: str) -> list:
     """Get all monsters of a specific type"""
-    return [m for m in BESTIARY if m["type"].lower() == monster_type.lower()]
+    return bestiary.of_type(monster_type)
 
 
 def get_monsters_by_cr_range(min_cr: float, max_cr: float) -> list:
     """Get monsters within CR range"""
-    return [m for m in BESTIARY if min_cr <= m["cr"] <= max_cr]
+    return bestiary.cr_range(min_cr, max_cr)
+
+
+def reload_bestiary() -> dict:
+    """
+    Reload creature dumps from the data directory
+
+    Caches keyed on the bestiary generation (encounter solvers, encoded
+    payloads, worker processes) drop their entries on next use.
+    """
+    count = bestiary.reload()
+    return {"count": count, "generation": bestiary.generation}
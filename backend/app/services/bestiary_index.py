@@ -0,0 +1,74 @@
+"""
+Precomputed lookup indexes over the bestiary store
+
+Built once each time the bestiary is loaded, so lookups never scan or
+case-fold the full monster list. Indexes hold row numbers into the
+columnar store rather than monster dicts:
+- case-folded name -> row
+- case-folded type -> rows
+- rows sorted by CR, answering range queries with bisect
+- rows sorted by case-folded name, answering prefix queries with bisect
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence
+
+
+class BestiaryIndex:
+    """Name, type and CR indexes over a BestiaryStore"""
+
+    def __init__(self, store):
+        self.by_name: Dict[str, int] = {}
+        self.by_type: Dict[str, array] = {}
+        self.type_ids: Dict[str, int] = {}
+        self.type_of = array("l")
+        folded_names = []
+        for row, (name, monster_type) in enumerate(zip(store.names, store.types)):
+            folded = name.casefold()
+            folded_names.append(folded)
+            self.by_name.setdefault(folded, row)
+            key = monster_type.casefold()
+            rows = self.by_type.get(key)
+            if rows is None:
+                rows = self.by_type[key] = array("l")
+                self.type_ids[key] = len(self.type_ids)
+            rows.append(row)
+            self.type_of.append(self.type_ids[key])
+
+        order = sorted(range(len(folded_names)), key=folded_names.__getitem__)
+        self.names_sorted: List[str] = [folded_names[row] for row in order]
+        self.by_name_sorted = array("l", order)
+
+        # sorted() is stable, so equal CRs keep load order
+        crs = store.cr
+        self.by_cr = array("l", sorted(range(len(crs)), key=crs.__getitem__))
+        self.crs = array("d", (crs[row] for row in self.by_cr))
+
+    def __len__(self) -> int:
+        return len(self.by_cr)
+
+    def get(self, name: str) -> Optional[int]:
+        """Row of the monster with this name (case-insensitive), or None"""
+        return self.by_name.get(name.casefold())
+
+    def of_type(self, monster_type: str) -> Sequence[int]:
+        """Rows of monsters of this type (case-insensitive)"""
+        return self.by_type.get(monster_type.casefold(), ())
+
+    def cr_range(self, min_cr: Optional[float] = None, max_cr: Optional[float] = None) -> Sequence[int]:
+        """Rows with min_cr <= CR <= max_cr, in CR order"""
+        start = 0 if min_cr is None else bisect_left(self.crs, min_cr)
+        stop = len(self.crs) if max_cr is None else bisect_right(self.crs, max_cr)
+        return self.by_cr[start:stop]
+
+    def name_prefix(self, prefix: str) -> Sequence[int]:
+        """Rows whose name starts with ``prefix`` (case-insensitive), in name order"""
+        prefix = prefix.casefold()
+        start = bisect_left(self.names_sorted, prefix)
+        stop = bisect_left(self.names_sorted, prefix + "\U0010ffff", start)
+        return self.by_name_sorted[start:stop]
+
+    def type_id(self, monster_type: str) -> Optional[int]:
+        """Numeric id of a type (case-insensitive), or None if unknown"""
+        return self.type_ids.get(monster_type.casefold())
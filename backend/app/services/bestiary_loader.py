@@ -0,0 +1,285 @@
+"""
+Streaming loader for creature JSON dumps
+
+Files are read in fixed-size chunks and decoded one creature at a time,
+so a dump with tens of thousands of full stat blocks never has to fit in
+memory. Each record is yielded with its byte offset and length, so the
+full stat block can be re-read lazily later.
+
+Supported layouts:
+- ``*.json``: a top-level array of creatures, or an object whose first
+  array holds the creatures (e.g. ``{"monsters": [...]}``)
+- ``*.ndjson`` / ``*.jsonl``: one creature object per line
+
+Malformed NDJSON lines are logged and skipped; a malformed array stops
+its file at the last good record.
+"""
+
+import codecs
+import json
+import logging
+import os
+import re
+from fractions import Fraction
+from typing import Dict, Iterator, Optional, Tuple
+
+
+CHUNK_SIZE = 64 * 1024
+NDJSON_EXTENSIONS = (".ndjson", ".jsonl")
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\r\n"
+# A value cut off by the end of the buffer fails at most this close to the
+# end (e.g. a partial "\uXXXX" escape, literal or exponent) or as an
+# unterminated string; errors further back are malformed records
+_TRUNCATION_SLACK = 16
+# Leading integer of values like "50 (7d10)"
+_LEADING_INT = re.compile(r"\s*([+-]?\d+)")
+
+logger = logging.getLogger(__name__)
+
+
+def xp_for_cr(cr: float) -> int:
+    """
+    XP value for a challenge rating, following the bestiary's scale
+
+    Odd CRs double from 40 (1 -> 40, 3 -> 80, ...), even CRs double from
+    60 (2 -> 60, 4 -> 120, ...); fractional CRs scale down from CR 1.
+    """
+    if cr < 1:
+        return max(5, int(round(40 * cr)))
+    level = int(cr)
+    if level % 2:
+        return 40 * 2 ** ((level - 1) // 2)
+    return 60 * 2 ** ((level - 2) // 2)
+
+
+def parse_cr(value) -> float:
+    """CR or level as a float, accepting fractions such as ``"1/2"``"""
+    if isinstance(value, str):
+        return float(Fraction(value.strip()))
+    return float(value)
+
+
+def parse_stat(value, field: str) -> int:
+    """
+    Integer stat, accepting stat-block text such as ``"50 (7d10)"``
+
+    Raises:
+        ValueError: If the value is missing or has no leading integer
+    """
+    if value is None:
+        raise ValueError(f"missing {field}")
+    if isinstance(value, str):
+        match = _LEADING_INT.match(value)
+        if not match:
+            raise ValueError(f"invalid {field}: {value!r}")
+        return int(match.group(1))
+    return int(value)
+
+
+def normalize_record(record: Dict) -> Optional[Dict]:
+    """
+    Extract the indexed summary fields from a raw creature record
+
+    Returns:
+        Summary dict, or None if the record has no name or CR/level
+
+    Raises:
+        ValueError: If a field is malformed or hit points are missing
+        TypeError: If a field has the wrong JSON type
+    """
+    name = record.get("name")
+    cr = record.get("cr", record.get("level"))
+    if not name or cr is None:
+        return None
+    cr = parse_cr(cr)
+    xp = record.get("xp")
+    return {
+        "name": str(name),
+        "cr": cr,
+        "xp": parse_stat(xp, "xp") if xp else xp_for_cr(cr),
+        "type": str(record.get("type") or "Unknown"),
+        "hp": parse_stat(record.get("hp", record.get("hit_points")), "hp"),
+        "ac": parse_stat(record.get("ac", record.get("armor_class", 0)), "ac"),
+    }
+
+
+class _ChunkReader:
+    """Text buffer over a binary file that tracks byte offsets"""
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.offset = 0  # byte offset of buffer[pos]
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Read another chunk, dropping consumed text; False at end of file"""
+        if self.eof:
+            return False
+        data = self.handle.read(CHUNK_SIZE)
+        self.eof = not data
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+        return bool(data)
+
+    def advance(self, end: int):
+        """Move the read position to ``end``"""
+        self.offset += len(self.buffer[self.pos:end].encode("utf-8"))
+        self.pos = end
+
+    def skip(self, characters: str) -> Optional[str]:
+        """Skip characters from ``characters``; return the next one (None at EOF)"""
+        while True:
+            index = self.pos
+            while index < len(self.buffer) and self.buffer[index] in characters:
+                index += 1
+            self.offset += index - self.pos  # skipped characters are ASCII
+            self.pos = index
+            if index < len(self.buffer):
+                return self.buffer[index]
+            if not self.fill():
+                return None
+
+    def seek_char(self, char: str):
+        """Advance to the next occurrence of ``char``"""
+        while True:
+            index = self.buffer.find(char, self.pos)
+            if index >= 0:
+                self.advance(index)
+                return
+            self.advance(len(self.buffer))
+            if not self.fill():
+                raise ValueError(f"Expected {char!r} before end of file")
+
+    def line_end(self) -> int:
+        """Index of the end of the current line, reading more as needed"""
+        scanned = self.pos
+        while True:
+            index = self.buffer.find("\n", scanned)
+            if index >= 0:
+                return index
+            # fill() drops consumed text, so the buffer restarts at pos
+            scanned = len(self.buffer) - self.pos
+            if not self.fill():
+                return len(self.buffer)
+
+    def expect(self, char: str):
+        """Skip whitespace and consume ``char``"""
+        if self.skip(_WHITESPACE) != char:
+            raise ValueError(f"Expected {char!r} at byte {self.offset}")
+        self.advance(self.pos + 1)
+
+    def decode(self) -> Tuple[object, int, int]:
+        """
+        Decode the JSON value at the read position
+
+        Raises:
+            json.JSONDecodeError: As soon as the value is malformed, without
+                reading the rest of the file
+        """
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                truncated = (
+                    e.pos >= len(self.buffer) - _TRUNCATION_SLACK
+                    or e.msg.startswith("Unterminated string")
+                )
+                if not truncated or not self.fill():
+                    raise
+                continue
+            # A number could continue into the next chunk
+            if end == len(self.buffer) and not self.eof and not isinstance(value, (dict, list)):
+                self.fill()
+                continue
+            offset = self.offset
+            self.advance(end)
+            return value, offset, self.offset - offset
+
+
+def _seek_wrapped_array(reader: _ChunkReader):
+    """Move to the first array-valued member of the top-level object"""
+    reader.expect("{")
+    while True:
+        if reader.skip(_WHITESPACE + ",") != '"':
+            raise ValueError("Expected an object member holding the creature array")
+        reader.decode()  # member name
+        reader.expect(":")
+        if reader.skip(_WHITESPACE) == "[":
+            return
+        reader.decode()  # other member, e.g. metadata
+
+
+def _iter_array(reader: _ChunkReader) -> Iterator[Tuple[Dict, int, int]]:
+    first = reader.skip(_WHITESPACE)
+    if first == "{":
+        # Wrapped dump: stream the first array inside the object
+        _seek_wrapped_array(reader)
+    elif first != "[":
+        raise ValueError("Expected a JSON array of creatures")
+    reader.advance(reader.pos + 1)
+
+    while True:
+        token = reader.skip(_WHITESPACE + ",")
+        if token is None:
+            raise ValueError("Unterminated creature array")
+        if token == "]":
+            return
+        value, offset, length = reader.decode()
+        if isinstance(value, dict):
+            yield value, offset, length
+
+
+def _iter_lines(reader: _ChunkReader, path: str) -> Iterator[Tuple[Dict, int, int]]:
+    while reader.skip(_WHITESPACE) is not None:
+        end = reader.line_end()
+        line = reader.buffer[reader.pos:end]
+        offset = reader.offset
+        reader.advance(end)
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError as e:
+            logger.warning("Skipping malformed line at byte %d of %s: %s", offset, path, e)
+            continue
+        if isinstance(value, dict):
+            yield value, offset, reader.offset - offset
+
+
+def iter_creature_records(path: str) -> Iterator[Tuple[Dict, int, int]]:
+    """
+    Stream creature records from a JSON or NDJSON file
+
+    Yields:
+        Tuples of (raw record, byte offset, byte length)
+
+    Raises:
+        ValueError: If the file is not a supported creature dump
+    """
+    with open(path, "rb") as handle:
+        reader = _ChunkReader(handle)
+        if path.lower().endswith(NDJSON_EXTENSIONS):
+            yield from _iter_lines(reader, path)
+        else:
+            yield from _iter_array(reader)
+
+
+def read_record(path: str, offset: int, length: int) -> Dict:
+    """Re-read one record previously yielded by iter_creature_records"""
+    with open(path, "rb") as handle:
+        handle.seek(offset)
+        return json.loads(handle.read(length))
+
+
+def list_data_files(directory: str):
+    """Creature dump files in a directory, in name order"""
+    if not os.path.isdir(directory):
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.lower().endswith((".json",) + NDJSON_EXTENSIONS)
+    ]
@@ -0,0 +1,324 @@
+"""
+Ranked, typo-tolerant full-text search over the bestiary
+
+An in-memory inverted index built alongside the bestiary store:
+- every distinct word (from names, types and stat-block text) gets a
+  term id; each term's postings are the rows containing it, with the
+  best field it appears in (name > type > text)
+- a trigram index over the vocabulary (not over documents) finds the
+  terms within a small edit distance of a misspelled query word
+- the last query word also matches as a prefix, for search-as-you-type
+
+Results are ranked by how many query words matched, then by a
+field-weighted, IDF-scaled score. With NumPy installed, scores are
+accumulated in dense arrays so words that appear in every stat block
+cost one vectorized pass instead of a Python loop per row.
+"""
+
+import heapq
+import math
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when NumPy is absent
+    np = None
+
+
+NAME_WEIGHT = 3
+TYPE_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+MAX_PREFIX_TERMS = 64
+# Closest terms by shared trigrams that get a full edit-distance check
+MAX_FUZZY_CANDIDATES = 256
+EXPANSION_CACHE_SIZE = 1024
+
+_WORD = re.compile(r"[^\W_]+")
+# Top-level fields indexed on their own, or that carry no searchable text
+_SKIP_KEYS = {"name", "type", "cr", "level", "xp", "hp", "hit_points", "ac", "armor_class"}
+
+
+def tokenize(text: str) -> List[str]:
+    """Case-folded words of a string"""
+    return _WORD.findall(text.casefold())
+
+
+def trigrams(term: str) -> List[str]:
+    """Distinct trigrams of a term padded with ``$`` at both ends"""
+    padded = f"${term}$"
+    return list(dict.fromkeys(padded[i:i + 3] for i in range(len(padded) - 2)))
+
+
+def max_edits(term: str) -> int:
+    """Typos tolerated in a query word of this length"""
+    if len(term) <= 3:
+        return 0
+    if len(term) <= 6:
+        return 1
+    return 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Optimal string alignment distance between ``a`` and ``b``
+
+    Counts insertions, deletions, substitutions and adjacent
+    transpositions. Stops early and returns ``limit + 1`` once the
+    distance is known to exceed ``limit``.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def _strings(value) -> Iterable[str]:
+    """Every string nested inside a stat-block value"""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+
+
+class SearchIndex:
+    """Inverted word index with a trigram index over its vocabulary"""
+
+    def __init__(self):
+        self.term_ids: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.postings: List[array] = []
+        self.weights: List[array] = []
+        self.documents = 0
+        self._sorted_terms: List[str] = []
+        self._sorted_ids = array("l")
+        self._trigrams: Dict[str, array] = {}
+        self._lengths = None
+        self._expansions: "OrderedDict[Tuple[str, bool], List[Tuple[int, float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, row: int, record: Dict):
+        """
+        Index one creature record
+
+        Rows must be added in increasing order so postings stay sorted.
+        """
+        fields: Dict[str, int] = {}
+        text = (item for key, item in record.items() if key not in _SKIP_KEYS)
+        for word in tokenize(" ".join(_strings(list(text)))):
+            fields.setdefault(word, TEXT_WEIGHT)
+        for word in tokenize(str(record.get("type") or "")):
+            fields[word] = TYPE_WEIGHT
+        for word in tokenize(str(record.get("name") or "")):
+            fields[word] = NAME_WEIGHT
+
+        for word, weight in fields.items():
+            term_id = self.term_ids.get(word)
+            if term_id is None:
+                term_id = self.term_ids[word] = len(self.terms)
+                self.terms.append(sys.intern(word))
+                self.postings.append(array("l"))
+                self.weights.append(array("b"))
+            self.postings[term_id].append(row)
+            self.weights[term_id].append(weight)
+        self.documents = max(self.documents, row + 1)
+
+    def finish(self) -> "SearchIndex":
+        """Build the vocabulary indexes once every record is added"""
+        order = sorted(range(len(self.terms)), key=self.terms.__getitem__)
+        self._sorted_terms = [self.terms[term_id] for term_id in order]
+        self._sorted_ids = array("l", order)
+        grams: Dict[str, array] = {}
+        for term_id, term in enumerate(self.terms):
+            for gram in trigrams(term):
+                ids = grams.get(gram)
+                if ids is None:
+                    ids = grams[gram] = array("l")
+                ids.append(term_id)
+        self._trigrams = grams
+        if np is not None:
+            # Zero-copy views, so the vectorized paths can index with them
+            self.postings = [np.frombuffer(rows, dtype=np.dtype("l")) for rows in self.postings]
+            self.weights = [np.frombuffer(weights, dtype=np.int8) for weights in self.weights]
+            self._trigrams = {gram: np.frombuffer(ids, dtype=np.dtype("l")) for gram, ids in grams.items()}
+            self._lengths = np.fromiter((len(term) for term in self.terms), dtype=np.int32, count=len(self.terms))
+        self._expansions.clear()
+        return self
+
+    def _idf(self, term_id: int) -> float:
+        return math.log(1 + self.documents / len(self.postings[term_id]))
+
+    def _prefix_terms(self, prefix: str) -> List[int]:
+        start = bisect_left(self._sorted_terms, prefix)
+        stop = bisect_left(self._sorted_terms, prefix + "\U0010ffff", start)
+        return list(self._sorted_ids[start:min(stop, start + MAX_PREFIX_TERMS)])
+
+    def _fuzzy_terms(self, word: str) -> List[Tuple[int, int]]:
+        """Terms within ``max_edits(word)`` typos, as (term id, distance)"""
+        limit = max_edits(word)
+        if not limit:
+            return []
+        grams = trigrams(word)
+        # q-gram lemma: each edit destroys at most three trigrams
+        needed = max(1, len(grams) - 3 * limit)
+        lists = [self._trigrams[gram] for gram in grams if gram in self._trigrams]
+        if not lists:
+            return []
+        if np is not None:
+            shared = np.bincount(np.concatenate(lists), minlength=len(self.terms))
+            close = np.abs(self._lengths - len(word)) <= limit
+            candidates = np.flatnonzero((shared >= needed) & close)
+            if len(candidates) > MAX_FUZZY_CANDIDATES:
+                nearest = np.argpartition(-shared[candidates], MAX_FUZZY_CANDIDATES - 1)
+                candidates = candidates[nearest[:MAX_FUZZY_CANDIDATES]]
+            candidates = candidates.tolist()
+        else:
+            counts: Dict[int, int] = {}
+            for ids in lists:
+                for term_id in ids:
+                    counts[term_id] = counts.get(term_id, 0) + 1
+            candidates = heapq.nlargest(
+                MAX_FUZZY_CANDIDATES,
+                (term_id for term_id, count in counts.items() if count >= needed),
+                key=counts.__getitem__,
+            )
+        matches = []
+        for term_id in candidates:
+            distance = edit_distance(word, self.terms[term_id], limit)
+            if 0 < distance <= limit:
+                matches.append((term_id, distance))
+        return matches
+
+    def expand(self, word: str, prefix: bool = False) -> List[Tuple[int, float]]:
+        """
+        Vocabulary terms a query word matches, with a similarity in (0, 1]
+
+        Exact matches score 1, prefix completions and typo corrections
+        score less the further they are from the query word.
+        """
+        key = (word, prefix)
+        with self._lock:
+            cached = self._expansions.get(key)
+            if cached is not None:
+                self._expansions.move_to_end(key)
+                return cached
+
+        matches: Dict[int, float] = {}
+        term_id = self.term_ids.get(word)
+        if term_id is not None:
+            matches[term_id] = 1.0
+        if prefix:
+            for term_id in self._prefix_terms(word):
+                similarity = 0.5 + 0.4 * len(word) / len(self.terms[term_id])
+                matches[term_id] = max(matches.get(term_id, 0.0), similarity)
+        for term_id, distance in self._fuzzy_terms(word):
+            similarity = 0.8 - 0.6 * distance / len(word)
+            matches[term_id] = max(matches.get(term_id, 0.0), similarity)
+
+        expansion = list(matches.items())
+        with self._lock:
+            self._expansions[key] = expansion
+            if len(self._expansions) > EXPANSION_CACHE_SIZE:
+                self._expansions.popitem(last=False)
+        return expansion
+
+    def search(self, query: str, limit: int = 20, names: Optional[List[str]] = None) -> List[Tuple[int, float]]:
+        """
+        Rank rows against a free-text query
+
+        Args:
+            query: Words to search for; the last one also matches as a
+                prefix unless the query ends in whitespace
+            limit: Maximum number of results
+            names: Row names, used to boost whole-name and name-prefix hits
+
+        Returns:
+            List of (row, score), best first
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        if not words or limit <= 0:
+            return []
+        complete = query[-1:].isspace()
+        expansions = [
+            self.expand(word, prefix=not complete and position == len(words) - 1)
+            for position, word in enumerate(words)
+        ]
+        pool = limit * 4 if names is not None else limit
+        if np is not None:
+            ranked = self._rank_vectorized(expansions, pool)
+        else:
+            ranked = self._rank(expansions, pool)
+        if names is None:
+            return [(row, score) for row, _, score in ranked]
+
+        folded = " ".join(words)
+        boosted = []
+        for row, matched, score in ranked:
+            name = names[row].casefold()
+            if name == folded:
+                score *= 2
+            elif name.startswith(folded):
+                score *= 1.5
+            boosted.append((row, matched, score))
+        boosted.sort(key=lambda hit: (-hit[1], -hit[2], len(names[hit[0]])))
+        return [(row, score) for row, _, score in boosted[:limit]]
+
+    def _rank(self, expansions: List[List[Tuple[int, float]]], limit: int) -> List[Tuple[int, int, float]]:
+        """Top rows as (row, words matched, score), accumulated in dicts"""
+        scores: Dict[int, float] = {}
+        matched: Dict[int, int] = {}
+        for expansion in expansions:
+            best: Dict[int, float] = {}
+            for term_id, similarity in expansion:
+                factor = similarity * self._idf(term_id)
+                for row, weight in zip(self.postings[term_id], self.weights[term_id]):
+                    score = factor * weight
+                    if score > best.get(row, 0.0):
+                        best[row] = score
+            for row, score in best.items():
+                scores[row] = scores.get(row, 0.0) + score
+                matched[row] = matched.get(row, 0) + 1
+        top = heapq.nlargest(limit, scores, key=lambda row: (matched[row], scores[row]))
+        return [(row, matched[row], scores[row]) for row in top]
+
+    def _rank_vectorized(self, expansions: List[List[Tuple[int, float]]], limit: int) -> List[Tuple[int, int, float]]:
+        """Top rows as (row, words matched, score), accumulated in NumPy arrays"""
+        scores = np.zeros(self.documents)
+        matched = np.zeros(self.documents, dtype=np.int32)
+        for expansion in expansions:
+            best = np.zeros(self.documents)
+            for term_id, similarity in expansion:
+                rows = self.postings[term_id]
+                # Rows are unique within a term's postings, so this is a safe scatter
+                best[rows] = np.maximum(best[rows], self.weights[term_id] * (similarity * self._idf(term_id)))
+            scores += best
+            matched += best > 0
+        hits = np.flatnonzero(matched)
+        if len(hits) > limit:
+            # Matched word count dominates; scores only break ties
+            key = matched[hits] * (scores[hits].max() + 1) + scores[hits]
+            hits = hits[np.argpartition(-key, limit - 1)[:limit]]
+        top = sorted(hits.tolist(), key=lambda row: (-matched[row], -scores[row]))
+        return [(row, int(matched[row]), float(scores[row])) for row in top]
@@ -0,0 +1,316 @@
+"""
+Compact columnar storage for the bestiary
+
+Only the fields used for searching and encounter building are kept in
+memory: numeric columns live in typed arrays and names/types are
+interned. Full stat blocks stay on disk and are re-read lazily (with a
+small LRU cache) when a single monster is requested.
+
+Loading never fails as a whole: a malformed creature is logged and
+skipped, and an unreadable or malformed dump keeps whatever was read
+before the error.
+"""
+
+import logging
+import os
+import sys
+import threading
+from array import array
+from collections import OrderedDict
+from bisect import bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.bestiary_index import BestiaryIndex
+from app.services.bestiary_search import SearchIndex
+from app.services.bestiary_loader import (
+    iter_creature_records,
+    list_data_files,
+    normalize_record,
+    read_record,
+)
+
+
+BESTIARY_DATA_DIR = os.getenv("BESTIARY_DATA_DIR", "./data/json")
+STAT_BLOCK_CACHE_SIZE = 256
+
+BUILTIN_SOURCE = 0
+SUMMARY_FIELDS = ("name", "cr", "xp", "type", "hp", "ac")
+
+# Called with (row, raw record) for every creature added to a store
+RecordHook = Optional[Callable[[int, Dict], None]]
+
+logger = logging.getLogger(__name__)
+
+
+def _summarize(record: Dict, source: str) -> Optional[Dict]:
+    """Summary of a record, or None (logged) if it is malformed"""
+    try:
+        return normalize_record(record)
+    except (ValueError, TypeError) as e:
+        logger.warning("Skipping creature %r in %s: %s", record.get("name"), source, e)
+        return None
+
+
+class BestiaryStore:
+    """Columnar in-memory table of monster summaries"""
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.types: List[str] = []
+        self.cr = array("d")
+        self.xp = array("l")
+        self.hp = array("l")
+        self.ac = array("l")
+        # Where each row's full stat block lives
+        self.sources: List[Optional[str]] = [None]
+        self._source_ids = array("H")
+        self._offsets = array("q")
+        self._lengths = array("l")
+        self._builtin: List[Dict] = []
+        self._blocks: "OrderedDict[int, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _append(self, summary: Dict, source_id: int, offset: int, length: int) -> int:
+        self.names.append(sys.intern(summary["name"]))
+        self.types.append(sys.intern(summary["type"]))
+        self.cr.append(summary["cr"])
+        self.xp.append(summary["xp"])
+        self.hp.append(summary["hp"])
+        self.ac.append(summary["ac"])
+        self._source_ids.append(source_id)
+        self._offsets.append(offset)
+        self._lengths.append(length)
+        return len(self.names) - 1
+
+    def add_records(self, records: Iterable[Dict], on_record: RecordHook = None) -> int:
+        """Add in-memory records (kept as their own stat blocks)"""
+        added = 0
+        for record in records:
+            summary = _summarize(record, "built-in bestiary")
+            if summary is None:
+                continue
+            self._builtin.append(record)
+            row = self._append(summary, BUILTIN_SOURCE, len(self._builtin) - 1, 0)
+            if on_record is not None:
+                on_record(row, record)
+            added += 1
+        return added
+
+    def load_file(self, path: str, on_record: RecordHook = None) -> int:
+        """
+        Stream creatures from a JSON/NDJSON dump into the store
+
+        ``on_record`` sees each raw record while it is still in memory,
+        so derived indexes can be built without re-reading the file.
+
+        A file that cannot be read or parsed is logged, keeping the
+        creatures read before the error.
+
+        Returns:
+            Number of creatures added
+        """
+        self.sources.append(os.path.abspath(path))
+        source_id = len(self.sources) - 1
+        added = 0
+        try:
+            for record, offset, length in iter_creature_records(path):
+                summary = _summarize(record, path)
+                if summary is None:
+                    continue
+                row = self._append(summary, source_id, offset, length)
+                if on_record is not None:
+                    on_record(row, record)
+                added += 1
+        except (OSError, ValueError) as e:
+            # json.JSONDecodeError and UnicodeDecodeError are ValueErrors
+            logger.error("Stopped loading %s after %d creatures: %s", path, added, e)
+        return added
+
+    def summary(self, row: int) -> Dict:
+        """Indexed fields of a monster as a dict"""
+        return {
+            "name": self.names[row],
+            "cr": self.cr[row],
+            "xp": self.xp[row],
+            "type": self.types[row],
+            "hp": self.hp[row],
+            "ac": self.ac[row],
+        }
+
+    def project(self, row: int, fields: Sequence[str]) -> Dict:
+        """Only the requested summary fields of a monster"""
+        columns = {
+            "name": self.names,
+            "cr": self.cr,
+            "xp": self.xp,
+            "type": self.types,
+            "hp": self.hp,
+            "ac": self.ac,
+        }
+        return {field: columns[field][row] for field in fields}
+
+    def stat_block(self, row: int) -> Dict:
+        """Full stat block of a monster, read from its source on demand"""
+        source_id = self._source_ids[row]
+        if source_id == BUILTIN_SOURCE:
+            return dict(self._builtin[self._offsets[row]])
+        with self._lock:
+            block = self._blocks.get(row)
+            if block is not None:
+                self._blocks.move_to_end(row)
+                return dict(block)
+        block = read_record(self.sources[source_id], self._offsets[row], self._lengths[row])
+        block = {**block, **self.summary(row)}
+        with self._lock:
+            self._blocks[row] = block
+            if len(self._blocks) > STAT_BLOCK_CACHE_SIZE:
+                self._blocks.popitem(last=False)
+        return dict(block)
+
+
+class Bestiary:
+    """
+    The loaded bestiary: built-in monsters plus every dump in the data dir
+
+    ``reload()`` builds a new store, indexes and search index and swaps
+    them in, bumping ``generation`` so caches keyed on it know to refresh.
+    """
+
+    def __init__(self, builtin: Iterable[Dict] = (), data_dir: Optional[str] = BESTIARY_DATA_DIR):
+        self.builtin = list(builtin)
+        self.data_dir = data_dir
+        self.generation = 0
+        self._reload_lock = threading.Lock()
+        empty = BestiaryStore()
+        self._loaded = (empty, BestiaryIndex(empty), SearchIndex().finish())
+        self.reload()
+
+    @property
+    def store(self) -> BestiaryStore:
+        return self._loaded[0]
+
+    @property
+    def index(self) -> BestiaryIndex:
+        return self._loaded[1]
+
+    @property
+    def search_index(self) -> SearchIndex:
+        return self._loaded[2]
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def reload(self) -> int:
+        """
+        Rebuild the store and indexes from the built-ins and data dir
+
+        Returns:
+            Number of monsters loaded
+        """
+        with self._reload_lock:
+            store = BestiaryStore()
+            search = SearchIndex()
+            store.add_records(self.builtin, on_record=search.add)
+            if self.data_dir:
+                for path in list_data_files(self.data_dir):
+                    store.load_file(path, on_record=search.add)
+            # Swap everything together so readers never see a mismatch
+            self._loaded = (store, BestiaryIndex(store), search.finish())
+            self.generation += 1
+            return len(store)
+
+    def all(self) -> List[Dict]:
+        """Summaries of every monster, in load order"""
+        store = self.store
+        return [store.summary(row) for row in range(len(store))]
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Full stat block by name (case-insensitive), or None"""
+        store, index, _ = self._loaded
+        row = index.get(name)
+        return None if row is None else store.stat_block(row)
+
+    def of_type(self, monster_type: str) -> List[Dict]:
+        """Summaries of monsters of a type (case-insensitive)"""
+        store, index, _ = self._loaded
+        return [store.summary(row) for row in index.of_type(monster_type)]
+
+    def cr_range(self, min_cr: Optional[float] = None, max_cr: Optional[float] = None) -> List[Dict]:
+        """Summaries of monsters with min_cr <= CR <= max_cr, in CR order"""
+        store, index, _ = self._loaded
+        return [store.summary(row) for row in index.cr_range(min_cr, max_cr)]
+
+    def search(self, query: str, limit: int = 20, fields: Sequence[str] = SUMMARY_FIELDS) -> List[Dict]:
+        """
+        Ranked, typo-tolerant search over names, types and stat-block text
+
+        Returns:
+            Projected monsters with a relevance ``score``, best first
+        """
+        store, _, search = self._loaded
+        results = []
+        for row, score in search.search(query, limit, names=store.names):
+            monster = store.project(row, fields)
+            monster["score"] = round(score, 3)
+            results.append(monster)
+        return results
+
+    def query(
+        self,
+        monster_type: Optional[str] = None,
+        min_cr: Optional[float] = None,
+        max_cr: Optional[float] = None,
+        name_prefix: Optional[str] = None,
+    ) -> List[int]:
+        """
+        Rows matching every given filter, in load order
+
+        The most selective index answers first; the remaining filters are
+        checked against the columns of its (small) candidate set.
+        """
+        store, index, _ = self._loaded
+        candidates: List[Tuple[int, Sequence[int]]] = []
+        if monster_type is not None:
+            rows = index.of_type(monster_type)
+            candidates.append((len(rows), rows))
+        if min_cr is not None or max_cr is not None:
+            rows = index.cr_range(min_cr, max_cr)
+            candidates.append((len(rows), rows))
+        if name_prefix:
+            rows = index.name_prefix(name_prefix)
+            candidates.append((len(rows), rows))
+        if not candidates:
+            return list(range(len(store)))
+
+        rows = min(candidates, key=lambda candidate: candidate[0])[1]
+        type_id = None if monster_type is None else index.type_id(monster_type)
+        prefix = name_prefix.casefold() if name_prefix else None
+        low = float("-inf") if min_cr is None else min_cr
+        high = float("inf") if max_cr is None else max_cr
+        crs = store.cr
+        matches = [
+            row for row in rows
+            if (type_id is None or index.type_of[row] == type_id)
+            and low <= crs[row] <= high
+            and (prefix is None or store.names[row].casefold().startswith(prefix))
+        ]
+        matches.sort()
+        return matches
+
+    @staticmethod
+    def page(rows: List[int], cursor: Optional[int], limit: Optional[int]) -> Tuple[List[int], Optional[int]]:
+        """
+        Slice sorted rows after ``cursor``
+
+        Returns:
+            Tuple of (rows in this page, cursor for the next page or None)
+        """
+        start = 0 if cursor is None else bisect_right(rows, cursor)
+        if limit is None:
+            return rows[start:], None
+        page = rows[start:start + limit]
+        more = start + limit < len(rows)
+        return page, (page[-1] if more and page else None)
@@ -0,0 +1,191 @@
+"""
+Read-through cache of encoded character payloads
+
+``GET /characters/{id}`` is served from a bounded LRU of encoded bodies
+with a time-to-live. Every write bumps the character's slot in a version
+table, and an entry is only served while its slot still holds the version
+read before the row was loaded, so a write by any process sharing the
+table invalidates it:
+
+- ``VersionTable`` keeps the slots in process memory (a single worker)
+- ``SharedVersionTable`` keeps them in a memory-mapped file that every
+  uvicorn worker on the host opens (``CHARACTER_CACHE_SHARED_PATH``)
+"""
+
+import mmap
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional
+
+from app.responses import EncodedPayload
+
+
+CHARACTER_CACHE_SIZE = int(os.getenv("CHARACTER_CACHE_SIZE", "1024"))
+CHARACTER_CACHE_TTL = float(os.getenv("CHARACTER_CACHE_TTL", "30"))
+CHARACTER_CACHE_SLOTS = int(os.getenv("CHARACTER_CACHE_SLOTS", "65536"))
+CHARACTER_CACHE_SHARED_PATH = os.getenv("CHARACTER_CACHE_SHARED_PATH")
+
+
+def _new_version() -> int:
+    """
+    Random non-zero 63-bit version
+
+    Random rather than incremented, so two processes bumping the same slot
+    at once can never leave it at a value a reader has already seen.
+    """
+    return random.getrandbits(63) or 1
+
+
+class VersionTable:
+    """Per-slot version numbers in process memory"""
+
+    name = "local"
+
+    def __init__(self, slots: int = CHARACTER_CACHE_SLOTS):
+        self.slots = slots
+        self._versions = [0] * slots
+
+    def get(self, key: int) -> int:
+        return self._versions[key % self.slots]
+
+    def bump(self, key: int):
+        self._versions[key % self.slots] = _new_version()
+
+    def close(self):
+        pass
+
+
+class SharedVersionTable(VersionTable):
+    """
+    Per-slot version numbers in a memory-mapped file shared by processes
+
+    Slots are aligned 8-byte words, so each read or write is a single
+    machine store that other processes see without locking.
+    """
+
+    name = "shared"
+
+    def __init__(self, path: str, slots: int = CHARACTER_CACHE_SLOTS):
+        self.slots = slots
+        self.path = path
+        size = slots * 8
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self._versions = memoryview(self._map).cast("Q")
+
+    def close(self):
+        self._versions.release()
+        self._map.close()
+
+
+class _Entry(NamedTuple):
+    payload: EncodedPayload
+    version: int
+    expires: float
+
+
+class CharacterCache:
+    """Bounded LRU/TTL cache of encoded characters, invalidated by version"""
+
+    def __init__(
+        self,
+        max_size: int = CHARACTER_CACHE_SIZE,
+        ttl: float = CHARACTER_CACHE_TTL,
+        versions: Optional[VersionTable] = None,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.versions = versions if versions is not None else VersionTable()
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._expired = 0
+        self._invalidations = 0
+
+    def get(self, character_id: int) -> Optional[EncodedPayload]:
+        """Cached payload, or None if absent, expired or written since"""
+        with self._lock:
+            entry = self._entries.get(character_id)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.version != self.versions.get(character_id):
+                del self._entries[character_id]
+                self._stale += 1
+                self._misses += 1
+                return None
+            if entry.expires < time.monotonic():
+                del self._entries[character_id]
+                self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(character_id)
+            self._hits += 1
+            return entry.payload
+
+    def version(self, character_id: int) -> int:
+        """Current version; read it *before* loading the row to cache"""
+        return self.versions.get(character_id)
+
+    def put(self, character_id: int, version: int, payload: EncodedPayload):
+        """
+        Cache a payload loaded after ``version`` was read
+
+        Skipped if the character has been written since, so a slow reader
+        can never cache a row older than the latest write.
+        """
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if self.versions.get(character_id) != version:
+                return
+            self._entries[character_id] = _Entry(payload, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(character_id)
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *character_ids: int):
+        """Mark characters as written; call after the write commits"""
+        with self._lock:
+            for character_id in character_ids:
+                self.versions.bump(character_id)
+                self._entries.pop(character_id, None)
+            self._invalidations += len(character_ids)
+
+    def cache_info(self) -> Dict:
+        """Hit/miss statistics for tuning size and TTL"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "backend": self.versions.name,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "stale": self._stale,
+                "expired": self._expired,
+                "invalidations": self._invalidations,
+            }
+
+    def clear(self):
+        """Drop every cached payload (versions are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Create global instance
+character_cache = CharacterCache(
+    versions=SharedVersionTable(CHARACTER_CACHE_SHARED_PATH) if CHARACTER_CACHE_SHARED_PATH else None,
+)
@@ -0,0 +1,420 @@
+"""
+Monte Carlo combat simulator for encounter difficulty estimation
+
+Plays an encounter against a party many times and reports how often the
+party wins, how long the fight lasts and how likely a PC is to go down.
+
+The rules are a deliberately small slice of PF2e:
+- each side rolls initiative once per fight; the winning side acts first
+  every round
+- every living combatant makes two Strikes a turn, the second at the -5
+  multiple attack penalty
+- degrees of success follow the +/-10 rule, with natural 20s and 1s
+  shifting the result one step; a critical hit doubles the damage roll
+- PCs focus the monster with the fewest hit points left; monsters pick
+  a random standing PC
+- a PC at 0 HP counts as dead (no dying, recovery or healing)
+
+Trials run in chunks. With NumPy each chunk is vectorized across trials.
+Chunks are spread over the shared worker pool, and the run stops early once the
+confidence intervals are tight enough or the time budget is spent.
+
+Chunk results are counted in chunk order, whatever order the workers
+finish in, so a seeded run that stops at ``max_trials`` or on confidence
+repeats exactly. Only a time-budget stop depends on timing.
+"""
+
+import math
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from app.services.dice_engine import compile_notation
+from app.services.dice_vector import roll_many
+from app.services.rng import derive_seed, new_seed
+from app.services.worker_pool import WorkerPool, worker_pool
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when NumPy is absent
+    np = None
+
+
+SIMULATION_WORKERS = int(os.getenv("SIMULATION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+STRIKES_PER_TURN = 2
+MULTIPLE_ATTACK_PENALTY = 5
+MAX_ROUNDS = 20
+
+CHUNK_TRIALS = 1000
+MIN_TRIALS = 1000
+MAX_TRIALS = 100_000
+# 95% confidence
+Z_SCORE = 1.96
+
+
+@dataclass(frozen=True)
+class Combatant:
+    """Combat profile of one PC or monster"""
+    name: str
+    hp: int
+    ac: int
+    attack: int
+    damage: str
+    initiative: int = 0
+
+    @classmethod
+    def from_character(cls, character) -> "Combatant":
+        """
+        Profile a Character (or any object with the same attributes)
+
+        Strikes use trained proficiency with the better of Strength and
+        Dexterity, and a d8 weapon gaining striking runes at levels 4, 12
+        and 19.
+        """
+        level = character.level or 1
+        strength = _modifier(character.strength)
+        finesse = max(strength, _modifier(character.dexterity))
+        dice = 1 + (level >= 4) + (level >= 12) + (level >= 19)
+        return cls(
+            name=character.name,
+            hp=character.hit_points if character.hit_points is not None else character.max_hit_points,
+            ac=character.armor_class,
+            attack=level + 2 + finesse,
+            damage=_damage_notation(dice, 8, strength),
+            initiative=character.initiative or 0,
+        )
+
+    @classmethod
+    def from_monster(cls, monster: Dict) -> "Combatant":
+        """
+        Profile a bestiary monster
+
+        The bestiary has no strikes, so attack bonus and damage follow the
+        moderate values for a creature of the monster's level.
+        """
+        level = int(monster["cr"])
+        return cls(
+            name=monster["name"],
+            hp=monster["hp"],
+            ac=monster["ac"],
+            attack=level + 8,
+            damage=_damage_notation(1 + level // 4, 8, 2 + level * 7 // 10),
+            initiative=level + 4,
+        )
+
+
+def _modifier(score: Optional[int]) -> int:
+    return ((score or 10) - 10) // 2
+
+
+def _damage_notation(dice: int, sides: int, bonus: int) -> str:
+    if bonus:
+        return f"{dice}d{sides}{bonus:+d}"
+    return f"{dice}d{sides}"
+
+
+def _degree(total: int, natural: int, ac: int) -> int:
+    """Degree of success: 0 critical failure, 1 failure, 2 success, 3 critical success"""
+    if total >= ac + 10:
+        degree = 3
+    elif total >= ac:
+        degree = 2
+    elif total <= ac - 10:
+        degree = 0
+    else:
+        degree = 1
+    if natural == 20:
+        degree += 1
+    elif natural == 1:
+        degree -= 1
+    return min(3, max(0, degree))
+
+
+def _run_trials_numpy(party: Sequence[Combatant], monsters: Sequence[Combatant], trials: int, seed: int) -> Dict:
+    generator = np.random.default_rng(seed)
+    everyone = list(party) + list(monsters)
+    sides = [party, monsters]
+    hp = [
+        np.tile(np.array([c.hp for c in side], dtype=np.int64), (trials, 1))
+        for side in sides
+    ]
+    trial_index = np.arange(trials)
+
+    best_initiative = [max(c.initiative for c in side) for side in sides]
+    party_first = (
+        generator.integers(1, 21, size=trials) + best_initiative[0]
+        >= generator.integers(1, 21, size=trials) + best_initiative[1]
+    )
+    damage = {c.damage: compile_notation(c.damage) for c in everyone}
+    rounds = np.full(trials, MAX_ROUNDS, dtype=np.int64)
+    done = np.zeros(trials, dtype=bool)
+
+    def take_turns(side: int, acting: "np.ndarray"):
+        foes = 1 - side
+        for slot, combatant in enumerate(sides[side]):
+            for strike in range(STRIKES_PER_TURN):
+                alive = hp[foes] > 0
+                active = acting & (hp[side][:, slot] > 0) & alive.any(axis=1)
+                if not active.any():
+                    break
+                if side == 0:
+                    # Focus fire: the monster with the fewest HP left
+                    target = np.where(alive, hp[foes], np.iinfo(np.int64).max).argmin(axis=1)
+                else:
+                    target = np.where(alive, generator.random(alive.shape), -1.0).argmax(axis=1)
+                ac = np.array([c.ac for c in sides[foes]])[target]
+                natural = generator.integers(1, 21, size=trials)
+                total = natural + combatant.attack - strike * MULTIPLE_ATTACK_PENALTY
+                degree = np.select([total >= ac + 10, total >= ac, total <= ac - 10], [3, 2, 0], 1)
+                degree = np.clip(degree + (natural == 20) - (natural == 1), 0, 3)
+                expression = damage[combatant.damage]
+                normal = np.maximum(np.asarray(roll_many(expression, trials, generator)[0]), 1)
+                critical = np.maximum(np.asarray(roll_many(expression, trials, generator, critical=True)[0]), 1)
+                dealt = np.where(degree == 3, critical, np.where(degree == 2, normal, 0))
+                hp[foes][trial_index, target] -= np.where(active, dealt, 0)
+
+    for round_number in range(1, MAX_ROUNDS + 1):
+        ongoing = ~done
+        take_turns(1, ongoing & ~party_first)
+        take_turns(0, ongoing)
+        take_turns(1, ongoing & party_first)
+        finished = ongoing & (~(hp[0] > 0).any(axis=1) | ~(hp[1] > 0).any(axis=1))
+        rounds[finished] = round_number
+        done |= finished
+        if done.all():
+            break
+
+    wins = (hp[0] > 0).any(axis=1) & ~(hp[1] > 0).any(axis=1)
+    deaths = (hp[0] <= 0).sum(axis=1)
+    return {
+        "trials": trials,
+        "wins": int(wins.sum()),
+        "rounds": int(rounds.sum()),
+        "rounds_squared": int((rounds ** 2).sum()),
+        "trials_with_death": int((deaths > 0).sum()),
+        "pc_deaths": int(deaths.sum()),
+    }
+
+
+def _run_trials_python(party: Sequence[Combatant], monsters: Sequence[Combatant], trials: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    sides = [party, monsters]
+    damage = {c.damage: compile_notation(c.damage) for c in list(party) + list(monsters)}
+    totals = {"trials": trials, "wins": 0, "rounds": 0, "rounds_squared": 0, "trials_with_death": 0, "pc_deaths": 0}
+
+    for _ in range(trials):
+        hp = [[c.hp for c in side] for side in sides]
+        party_first = (
+            rng.randint(1, 20) + max(c.initiative for c in party)
+            >= rng.randint(1, 20) + max(c.initiative for c in monsters)
+        )
+        order = [0, 1] if party_first else [1, 0]
+        rounds = MAX_ROUNDS
+        for round_number in range(1, MAX_ROUNDS + 1):
+            for side in order:
+                foes = 1 - side
+                for slot, combatant in enumerate(sides[side]):
+                    for strike in range(STRIKES_PER_TURN):
+                        alive = [i for i, points in enumerate(hp[foes]) if points > 0]
+                        if hp[side][slot] <= 0 or not alive:
+                            break
+                        if side == 0:
+                            target = min(alive, key=hp[foes].__getitem__)
+                        else:
+                            target = rng.choice(alive)
+                        natural = rng.randint(1, 20)
+                        total = natural + combatant.attack - strike * MULTIPLE_ATTACK_PENALTY
+                        degree = _degree(total, natural, sides[foes][target].ac)
+                        if degree >= 2:
+                            rolled = damage[combatant.damage].roll(rng, critical=degree == 3)["total"]
+                            hp[foes][target] -= max(1, rolled)
+            if not any(p > 0 for p in hp[0]) or not any(p > 0 for p in hp[1]):
+                rounds = round_number
+                break
+
+        deaths = sum(1 for points in hp[0] if points <= 0)
+        totals["wins"] += any(p > 0 for p in hp[0]) and not any(p > 0 for p in hp[1])
+        totals["rounds"] += rounds
+        totals["rounds_squared"] += rounds * rounds
+        totals["trials_with_death"] += deaths > 0
+        totals["pc_deaths"] += deaths
+    return totals
+
+
+def run_trials(party: Sequence[Combatant], monsters: Sequence[Combatant], trials: int, seed: int) -> Dict:
+    """
+    Play ``trials`` fights and return summed outcomes
+
+    Module-level so process pool workers can run it.
+    """
+    if np is not None:
+        return _run_trials_numpy(party, monsters, trials, seed)
+    return _run_trials_python(party, monsters, trials, seed)
+
+
+def wilson_interval(successes: int, trials: int, z: float = Z_SCORE) -> List[float]:
+    """Wilson score interval for a binomial proportion"""
+    if trials == 0:
+        return [0.0, 1.0]
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    half = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return [max(0.0, centre - half), min(1.0, centre + half)]
+
+
+class CombatSimulator:
+    """Runs chunked Monte Carlo trials, in the shared process pool when configured"""
+
+    def __init__(
+        self,
+        workers: int = SIMULATION_WORKERS,
+        chunk_trials: int = CHUNK_TRIALS,
+        pool: Optional[WorkerPool] = None,
+    ):
+        # Chunks kept in flight are bounded by workers; 0 or 1 runs inline
+        self.workers = workers
+        self.chunk_trials = chunk_trials
+        self.pool = pool or worker_pool
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 1:
+            return None
+        return self.pool.executor()
+
+    def simulate(
+        self,
+        party: Sequence[Combatant],
+        monsters: Sequence[Combatant],
+        max_trials: int = 10_000,
+        time_budget: float = 0.5,
+        precision: float = 0.02,
+        seed: Optional[int] = None,
+    ) -> Dict:
+        """
+        Estimate an encounter's outcome by simulation
+
+        Args:
+            party: PC profiles
+            monsters: Monster profiles
+            max_trials: Upper bound on simulated fights
+            time_budget: Seconds after which no new chunks are started
+            precision: Stop once the 95% intervals of the win and death
+                rates are within +/- this much
+            seed: Seed for reproducible runs (each chunk derives its own);
+                a run cut short by the time budget may count fewer chunks
+
+        Returns:
+            Dictionary with win rate, expected rounds and PC death odds
+
+        Raises:
+            ValueError: If either side is empty or the limits are invalid
+        """
+        if not party or not monsters:
+            raise ValueError("Both the party and the encounter need at least one combatant")
+        if not 1 <= max_trials <= MAX_TRIALS:
+            raise ValueError(f"max_trials must be between 1 and {MAX_TRIALS}")
+        if time_budget <= 0 or precision <= 0:
+            raise ValueError("time_budget and precision must be positive")
+
+        seed = new_seed() if seed is None else seed
+        party, monsters = tuple(party), tuple(monsters)
+        started = time.perf_counter()
+        deadline = started + time_budget
+        totals = {"trials": 0, "wins": 0, "rounds": 0, "rounds_squared": 0, "trials_with_death": 0, "pc_deaths": 0}
+        scheduled = 0
+        chunk = 0
+
+        def next_chunk():
+            nonlocal scheduled, chunk
+            size = min(self.chunk_trials, max_trials - scheduled)
+            scheduled += size
+            chunk += 1
+            return size, derive_seed(seed, "simulation", chunk - 1)
+
+        def add(result: Dict):
+            for key, value in result.items():
+                totals[key] += value
+
+        def converged() -> bool:
+            if totals["trials"] < min(MIN_TRIALS, max_trials):
+                return False
+            for key in ("wins", "trials_with_death"):
+                low, high = wilson_interval(totals[key], totals["trials"])
+                if (high - low) / 2 > precision:
+                    return False
+            return True
+
+        stopped = "max_trials"
+        executor = self._executor()
+        if executor is None:
+            while scheduled < max_trials:
+                size, chunk_seed = next_chunk()
+                add(run_trials(party, monsters, size, chunk_seed))
+                if converged():
+                    stopped = "confidence"
+                    break
+                if time.perf_counter() >= deadline:
+                    stopped = "time_budget"
+                    break
+        else:
+            # Results are counted in chunk order, as in the loop above, so the
+            # stopping decision does not depend on which worker finishes first
+            pending = {}
+            chunks: Dict[int, tuple] = {}
+            finished_early: Dict[int, Dict] = {}
+            counted = 0
+            while True:
+                while scheduled < max_trials and len(pending) < self.workers * 2:
+                    index = chunk
+                    chunks[index] = next_chunk()
+                    pending[executor.submit(run_trials, party, monsters, *chunks[index])] = index
+                if not pending:
+                    break
+                timeout = max(0.0, deadline - time.perf_counter())
+                finished, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    finished_early[pending.pop(future)] = future.result()
+                if not finished and not totals["trials"] and counted not in finished_early:
+                    # Out of time before any worker delivered (e.g. still
+                    # starting up): run the first chunk here, as inline runs do
+                    finished_early[counted] = run_trials(party, monsters, *chunks[counted])
+                while counted in finished_early:
+                    add(finished_early.pop(counted))
+                    counted += 1
+                    if converged():
+                        stopped = "confidence"
+                        break
+                if stopped == "max_trials" and totals["trials"] and time.perf_counter() >= deadline:
+                    stopped = "time_budget"
+                if stopped != "max_trials":
+                    for future in pending:
+                        future.cancel()
+                    break
+
+        trials = totals["trials"]
+        mean_rounds = totals["rounds"] / trials
+        variance = max(0.0, totals["rounds_squared"] / trials - mean_rounds ** 2)
+        return {
+            "trials": trials,
+            "win_rate": round(totals["wins"] / trials, 4),
+            "win_rate_ci": [round(bound, 4) for bound in wilson_interval(totals["wins"], trials)],
+            "expected_rounds": round(mean_rounds, 2),
+            "rounds_std": round(math.sqrt(variance), 2),
+            "pc_death_probability": round(totals["trials_with_death"] / trials, 4),
+            "pc_death_probability_ci": [
+                round(bound, 4) for bound in wilson_interval(totals["trials_with_death"], trials)
+            ],
+            "expected_pc_deaths": round(totals["pc_deaths"] / trials, 3),
+            "stopped": stopped,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "seed": seed,
+        }
+
+
+# Create global instance
+combat_simulator = CombatSimulator()
@@ -0,0 +1,300 @@
+"""
+Exact probability distributions for compiled dice expressions
+
+Per-die distributions are combined by convolution: repeated squaring with
+FFT when NumPy is installed, and a prefix-sum sliding window for uniform
+dice otherwise. Keep/drop terms use a dynamic program over face values.
+Results are memoized per normalized notation.
+"""
+
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import accumulate
+from math import comb, sqrt
+from typing import Dict, List, Optional
+
+from app.services.dice_engine import DiceExpression, DiceTerm, compile_notation
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when NumPy is absent
+    np = None
+
+
+FFT_THRESHOLD = 512
+TAIL_EPSILON = 1e-16
+MAX_PYTHON_OPERATIONS = 50_000_000
+MAX_KEEP_OPERATIONS = 20_000_000
+
+
+class Distribution:
+    """Probability mass function over consecutive integer totals"""
+
+    def __init__(self, offset: int, probabilities: List[float]):
+        self.offset = offset
+        self.probabilities = probabilities
+        self.cumulative = list(accumulate(probabilities))
+
+    @property
+    def minimum(self) -> int:
+        return self.offset
+
+    @property
+    def maximum(self) -> int:
+        return self.offset + len(self.probabilities) - 1
+
+    @property
+    def mean(self) -> float:
+        return sum((self.offset + i) * p for i, p in enumerate(self.probabilities))
+
+    @property
+    def stdev(self) -> float:
+        mean = self.mean
+        variance = sum(
+            (self.offset + i - mean) ** 2 * p for i, p in enumerate(self.probabilities)
+        )
+        return sqrt(max(variance, 0.0))
+
+    def probability(self, value: int) -> float:
+        """P(total == value)"""
+        index = value - self.offset
+        if 0 <= index < len(self.probabilities):
+            return self.probabilities[index]
+        return 0.0
+
+    def cdf(self, value: int) -> float:
+        """P(total <= value)"""
+        index = value - self.offset
+        if index < 0:
+            return 0.0
+        if index >= len(self.cumulative):
+            return 1.0
+        return min(self.cumulative[index], 1.0)
+
+    def chance_to_meet(self, dc: int) -> float:
+        """P(total >= dc)"""
+        return max(0.0, 1.0 - self.cdf(dc - 1))
+
+    def percentile(self, percent: float) -> int:
+        """Smallest total whose cumulative probability reaches ``percent``"""
+        if not 0 <= percent <= 100:
+            raise ValueError("Percentile must be between 0 and 100")
+        target = percent / 100 - 1e-12
+        index = bisect_left(self.cumulative, target)
+        return self.offset + min(index, len(self.probabilities) - 1)
+
+    def scaled(self, factor: int) -> "Distribution":
+        """Distribution of ``factor * total``"""
+        probabilities = [0.0] * ((len(self.probabilities) - 1) * factor + 1)
+        probabilities[::factor] = self.probabilities
+        return Distribution(self.offset * factor, probabilities)
+
+    def negated(self) -> "Distribution":
+        """Distribution of ``-total``"""
+        return Distribution(-self.maximum, self.probabilities[::-1])
+
+    def shifted(self, amount: int) -> "Distribution":
+        """Distribution of ``total + amount``"""
+        return Distribution(self.offset + amount, self.probabilities)
+
+    def __add__(self, other: "Distribution") -> "Distribution":
+        return Distribution(
+            self.offset + other.offset,
+            _convolve(self.probabilities, other.probabilities),
+        )
+
+
+def _trim(probabilities: List[float]) -> List[float]:
+    end = len(probabilities)
+    while end > 1 and probabilities[end - 1] < TAIL_EPSILON:
+        end -= 1
+    return probabilities[:end]
+
+
+def _convolve(a: List[float], b: List[float]) -> List[float]:
+    if np is not None:
+        if min(len(a), len(b)) < FFT_THRESHOLD:
+            return np.convolve(a, b).tolist()
+        size = len(a) + len(b) - 1
+        spectrum = np.fft.rfft(a, size) * np.fft.rfft(b, size)
+        return np.clip(np.fft.irfft(spectrum, size), 0.0, None).tolist()
+
+    if len(a) * len(b) > MAX_PYTHON_OPERATIONS:
+        raise ValueError("Distribution is too large to compute without NumPy")
+    result = [0.0] * (len(a) + len(b) - 1)
+    for i, x in enumerate(a):
+        if x:
+            for j, y in enumerate(b):
+                result[i + j] += x * y
+    return result
+
+
+def _add_uniform(probabilities: List[float], sides: int) -> List[float]:
+    """Convolve with a uniform 1..sides die using a sliding window"""
+    window = 0.0
+    result = []
+    length = len(probabilities)
+    for index in range(length + sides - 1):
+        if index < length:
+            window += probabilities[index]
+        if index >= sides:
+            window -= probabilities[index - sides]
+        result.append(window / sides)
+    return result
+
+
+def _power(probabilities: List[float], count: int, trim: bool = False) -> List[float]:
+    """
+    Distribution of the sum of ``count`` independent copies
+
+    With ``trim`` set, negligible tail mass is dropped after each squaring,
+    which keeps exploding dice from growing without bound.
+    """
+    finish = _trim if trim else (lambda values: values)
+    result = [1.0]
+    base = probabilities
+    while count:
+        if count & 1:
+            result = finish(_convolve(result, base))
+        count >>= 1
+        if count:
+            base = finish(_convolve(base, base))
+    return result
+
+
+def _die_distribution(term: DiceTerm, sides: int) -> Distribution:
+    pmf = term.die_pmf(sides)
+    offset = min(pmf)
+    probabilities = [0.0] * (max(pmf) - offset + 1)
+    for value, p in pmf.items():
+        probabilities[value - offset] = p
+    return Distribution(offset, _trim(probabilities))
+
+
+def _keep_distribution(term: DiceTerm, die: Distribution) -> Distribution:
+    """
+    Distribution of the kept dice of a keep/drop term
+
+    Faces are visited from the kept end inward; the state is the number of
+    dice assigned so far, and each step chooses how many of the remaining
+    dice show the current face.
+    """
+    n, k = term.count, term.kept
+    faces = [
+        (die.offset + i, p) for i, p in enumerate(die.probabilities) if p > 0
+    ]
+    if term.keeps_highest:
+        faces.reverse()
+    span = k * max(abs(value) for value, _ in faces)
+    if len(faces) * n * n * (span + 1) // 2 > MAX_KEEP_OPERATIONS:
+        raise ValueError("Keep/drop expression is too large for an exact distribution")
+
+    # states[i] maps kept-sum -> probability weight with i dice assigned
+    states: List[Dict[int, float]] = [dict() for _ in range(n + 1)]
+    states[0][0] = 1.0
+    for value, p in faces:
+        powers = [p ** c for c in range(n + 1)]
+        updated: List[Dict[int, float]] = [dict() for _ in range(n + 1)]
+        for assigned in range(n + 1):
+            current = states[assigned]
+            if not current:
+                continue
+            remaining = n - assigned
+            for c in range(remaining + 1):
+                weight = comb(remaining, c) * powers[c]
+                if weight == 0.0:
+                    continue
+                gained = value * max(0, min(c, k - assigned))
+                target = updated[assigned + c]
+                for total, probability in current.items():
+                    key = total + gained
+                    target[key] = target.get(key, 0.0) + probability * weight
+        states = updated
+
+    final = states[n]
+    low, high = min(final), max(final)
+    probabilities = [0.0] * (high - low + 1)
+    for total, probability in final.items():
+        probabilities[total - low] = probability
+    return Distribution(low, probabilities)
+
+
+def _term_distribution(term: DiceTerm, sides: int) -> Distribution:
+    die = _die_distribution(term, sides)
+    if term.keep is not None:
+        result = _keep_distribution(term, die)
+    elif np is None and not term.explode:
+        result = _uniform(term.count, sides)
+    else:
+        result = Distribution(
+            die.offset * term.count,
+            _power(die.probabilities, term.count, trim=term.explode),
+        )
+    return result if term.sign > 0 else result.negated()
+
+
+def _uniform(count: int, sides: int) -> Distribution:
+    probabilities = [1.0]
+    for _ in range(count):
+        probabilities = _add_uniform(probabilities, sides)
+    return Distribution(count, probabilities)
+
+
+def build_distribution(expression: DiceExpression, critical: bool = False) -> Distribution:
+    """
+    Compute the exact distribution of a compiled expression
+
+    Raises:
+        ValueError: If the expression is too large to compute exactly
+    """
+    result = Distribution(0, [1.0])
+    for term in expression.terms:
+        result = result + _term_distribution(term, expression.term_sides(term, critical))
+    result = result.shifted(expression.modifier)
+    if critical:
+        result = result.scaled(2)
+        if expression.fatal is not None:
+            result = result + _uniform(1, expression.fatal)
+        if expression.deadly is not None:
+            result = result + _uniform(*expression.deadly)
+    return result
+
+
+@lru_cache(maxsize=128)
+def _cached_distribution(normalized: str, critical: bool) -> Distribution:
+    return build_distribution(compile_notation(normalized), critical)
+
+
+def get_distribution(notation: str, critical: bool = False) -> Distribution:
+    """
+    Memoized distribution for a notation
+
+    Raises:
+        ValueError: If notation is invalid or too large to compute exactly
+    """
+    return _cached_distribution(compile_notation(notation).notation, critical)
+
+
+def summarize(
+    distribution: Distribution,
+    percentiles: Optional[List[float]] = None,
+    dcs: Optional[List[int]] = None,
+    include_pmf: bool = True,
+) -> dict:
+    """Build an API payload for a distribution"""
+    summary = {
+        "min": distribution.minimum,
+        "max": distribution.maximum,
+        "mean": distribution.mean,
+        "stdev": distribution.stdev,
+        "percentiles": {
+            f"{p:g}": distribution.percentile(p) for p in (percentiles or [])
+        },
+        "chance_to_meet": {
+            str(dc): distribution.chance_to_meet(dc) for dc in (dcs or [])
+        },
+    }
+    if include_pmf:
+        summary["pmf"] = distribution.probabilities
+        summary["cdf"] = [min(c, 1.0) for c in distribution.cumulative]
+    return summary
@@ -0,0 +1,350 @@
+"""
+Dice expression compiler for Pathfinder 2e dice notation
+
+Notation is compiled once into an immutable expression object and cached,
+so repeated rolls of the same notation skip parsing entirely.
+
+Supported syntax (case and whitespace insensitive):
+    2d6+1d4+3        multiple dice and constant terms
+    d20              count defaults to 1
+    4d6kh3 / 4d6k3   keep highest N (also kl, dh, dl)
+    1d6!             exploding dice (roll again and add on the maximum face)
+    1d8+4 fatal d12  PF2e fatal trait (applied on critical hits)
+    1d6+2 deadly d8  PF2e deadly trait (applied on critical hits)
+"""
+
+import random
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from math import comb
+from typing import Dict, List, Optional, Tuple
+
+
+VALID_DIE_SIZES = (4, 6, 8, 10, 12, 20, 100)
+MAX_DICE_PER_TERM = 100
+MAX_TERMS = 20
+MAX_EXPLOSIONS = 20
+
+_TERM_PATTERN = re.compile(
+    r"([+-]?)(?:(\d*)d(\d+)(!?)(?:(kh|kl|dh|dl|k)(\d+))?(!?)|(\d+))"
+)
+_TRAIT_PATTERN = re.compile(r"(fatal|deadly)(\d*)d(\d+)")
+
+
+def _validate_die_size(sides: int):
+    if sides not in VALID_DIE_SIZES:
+        raise ValueError("Die size must be one of: d4, d6, d8, d10, d12, d20, d100")
+
+
+def _top_k_mean(pmf: Dict[int, float], n: int, k: int) -> float:
+    """
+    Expected sum of the k highest of n independent dice sharing ``pmf``
+
+    Uses E[X] = v_min + sum((v_i - v_{i-1}) * P(X >= v_i)) per order
+    statistic, where P(j-th highest >= v) = P(Binomial(n, P(X >= v)) >= j).
+    """
+    values = sorted(pmf)
+    total = k * values[0]
+    tail = 1.0
+    for previous, value in zip(values, values[1:]):
+        tail -= pmf[previous]
+        q = min(max(tail, 0.0), 1.0)
+        # Sum over ranks j <= k of P(B >= j) equals E[min(B, k)]
+        expected_kept = sum(
+            min(b, k) * comb(n, b) * q ** b * (1 - q) ** (n - b)
+            for b in range(1, n + 1)
+        )
+        total += (value - previous) * expected_kept
+    return total
+
+
+@dataclass(frozen=True)
+class DiceTerm:
+    """A single group of identical dice, e.g. ``4d6kh3``"""
+    count: int
+    sides: int
+    sign: int = 1
+    keep: Optional[str] = None
+    keep_count: int = 0
+    explode: bool = False
+
+    @property
+    def kept(self) -> int:
+        """Number of dice that count toward the total"""
+        if self.keep in ("kh", "kl"):
+            return self.keep_count
+        if self.keep in ("dh", "dl"):
+            return self.count - self.keep_count
+        return self.count
+
+    @property
+    def keeps_highest(self) -> bool:
+        """Whether the kept dice are the highest ones"""
+        return self.keep in ("kh", "dl")
+
+    def describe(self, sides: Optional[int] = None) -> str:
+        """Canonical notation for this term"""
+        text = f"{self.count}d{sides or self.sides}"
+        if self.explode:
+            text += "!"
+        if self.keep:
+            text += f"{self.keep}{self.keep_count}"
+        return text
+
+    def select(self, rolls: List[int]) -> List[int]:
+        """Return the dice kept from a list of rolls"""
+        if self.keep is None:
+            return rolls
+        ordered = sorted(rolls, reverse=self.keeps_highest)
+        return ordered[:self.kept]
+
+    def roll_die(self, sides: int, rng=random) -> int:
+        """Roll one die of this term, exploding if required"""
+        value = rng.randint(1, sides)
+        if not self.explode:
+            return value
+        total = value
+        explosions = 0
+        while value == sides and explosions < MAX_EXPLOSIONS:
+            value = rng.randint(1, sides)
+            total += value
+            explosions += 1
+        return total
+
+    def die_pmf(self, sides: Optional[int] = None) -> Dict[int, float]:
+        """Probability mass function of one die, truncated at MAX_EXPLOSIONS"""
+        sides = sides or self.sides
+        if not self.explode:
+            return {face: 1 / sides for face in range(1, sides + 1)}
+        pmf: Dict[int, float] = {}
+        chance = 1.0
+        for depth in range(MAX_EXPLOSIONS + 1):
+            last = depth == MAX_EXPLOSIONS
+            for face in range(1, sides + 1):
+                if face == sides and not last:
+                    continue
+                value = depth * sides + face
+                pmf[value] = pmf.get(value, 0.0) + chance / sides
+            chance /= sides
+        return pmf
+
+    def average(self, sides: Optional[int] = None) -> float:
+        """Expected value of this term, ignoring its sign"""
+        pmf = self.die_pmf(sides)
+        if self.keep is None:
+            return self.count * sum(value * p for value, p in pmf.items())
+        if self.keeps_highest:
+            return _top_k_mean(pmf, self.count, self.kept)
+        mirrored = {-value: p for value, p in pmf.items()}
+        return -_top_k_mean(mirrored, self.count, self.kept)
+
+
+@dataclass(frozen=True)
+class DiceExpression:
+    """A compiled dice expression, safe to share and cache"""
+    notation: str
+    terms: Tuple[DiceTerm, ...]
+    modifier: int = 0
+    fatal: Optional[int] = None
+    deadly: Optional[Tuple[int, int]] = None
+
+    @property
+    def num_dice(self) -> int:
+        """Total number of dice rolled (before explosions)"""
+        return sum(term.count for term in self.terms)
+
+    @property
+    def is_simple(self) -> bool:
+        """Whether the expression reduces to plain ``XdY+Z``"""
+        return (
+            len(self.terms) == 1
+            and self.terms[0].sign == 1
+            and self.terms[0].keep is None
+            and not self.terms[0].explode
+            and self.fatal is None
+            and self.deadly is None
+        )
+
+    def term_sides(self, term: DiceTerm, critical: bool = False) -> int:
+        """
+        Die size for a term, upgraded by the fatal trait on a critical
+
+        Only the weapon's damage dice (the first term) are upgraded; extra
+        damage such as sneak attack keeps its die size.
+        """
+        if critical and self.fatal is not None and term is self.terms[0]:
+            return self.fatal
+        return term.sides
+
+    def roll(self, rng=random, critical: bool = False) -> dict:
+        """
+        Roll the expression
+
+        Args:
+            rng: Object providing ``randint`` (the ``random`` module by default)
+            critical: Apply PF2e critical hit rules (double damage, plus
+                fatal/deadly extra dice)
+
+        Returns:
+            Dictionary with the flattened rolls, per-term detail and total
+        """
+        rolls: List[int] = []
+        terms = []
+        dice_total = 0
+        for term in self.terms:
+            sides = self.term_sides(term, critical)
+            term_rolls = [term.roll_die(sides, rng) for _ in range(term.count)]
+            kept = term.select(term_rolls)
+            subtotal = term.sign * sum(kept)
+            rolls.extend(term_rolls)
+            dice_total += subtotal
+            terms.append({
+                "dice": term.describe(sides),
+                "rolls": term_rolls,
+                "kept": kept,
+                "subtotal": subtotal,
+            })
+
+        total = dice_total + self.modifier
+        extra_rolls: List[int] = []
+        if critical:
+            total *= 2
+            if self.fatal is not None:
+                extra_rolls.append(rng.randint(1, self.fatal))
+            if self.deadly is not None:
+                count, sides = self.deadly
+                extra_rolls.extend(rng.randint(1, sides) for _ in range(count))
+            total += sum(extra_rolls)
+
+        result = {
+            "rolls": rolls,
+            "modifier": self.modifier,
+            "total": total,
+        }
+        if not self.is_simple:
+            result["terms"] = terms
+        if critical:
+            result["critical"] = True
+            result["critical_extra_rolls"] = extra_rolls
+        return result
+
+    def average(self, critical: bool = False) -> float:
+        """Exact expected total of the expression"""
+        dice_avg = sum(
+            term.sign * term.average(self.term_sides(term, critical))
+            for term in self.terms
+        )
+        total = dice_avg + self.modifier
+        if critical:
+            total *= 2
+            if self.fatal is not None:
+                total += (self.fatal + 1) / 2
+            if self.deadly is not None:
+                count, sides = self.deadly
+                total += count * (sides + 1) / 2
+        return total
+
+
+def normalize_notation(notation: str) -> str:
+    """Canonical cache key for a notation string"""
+    return notation.strip().lower().replace(" ", "")
+
+
+def _parse_term(match) -> Tuple[Optional[DiceTerm], int]:
+    sign = -1 if match.group(1) == "-" else 1
+    if match.group(8) is not None:
+        return None, sign * int(match.group(8))
+
+    count = int(match.group(2)) if match.group(2) else 1
+    sides = int(match.group(3))
+    explode = bool(match.group(4) or match.group(7))
+    keep = match.group(5)
+    keep_count = int(match.group(6)) if match.group(6) else 0
+    if keep == "k":
+        keep = "kh"
+
+    if count < 1 or count > MAX_DICE_PER_TERM:
+        raise ValueError(f"Number of dice must be between 1 and {MAX_DICE_PER_TERM}")
+    _validate_die_size(sides)
+    if keep and not 1 <= keep_count <= count:
+        raise ValueError(f"Cannot {keep}{keep_count} from {count} dice")
+    if keep in ("dh", "dl") and keep_count == count:
+        raise ValueError(f"Cannot drop all {count} dice")
+
+    term = DiceTerm(
+        count=count,
+        sides=sides,
+        sign=sign,
+        keep=keep,
+        keep_count=keep_count,
+        explode=explode,
+    )
+    return term, 0
+
+
+@lru_cache(maxsize=512)
+def _compile_normalized(normalized: str) -> DiceExpression:
+    if not normalized:
+        raise ValueError("Invalid dice notation: empty expression")
+
+    terms: List[DiceTerm] = []
+    modifier = 0
+    pos = 0
+    length = len(normalized)
+    while pos < length:
+        if pos and normalized[pos] not in "+-":
+            break
+        match = _TERM_PATTERN.match(normalized, pos)
+        if not match or match.end() == pos:
+            raise ValueError(f"Invalid dice notation: {normalized}")
+        term, constant = _parse_term(match)
+        if term is not None:
+            terms.append(term)
+        modifier += constant
+        pos = match.end()
+
+    fatal = None
+    deadly = None
+    while pos < length:
+        match = _TRAIT_PATTERN.match(normalized, pos)
+        if not match:
+            raise ValueError(f"Invalid dice notation: {normalized}")
+        trait, count, sides = match.group(1), match.group(2), int(match.group(3))
+        _validate_die_size(sides)
+        if trait == "fatal":
+            if count:
+                raise ValueError("Fatal trait takes a die size only, e.g. 'fatal d12'")
+            fatal = sides
+        else:
+            deadly = (int(count) if count else 1, sides)
+        pos = match.end()
+
+    if not terms:
+        raise ValueError(f"Invalid dice notation: {normalized} (no dice)")
+    if len(terms) > MAX_TERMS:
+        raise ValueError(f"Expressions are limited to {MAX_TERMS} dice terms")
+    if fatal is not None and any(term.keep or term.explode for term in terms):
+        raise ValueError("Fatal trait cannot be combined with keep/drop or exploding dice")
+
+    return DiceExpression(
+        notation=normalized,
+        terms=tuple(terms),
+        modifier=modifier,
+        fatal=fatal,
+        deadly=deadly,
+    )
+
+
+@lru_cache(maxsize=1024)
+def compile_notation(notation: str) -> DiceExpression:
+    """
+    Compile dice notation into a cached DiceExpression
+
+    The raw string is cached as well as its normalized form, so a repeated
+    notation costs a single dictionary lookup.
+
+    Raises:
+        ValueError: If notation is invalid
+    """
+    return _compile_normalized(normalize_notation(notation))
@@ -2,17 +2,110 @@
 Dice rolling service with support for Pathfinder 2e dice notation
 """
 
-import re
-import random
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
+
+from app.services.dice_distribution import Distribution, get_distribution
+from app.services.dice_engine import DiceExpression, compile_notation
+from app.services.dice_vector import roll_many
+from app.services.rng import RngRegistry, RngStream, rng_registry
+from app.services.roll_history import DEFAULT_CAPACITY, DEFAULT_TABLE, HistoryRegistry, RollHistory
+
+
+MAX_BATCH_SIZE = 1000
+# Stands in for tables that have no rolls yet on read paths
+_EMPTY_HISTORY = RollHistory(1)
 
 
 class DiceService:
     """Service for handling dice rolls"""
     
-    def __init__(self):
-        self.roll_history: List[dict] = []
+    def __init__(
+        self,
+        history_capacity: int = DEFAULT_CAPACITY,
+        streams: Optional[RngRegistry] = None,
+    ):
+        self.histories = HistoryRegistry(capacity=history_capacity)
+        self.streams = streams or rng_registry
+        self.roll_log = None
+        self.hub = None
+    
+    def rng(self, table_id: Optional[str] = None, seed: Optional[int] = None) -> RngStream:
+        """RNG stream for a request: seeded one-off if ``seed`` is given, else the table's"""
+        return self.streams.resolve(table_id, seed)
+    
+    def reseed(self, table_id: Optional[str] = None, seed: Optional[int] = None) -> int:
+        """
+        Re-seed a table's stream (a fresh seed is drawn when omitted)
+        
+        Returns:
+            The table's new seed, which replays the same rolls when reused
+        """
+        return self.streams.reseed(table_id, seed).seed
+    
+    def end_session(self, table_id: Optional[str] = None) -> Optional[int]:
+        """
+        End a table's dice session
+        
+        Returns:
+            The ended session's seed, or None if the table had no stream
+        """
+        stream = self.streams.end(table_id)
+        return stream.seed if stream is not None else None
     
+    def session_info(self, table_id: Optional[str] = None) -> Optional[Dict]:
+        """
+        Whether a table has a live dice session, and its last ended session's seed
+        
+        Never creates a stream, and never reveals the live one's seed.
+        
+        Returns:
+            Dictionary with ``active`` and ``seed``, or None for an unknown table
+        """
+        seed = self.streams.ended_seed(table_id)
+        active = self.streams.peek(table_id) is not None
+        if seed is None and not active:
+            return None
+        return {"active": active, "seed": seed}
+    
+    def _record(
+        self,
+        table_id: Optional[str],
+        notation: str,
+        total: int,
+        rolls: List[int],
+        kind: str = "roll",
+        announce: bool = True,
+    ) -> int:
+        """Record a roll in the table history and the persistent log, and announce it"""
+        table_id = table_id or DEFAULT_TABLE
+        entry_id = self.histories.get(table_id).append(notation, total, rolls, kind=kind)
+        if self.roll_log is not None:
+            self.roll_log.submit(table_id, notation, total, rolls, kind=kind)
+        if announce and self.hub is not None:
+            self.hub.publish(table_id, "roll", {
+                "id": entry_id,
+                "notation": notation,
+                "type": kind,
+                "total": total,
+                "rolls": rolls,
+            })
+        return entry_id
+    
+    def compile_notation(self, notation: str) -> DiceExpression:
+        """
+        Compile dice notation into a cached expression
+
+        Args:
+            notation: Dice notation string (e.g., "2d6+1d4+3", "4d6kh3")
+
+        Returns:
+            Compiled DiceExpression
+
+        Raises:
+            ValueError: If notation is invalid
+        """
+        return compile_notation(notation)
+
     def parse_notation(self, notation: str) -> Tuple[int, int, int]:
         """
         Parse dice notation like "2d6+3" into components
@@ -24,103 +117,228 @@ class DiceService:
             Tuple of (num_dice, die_size, modifier)
             
         Raises:
-            ValueError: If notation is invalid
+            ValueError: If notation is invalid or uses more than a single
+                XdY term (use compile_notation for full expressions)
         """
-        notation = notation.strip().lower().replace(" ", "")
-        
-        # Pattern: XdY+/-Z or XdY
-        pattern = r"^(\d+)d(\d+)(([+-])(\d+))?$"
-        match = re.match(pattern, notation)
-        
-        if not match:
-            raise ValueError(f"Invalid dice notation: {notation}")
-        
-        num_dice = int(match.group(1))
-        die_size = int(match.group(2))
-        
-        modifier = 0
-        if match.group(3):
-            sign = match.group(4)
-            value = int(match.group(5))
-            modifier = value if sign == "+" else -value
-        
-        # Validate ranges
-        if num_dice < 1 or num_dice > 100:
-            raise ValueError("Number of dice must be between 1 and 100")
-        if die_size not in [4, 6, 8, 10, 12, 20, 100]:
-            raise ValueError("Die size must be one of: d4, d6, d8, d10, d12, d20, d100")
-        
-        return num_dice, die_size, modifier
+        expression = compile_notation(notation)
+        if not expression.is_simple:
+            raise ValueError(
+                f"Notation {notation} is not of the form XdY+Z; use compile_notation"
+            )
+        term = expression.terms[0]
+        return term.count, term.sides, expression.modifier
     
-    def roll_dice(self, notation: str) -> dict:
+    def roll_dice(
+        self,
+        notation: str,
+        critical: bool = False,
+        table_id: Optional[str] = None,
+        seed: Optional[int] = None,
+    ) -> dict:
         """
         Roll dice based on notation
         
         Args:
             notation: Dice notation string
+            critical: Apply critical hit rules (double damage, fatal/deadly)
+            table_id: Table whose stream and history are used
+            seed: Roll from a one-off stream with this seed instead
             
         Returns:
             Dictionary with roll results
         """
-        num_dice, die_size, modifier = self.parse_notation(notation)
-        
-        rolls = [random.randint(1, die_size) for _ in range(num_dice)]
-        total = sum(rolls) + modifier
+        expression = compile_notation(notation)
+        first = expression.terms[0]
         
         result = {
             "notation": notation,
-            "num_dice": num_dice,
-            "die_size": die_size,
-            "rolls": rolls,
-            "modifier": modifier,
-            "total": total
+            "num_dice": expression.num_dice,
+            "die_size": expression.term_sides(first, critical),
         }
+        result.update(expression.roll(self.rng(table_id, seed), critical=critical))
+        if seed is not None:
+            result["seed"] = seed
         
-        self.roll_history.append(result)
+        result["id"] = self._record(table_id, notation, result["total"], result["rolls"])
         
         return result
     
-    def roll_with_advantage(self) -> dict:
+    def roll_batch(
+        self,
+        notations: Optional[List[str]] = None,
+        notation: Optional[str] = None,
+        count: int = 1,
+        critical: bool = False,
+        detail: bool = False,
+        table_id: Optional[str] = None,
+        seed: Optional[int] = None,
+    ) -> dict:
+        """
+        Roll many expressions at once
+        
+        Either pass a list of notations, or one notation with a repeat count.
+        Identical notations are grouped and every die of a group is drawn in
+        a single vectorized pass.
+        
+        Args:
+            notations: Notation for each roll
+            notation: Single notation to repeat ``count`` times
+            count: Number of repetitions of ``notation``
+            critical: Apply critical hit rules to every roll
+            detail: Include the individual dice of every roll
+            table_id: Table whose stream and history are used
+            seed: Roll from a one-off stream with this seed instead
+            
+        Returns:
+            Dictionary with per-roll totals (and dice when requested)
+            
+        Raises:
+            ValueError: If the batch is empty, too large or a notation is invalid
+        """
+        if notations is None:
+            if notation is None:
+                raise ValueError("Provide either notations or notation")
+            if not 1 <= count <= MAX_BATCH_SIZE:
+                raise ValueError(f"Count must be between 1 and {MAX_BATCH_SIZE}")
+            notations = [notation] * count
+        elif notation is not None:
+            raise ValueError("Provide either notations or notation, not both")
+        
+        if not notations:
+            raise ValueError("Batch must contain at least one roll")
+        if len(notations) > MAX_BATCH_SIZE:
+            raise ValueError(f"Batch size must not exceed {MAX_BATCH_SIZE}")
+        
+        groups = {}
+        for index, item in enumerate(notations):
+            groups.setdefault(compile_notation(item), []).append(index)
+        
+        stream = self.rng(table_id, seed)
+        totals: List[int] = [0] * len(notations)
+        rolls: List[List[int]] = [[] for _ in notations]
+        for expression, indices in groups.items():
+            group_totals, group_rolls = roll_many(
+                expression, len(indices), rng=stream.vector, critical=critical, detail=True
+            )
+            for position, index in enumerate(indices):
+                totals[index] = group_totals[position]
+                rolls[index] = group_rolls[position]
+        
+        for item, total, dice in zip(notations, totals, rolls):
+            self._record(table_id, item, total, dice, announce=False)
+        if self.hub is not None:
+            # One event for the whole batch rather than one per roll
+            self.hub.publish(table_id, "roll_batch", {"notations": notations, "totals": totals})
+        
+        result = {"count": len(totals), "totals": totals}
+        if len(groups) > 1:
+            result["notations"] = notations
+        else:
+            result["notation"] = notations[0]
+        if detail:
+            result["rolls"] = rolls
+        if seed is not None:
+            result["seed"] = seed
+        return result
+    
+    def roll_with_advantage(
+        self,
+        table_id: Optional[str] = None,
+        seed: Optional[int] = None,
+    ) -> dict:
         """Roll d20 with advantage (roll twice, take highest)"""
-        roll1 = random.randint(1, 20)
-        roll2 = random.randint(1, 20)
+        rng = self.rng(table_id, seed)
+        roll1 = rng.randint(1, 20)
+        roll2 = rng.randint(1, 20)
         result = {
             "notation": "1d20 (Advantage)",
             "rolls": [roll1, roll2],
             "result": max(roll1, roll2),
             "type": "advantage"
         }
-        self.roll_history.append(result)
+        self._record(table_id, result["notation"], result["result"], result["rolls"], kind="advantage")
         return result
     
-    def roll_with_disadvantage(self) -> dict:
+    def roll_with_disadvantage(
+        self,
+        table_id: Optional[str] = None,
+        seed: Optional[int] = None,
+    ) -> dict:
         """Roll d20 with disadvantage (roll twice, take lowest)"""
-        roll1 = random.randint(1, 20)
-        roll2 = random.randint(1, 20)
+        rng = self.rng(table_id, seed)
+        roll1 = rng.randint(1, 20)
+        roll2 = rng.randint(1, 20)
         result = {
             "notation": "1d20 (Disadvantage)",
             "rolls": [roll1, roll2],
             "result": min(roll1, roll2),
             "type": "disadvantage"
         }
-        self.roll_history.append(result)
+        self._record(table_id, result["notation"], result["result"], result["rolls"], kind="disadvantage")
         return result
     
-    def get_history(self) -> List[dict]:
-        """Get roll history"""
-        return self.roll_history.copy()
+    def history(self, table_id: Optional[str] = None) -> Optional[RollHistory]:
+        """Get the bounded roll history for a table (None if it has no rolls yet)"""
+        return self.histories.peek(table_id)
     
-    def clear_history(self):
-        """Clear roll history"""
-        self.roll_history.clear()
+    def get_history(
+        self,
+        table_id: Optional[str] = None,
+        cursor: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[dict]:
+        """Get roll history for a table, newest first"""
+        history = self.histories.peek(table_id) or _EMPTY_HISTORY
+        entries, _ = history.page(cursor=cursor, limit=limit or history.capacity)
+        return entries
+    
+    def history_page(
+        self,
+        table_id: Optional[str] = None,
+        cursor: Optional[int] = None,
+        limit: int = 50,
+    ) -> dict:
+        """
+        Get one page of roll history, newest first
+        
+        Args:
+            table_id: Table to read (default table when omitted)
+            cursor: ``next_cursor`` from the previous page
+            limit: Maximum number of rolls to return
+            
+        Returns:
+            Dictionary with the rolls and the cursor of the next page
+        """
+        # Reads never create a history, so they cannot evict a live table's
+        history = self.histories.peek(table_id) or _EMPTY_HISTORY
+        entries, next_cursor = history.page(cursor=cursor, limit=limit)
+        return {
+            "history": entries,
+            "count": len(entries),
+            "retained": len(history),
+            "next_cursor": next_cursor,
+        }
+    
+    def clear_history(self, table_id: Optional[str] = None):
+        """Clear roll history for a table"""
+        history = self.histories.peek(table_id)
+        if history is not None:
+            history.clear()
+    
+    @staticmethod
+    def calculate_average(notation: str, critical: bool = False) -> float:
+        """Calculate the exact average roll for a given notation"""
+        return compile_notation(notation).average(critical=critical)
     
     @staticmethod
-    def calculate_average(notation: str) -> float:
-        """Calculate average roll for a given notation"""
-        service = DiceService()
-        num_dice, die_size, modifier = service.parse_notation(notation)
-        avg_per_die = (die_size + 1) / 2
-        return (num_dice * avg_per_die) + modifier
+    def calculate_distribution(notation: str, critical: bool = False) -> Distribution:
+        """
+        Calculate the exact probability distribution for a given notation
+        
+        Raises:
+            ValueError: If notation is invalid or too large to compute exactly
+        """
+        return get_distribution(notation, critical=critical)
 
 
 # Create global instance
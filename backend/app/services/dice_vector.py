@@ -0,0 +1,140 @@
+"""
+Vectorized dice rolling for batches of identical expressions
+
+Draws every die of a batch in one pass. NumPy is used when it is
+installed; otherwise a pure-Python fallback draws each term with a single
+``choices`` call.
+"""
+
+import random
+from typing import List, Optional, Tuple
+
+from app.services.dice_engine import DiceExpression, MAX_EXPLOSIONS
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when NumPy is absent
+    np = None
+
+
+HAS_NUMPY = np is not None
+
+_default_generator = np.random.default_rng() if HAS_NUMPY else None
+
+
+def _is_numpy_generator(rng) -> bool:
+    return HAS_NUMPY and isinstance(rng, np.random.Generator)
+
+
+def _roll_many_numpy(
+    expression: DiceExpression,
+    count: int,
+    generator,
+    critical: bool,
+    detail: bool,
+) -> Tuple[List[int], Optional[List[List[int]]]]:
+    totals = np.full(count, expression.modifier, dtype=np.int64)
+    columns = []
+    for term in expression.terms:
+        sides = expression.term_sides(term, critical)
+        draws = generator.integers(1, sides + 1, size=(count, term.count), dtype=np.int64)
+        if term.explode:
+            active = draws == sides
+            explosions = 0
+            while explosions < MAX_EXPLOSIONS and active.any():
+                extra = generator.integers(1, sides + 1, size=int(active.sum()), dtype=np.int64)
+                draws[active] += extra
+                still = np.zeros_like(active)
+                still[active] = extra == sides
+                active = still
+                explosions += 1
+        if term.keep is None:
+            kept = draws
+        else:
+            ordered = np.sort(draws, axis=1)
+            kept = ordered[:, term.count - term.kept:] if term.keeps_highest else ordered[:, :term.kept]
+        totals += term.sign * kept.sum(axis=1)
+        if detail:
+            columns.append(draws)
+
+    if critical:
+        totals *= 2
+        if expression.fatal is not None:
+            totals += generator.integers(1, expression.fatal + 1, size=count, dtype=np.int64)
+        if expression.deadly is not None:
+            dice, sides = expression.deadly
+            totals += generator.integers(1, sides + 1, size=(count, dice), dtype=np.int64).sum(axis=1)
+
+    rolls = None
+    if detail:
+        rolls = np.concatenate(columns, axis=1).tolist()
+    return totals.tolist(), rolls
+
+
+def _roll_many_python(
+    expression: DiceExpression,
+    count: int,
+    rng,
+    critical: bool,
+    detail: bool,
+) -> Tuple[List[int], Optional[List[List[int]]]]:
+    totals = [expression.modifier] * count
+    rolls: Optional[List[List[int]]] = [[] for _ in range(count)] if detail else None
+    for term in expression.terms:
+        sides = expression.term_sides(term, critical)
+        faces = range(1, sides + 1)
+        flat = rng.choices(faces, k=count * term.count)
+        if term.explode:
+            for index, value in enumerate(flat):
+                explosions = 0
+                last = value
+                while last == sides and explosions < MAX_EXPLOSIONS:
+                    last = rng.randint(1, sides)
+                    value += last
+                    explosions += 1
+                flat[index] = value
+        for row in range(count):
+            row_rolls = flat[row * term.count:(row + 1) * term.count]
+            totals[row] += term.sign * sum(term.select(row_rolls))
+            if rolls is not None:
+                rolls[row].extend(row_rolls)
+
+    if critical:
+        for row in range(count):
+            totals[row] *= 2
+            if expression.fatal is not None:
+                totals[row] += rng.randint(1, expression.fatal)
+            if expression.deadly is not None:
+                dice, sides = expression.deadly
+                totals[row] += sum(rng.choices(range(1, sides + 1), k=dice))
+    return totals, rolls
+
+
+def roll_many(
+    expression: DiceExpression,
+    count: int,
+    rng=None,
+    critical: bool = False,
+    detail: bool = False,
+) -> Tuple[List[int], Optional[List[List[int]]]]:
+    """
+    Roll a compiled expression ``count`` times in one vectorized pass
+
+    Args:
+        expression: Compiled dice expression
+        count: Number of independent rolls
+        rng: NumPy Generator, or an object with ``choices``/``randint``
+            (defaults to a NumPy Generator when available, else ``random``)
+        critical: Apply critical hit rules to every roll
+        detail: Also return the individual dice of each roll
+
+    Returns:
+        Tuple of (totals, per-roll dice or None)
+    """
+    if count < 1:
+        return [], [] if detail else None
+    if rng is None:
+        rng = _default_generator if HAS_NUMPY else random
+    if _is_numpy_generator(rng):
+        return _roll_many_numpy(expression, count, rng, critical, detail)
+    return _roll_many_python(expression, count, rng, critical, detail)
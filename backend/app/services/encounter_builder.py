@@ -0,0 +1,181 @@
+"""
+Exact-fit encounter builder
+
+Monsters are grouped into an XP table (one group per distinct XP value,
+split by required type when type constraints are given). A bounded
+composition DP over (group, monster count, XP spent, required types
+covered) counts every encounter that fits the budget, which lets us
+sample uniformly among them and never overspend.
+"""
+
+from functools import reduce
+from math import comb, gcd
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# DP state: (monster count, XP units spent, bitmask of required types covered)
+State = Tuple[int, int, int]
+
+
+class XPGroup:
+    """Monsters sharing an XP value (and required-type slot)"""
+
+    def __init__(self, xp: int, type_bit: int, monsters: List[Dict]):
+        self.xp = xp
+        self.type_bit = type_bit
+        self.monsters = monsters
+
+    def __len__(self) -> int:
+        return len(self.monsters)
+
+
+def build_xp_table(monsters: Sequence[Dict], required_types: Sequence[str] = ()) -> List[XPGroup]:
+    """
+    Group candidate monsters by XP value
+
+    Monsters of a required type get their own group so the solver can
+    track which required types an encounter covers.
+    """
+    bits = {t.lower(): 1 << i for i, t in enumerate(dict.fromkeys(t.lower() for t in required_types))}
+    grouped: Dict[Tuple[int, int], List[Dict]] = {}
+    for monster in monsters:
+        bit = bits.get(monster["type"].lower(), 0)
+        grouped.setdefault((monster["xp"], bit), []).append(monster)
+    return [XPGroup(xp, bit, members) for (xp, bit), members in sorted(grouped.items())]
+
+
+class EncounterSolver:
+    """Counts and uniformly samples encounters that fit an XP budget"""
+
+    def __init__(
+        self,
+        table: List[XPGroup],
+        xp_budget: int,
+        tolerance: int = 0,
+        max_count: int = 8,
+        allow_duplicates: bool = True,
+        required_mask: int = 0,
+    ):
+        self.table = [group for group in table if group.xp <= xp_budget]
+        self.xp_budget = xp_budget
+        self.max_count = max_count
+        self.allow_duplicates = allow_duplicates
+        self.required_mask = required_mask
+
+        self.unit = reduce(gcd, (group.xp for group in self.table), 0) or 1
+        self.budget_units = xp_budget // self.unit
+        self.min_units = max(0, -(-(xp_budget - tolerance) // self.unit))
+        self.stages = self._solve()
+        self._solutions: Optional[Dict[State, int]] = None
+
+    def _multiplicity(self, group: XPGroup, count: int) -> int:
+        """Number of distinct ways to pick ``count`` monsters from a group"""
+        if self.allow_duplicates:
+            return comb(len(group) + count - 1, count)
+        return comb(len(group), count)
+
+    def _solve(self) -> List[Dict[State, int]]:
+        stages: List[Dict[State, int]] = [{(0, 0, 0): 1}]
+        for group in self.table:
+            step = group.xp // self.unit
+            limit = self.max_count if self.allow_duplicates else min(self.max_count, len(group))
+            multiplicities = [self._multiplicity(group, c) for c in range(limit + 1)]
+            current: Dict[State, int] = {}
+            for (count, spent, mask), ways in stages[-1].items():
+                top = min(limit, self.max_count - count, (self.budget_units - spent) // step)
+                for c in range(top + 1):
+                    state = (count + c, spent + c * step, mask | group.type_bit if c else mask)
+                    current[state] = current.get(state, 0) + ways * multiplicities[c]
+            stages.append(current)
+        return stages
+
+    def _targets(self, min_units: int) -> Dict[State, int]:
+        return {
+            state: ways
+            for state, ways in self.stages[-1].items()
+            if state[0] > 0
+            and min_units <= state[1] <= self.budget_units
+            and state[2] & self.required_mask == self.required_mask
+        }
+
+    def solutions(self) -> Dict[State, int]:
+        """
+        Final states that satisfy every constraint
+
+        Falls back to the highest XP total below the tolerance window when
+        nothing lands inside it. Computed once; the solver is read-only
+        afterwards, so it can be shared between calls and threads.
+        """
+        if self._solutions is None:
+            self._solutions = self._find_solutions()
+        return self._solutions
+
+    def _find_solutions(self) -> Dict[State, int]:
+        targets = self._targets(self.min_units)
+        if targets:
+            return targets
+        feasible = self._targets(0)
+        if not feasible:
+            return {}
+        best = max(state[1] for state in feasible)
+        return {state: ways for state, ways in feasible.items() if state[1] == best}
+
+    def count(self) -> int:
+        """Number of distinct encounters the sampler chooses from"""
+        return sum(self.solutions().values())
+
+    def sample(self, rng) -> List[Dict]:
+        """
+        Draw one encounter uniformly from all valid encounters
+
+        Returns:
+            List of monsters (empty if nothing fits)
+        """
+        targets = self.solutions()
+        if not targets:
+            return []
+        state = _weighted_pick(rng, list(targets.items()))
+
+        monsters: List[Dict] = []
+        for index in range(len(self.table), 0, -1):
+            group = self.table[index - 1]
+            step = group.xp // self.unit
+            previous = self.stages[index - 1]
+            count, spent, mask = state
+            options = []
+            for c in range(count + 1):
+                before_spent = spent - c * step
+                if before_spent < 0:
+                    break
+                masks = [mask] if c == 0 else [
+                    m for m in {mask, mask & ~group.type_bit} if m | group.type_bit == mask
+                ]
+                for before_mask in masks:
+                    ways = previous.get((count - c, before_spent, before_mask))
+                    if ways:
+                        options.append(((c, (count - c, before_spent, before_mask)), ways * self._multiplicity(group, c)))
+            c, state = _weighted_pick(rng, options)
+            if c:
+                monsters.extend(self._pick_from_group(rng, group, c))
+        return monsters
+
+    def _pick_from_group(self, rng, group: XPGroup, count: int) -> List[Dict]:
+        """Uniformly pick a multiset (or set) of ``count`` monsters from a group"""
+        size = len(group)
+        if not self.allow_duplicates:
+            return [group.monsters[i] for i in rng.sample(range(size), count)]
+        # Stars and bars: a uniform count-subset of size+count-1 slots maps
+        # to a uniform multiset of size ``count``
+        chosen = sorted(rng.sample(range(size + count - 1), count))
+        return [group.monsters[slot - offset] for offset, slot in enumerate(chosen)]
+
+
+def _weighted_pick(rng, options: List[Tuple[object, int]]):
+    """Pick a key with probability proportional to its (big integer) weight"""
+    total = sum(weight for _, weight in options)
+    point = rng.randrange(total)
+    for key, weight in options:
+        if point < weight:
+            return key
+        point -= weight
+    return options[-1][0]
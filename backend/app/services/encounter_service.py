@@ -2,9 +2,33 @@
 Encounter generation service for creating balanced combat encounters
 """
 
-import random
-from typing import List, Dict, Optional
-from app.services.bestiary import BESTIARY
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+from app.services.bestiary import bestiary as default_bestiary
+from app.services.encounter_builder import EncounterSolver, build_xp_table
+from app.services.rng import RngStream, derive_seed, rng_registry
+from app.services.worker_pool import WorkerPool, worker_pool
+
+
+ENCOUNTER_WORKERS = int(os.getenv("ENCOUNTER_WORKERS", str(min(4, os.cpu_count() or 1))))
+ENCOUNTER_POOL_CACHE_SIZE = int(os.getenv("ENCOUNTER_POOL_CACHE_SIZE", "256"))
+
+MAX_BATCH_SIZE = 200
+# Encounters sharing a spec are generated together, this many per work unit
+BATCH_CHUNK_SIZE = 10
+
+SPEC_FIELDS = (
+    "party_level",
+    "party_size",
+    "difficulty",
+    "tolerance",
+    "max_monsters",
+    "required_types",
+    "allow_duplicates",
+)
 
 
 class EncounterService:
@@ -18,8 +42,26 @@ class EncounterService:
         "extreme": 160
     }
     
-    def __init__(self):
-        self.bestiary = BESTIARY
+    MAX_MONSTERS = 20
+    
+    def __init__(
+        self,
+        bestiary=None,
+        workers: int = ENCOUNTER_WORKERS,
+        cache_size: int = ENCOUNTER_POOL_CACHE_SIZE,
+        pool: Optional[WorkerPool] = None,
+    ):
+        self.bestiary = bestiary or default_bestiary
+        # 0 or 1 generates batches inline instead of in the shared pool
+        self.workers = workers
+        self.pool = pool or worker_pool
+        # Candidate pools and solvers, valid for one bestiary generation
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, object]" = OrderedDict()
+        self._cache_generation = None
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._cache_lock = threading.Lock()
     
     def calculate_xp_budget(self, party_level: int, party_size: int, difficulty: str) -> int:
         """
@@ -39,68 +81,165 @@ class EncounterService:
         base_xp = self.DIFFICULTY_XP_BUDGETS[difficulty]
         return base_xp * party_size
     
+    def rng(self, table_id: Optional[str] = None, seed: Optional[int] = None) -> RngStream:
+        """Seeded one-off stream, or the table's dedicated encounter stream"""
+        if seed is not None:
+            return RngStream(seed)
+        return rng_registry.get(table_id).spawn("encounters")
+    
     def get_monsters_by_cr(self, min_cr: float = None, max_cr: float = None) -> List[Dict]:
         """Get monsters within CR range"""
-        monsters = []
-        for monster in self.bestiary:
-            cr = monster["cr"]
-            if min_cr is not None and cr < min_cr:
-                continue
-            if max_cr is not None and cr > max_cr:
-                continue
-            monsters.append(monster)
-        return monsters
+        return self.bestiary.cr_range(min_cr, max_cr)
+    
+    def _cached(self, key: tuple, build: Callable[[], object]):
+        """
+        LRU lookup that is emptied whenever the bestiary is reloaded
+        
+        ``build`` runs outside the lock; its result is only kept if the
+        bestiary was not reloaded in the meantime.
+        """
+        generation = self.bestiary.generation
+        with self._cache_lock:
+            if self._cache_generation != generation:
+                self._cache.clear()
+                self._cache_generation = generation
+            value = self._cache.get(key)
+            if value is not None:
+                self._cache.move_to_end(key)
+                self._cache_hits += 1
+                return value
+            self._cache_misses += 1
+        value = build()
+        with self._cache_lock:
+            if self._cache_generation == generation and self.cache_size > 0:
+                self._cache[key] = value
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return value
+    
+    def cache_info(self) -> Dict:
+        """Candidate-pool cache statistics"""
+        with self._cache_lock:
+            return {
+                "size": len(self._cache),
+                "max_size": self.cache_size,
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+                "generation": self._cache_generation,
+            }
+    
+    def clear_cache(self):
+        """Drop every cached candidate pool and solver"""
+        with self._cache_lock:
+            self._cache.clear()
     
     def generate_encounter(
         self,
         party_level: int,
         party_size: int = 4,
-        difficulty: str = "moderate"
+        difficulty: str = "moderate",
+        seed: Optional[int] = None,
+        table_id: Optional[str] = None,
+        tolerance: int = 0,
+        max_monsters: Optional[int] = None,
+        required_types: Optional[List[str]] = None,
+        allow_duplicates: bool = True,
     ) -> Dict:
         """
         Generate a balanced encounter
         
+        The encounter is drawn uniformly from every combination of suitable
+        monsters whose XP lands in [budget - tolerance, budget]. If none
+        does, the closest total under the budget is used instead.
+        
         Args:
             party_level: Average party level
             party_size: Number of characters in party
             difficulty: Difficulty level
+            seed: Seed for a reproducible encounter
+            table_id: Table whose RNG stream is used when no seed is given
+            tolerance: XP the encounter may fall short of the budget
+            max_monsters: Maximum number of monsters (default: 2 per PC)
+            required_types: Creature types that must each appear at least once
+            allow_duplicates: Whether the same monster may appear more than once
             
         Returns:
             Dictionary with encounter details
         """
+        solver, xp_budget = self._plan(
+            party_level, party_size, difficulty, tolerance, max_monsters, required_types, allow_duplicates
+        )
+        return self._sample(solver, party_level, party_size, difficulty, xp_budget, self.rng(table_id, seed))
+    
+    def _plan(
+        self,
+        party_level: int,
+        party_size: int,
+        difficulty: str,
+        tolerance: int,
+        max_monsters: Optional[int],
+        required_types: Optional[List[str]],
+        allow_duplicates: bool,
+    ) -> Tuple[EncounterSolver, int]:
+        """Validate a spec and build the solver for its candidate monsters"""
         xp_budget = self.calculate_xp_budget(party_level, party_size, difficulty)
+        if party_size < 1:
+            raise ValueError("Party size must be at least 1")
+        if tolerance < 0:
+            raise ValueError("Tolerance must not be negative")
+        if max_monsters is None:
+            max_monsters = min(party_size * 2, self.MAX_MONSTERS)
+        if not 1 <= max_monsters <= self.MAX_MONSTERS:
+            raise ValueError(f"max_monsters must be between 1 and {self.MAX_MONSTERS}")
+        required_types = required_types or []
         
         # Get appropriate monsters (CR = party_level +/- 2)
-        suitable_monsters = self.get_monsters_by_cr(
-            min_cr=max(0, party_level - 2),
-            max_cr=party_level + 3
+        min_cr, max_cr = max(0, party_level - 2), party_level + 3
+        suitable_monsters = self._cached(
+            ("monsters", min_cr, max_cr),
+            lambda: self.get_monsters_by_cr(min_cr=min_cr, max_cr=max_cr),
         )
         
         if not suitable_monsters:
             raise ValueError(f"No suitable monsters found for party level {party_level}")
         
-        # Generate encounter within XP budget
-        encounter_monsters = []
-        remaining_xp = xp_budget
-        
-        attempts = 0
-        max_attempts = 50
+        available_types = {m["type"].lower() for m in suitable_monsters}
+        missing = [t for t in required_types if t.lower() not in available_types]
+        if missing:
+            raise ValueError(f"No suitable monsters of type(s) {missing} for party level {party_level}")
         
-        while remaining_xp > 20 and attempts < max_attempts:
-            # Filter monsters that fit in remaining budget
-            affordable_monsters = [
-                m for m in suitable_monsters
-                if m["xp"] <= remaining_xp
-            ]
-            
-            if not affordable_monsters:
-                break
-            
-            # Pick a random monster
-            monster = random.choice(affordable_monsters)
-            encounter_monsters.append(monster)
-            remaining_xp -= monster["xp"]
-            attempts += 1
+        # Count every encounter that fits the budget, then sample one uniformly.
+        # The solver only depends on the candidate pool and the XP window, so
+        # repeated specs at the same level reuse it.
+        solver = self._cached(
+            ("solver", min_cr, max_cr, xp_budget, tolerance, max_monsters,
+             tuple(t.lower() for t in required_types), allow_duplicates),
+            lambda: EncounterSolver(
+                build_xp_table(suitable_monsters, required_types),
+                xp_budget,
+                tolerance=tolerance,
+                max_count=max_monsters,
+                allow_duplicates=allow_duplicates,
+                required_mask=(1 << len({t.lower() for t in required_types})) - 1,
+            ),
+        )
+        if required_types and not solver.solutions():
+            raise ValueError("No encounter satisfies the required types within the XP budget")
+        return solver, xp_budget
+    
+    def _sample(
+        self,
+        solver: EncounterSolver,
+        party_level: int,
+        party_size: int,
+        difficulty: str,
+        xp_budget: int,
+        rng,
+    ) -> Dict:
+        """Draw one encounter from a solver and describe it"""
+        # Copies, since cached solvers share their monster dicts between calls
+        encounter_monsters = [dict(m) for m in solver.sample(rng)]
+        encounter_monsters.sort(key=lambda m: (-m["xp"], m["name"]))
         
         # Calculate actual difficulty
         total_xp = sum(m["xp"] for m in encounter_monsters)
@@ -113,9 +252,134 @@ class EncounterService:
             "total_xp": total_xp,
             "monsters": encounter_monsters,
             "monster_count": len(encounter_monsters),
+            "combinations": solver.count(),
             "tactics": self._generate_tactics(encounter_monsters)
         }
     
+    def generate_chunk(self, spec: Dict, jobs: List[Tuple[int, int]]) -> List[Dict]:
+        """
+        Generate several encounters from one spec, building its solver once
+        
+        Args:
+            spec: Keyword arguments for ``generate_encounter`` (see SPEC_FIELDS)
+            jobs: (batch index, seed) of each encounter to draw
+            
+        Returns:
+            One entry per job with the encounter, or the error for the spec
+        """
+        try:
+            solver, xp_budget = self._plan(**spec)
+        except ValueError as e:
+            return [{"index": index, "seed": seed, "error": str(e)} for index, seed in jobs]
+        return [
+            {
+                "index": index,
+                "seed": seed,
+                "encounter": self._sample(
+                    solver, spec["party_level"], spec["party_size"], spec["difficulty"], xp_budget, RngStream(seed)
+                ),
+            }
+            for index, seed in jobs
+        ]
+    
+    def _pool_version(self) -> tuple:
+        # Workers hold the bestiary they loaded at start; use fresh ones after a reload
+        return ("bestiary", self.bestiary.generation)
+    
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 1:
+            return None
+        return self.pool.executor(version=self._pool_version())
+    
+    def start_pool(self):
+        """Start the shared worker pool on the current bestiary, ahead of the first batch"""
+        self.pool.start(version=self._pool_version())
+    
+    def generate_batch(
+        self,
+        specs: Optional[List[Dict]] = None,
+        spec: Optional[Dict] = None,
+        count: int = 1,
+        seed: Optional[int] = None,
+        table_id: Optional[str] = None,
+    ) -> Iterator[Dict]:
+        """
+        Generate many encounters, yielding each as soon as it is ready
+        
+        Either pass a list of specs, or one spec with a repeat count.
+        Identical specs are grouped into chunks that fan out to the shared
+        process pool when ``workers`` > 1. Each chunk plans its spec, but
+        solvers are cached per process, so a group's solver is built once
+        inline and at most once per worker. Each encounter gets its own
+        seed, so any room can be regenerated alone via ``seed``.
+        
+        Args:
+            specs: ``generate_encounter`` keyword arguments for each encounter
+            spec: Single spec to repeat ``count`` times
+            count: Number of repetitions of ``spec``
+            seed: Seed for a reproducible batch
+            table_id: Table whose encounter stream seeds the batch otherwise
+            
+        Returns:
+            Iterator of {"index", "seed", "encounter"} or {"index", "seed", "error"}
+            in completion order
+            
+        Raises:
+            ValueError: If the batch is empty or too large
+        """
+        if specs is None:
+            if spec is None:
+                raise ValueError("Provide either specs or spec")
+            if not 1 <= count <= MAX_BATCH_SIZE:
+                raise ValueError(f"Count must be between 1 and {MAX_BATCH_SIZE}")
+            specs = [spec] * count
+        elif spec is not None:
+            raise ValueError("Provide either specs or spec, not both")
+        
+        if not specs:
+            raise ValueError("Batch must contain at least one encounter")
+        if len(specs) > MAX_BATCH_SIZE:
+            raise ValueError(f"Batch size must not exceed {MAX_BATCH_SIZE}")
+        
+        base_seed = seed if seed is not None else self.rng(table_id).randrange(2 ** 64)
+        groups: Dict[tuple, List[Tuple[int, int]]] = {}
+        normalized: Dict[tuple, Dict] = {}
+        for index, item in enumerate(specs):
+            item = {field: item.get(field) for field in SPEC_FIELDS}
+            if item["party_size"] is None:
+                item["party_size"] = 4
+            item["difficulty"] = item["difficulty"] or "moderate"
+            item["tolerance"] = item["tolerance"] or 0
+            item["required_types"] = sorted(item["required_types"] or [])
+            item["allow_duplicates"] = item["allow_duplicates"] is not False
+            key = tuple(tuple(v) if isinstance(v, list) else v for v in item.values())
+            normalized[key] = item
+            groups.setdefault(key, []).append((index, derive_seed(base_seed, "batch", index)))
+        
+        units = [
+            (normalized[key], jobs[start:start + BATCH_CHUNK_SIZE])
+            for key, jobs in groups.items()
+            for start in range(0, len(jobs), BATCH_CHUNK_SIZE)
+        ]
+        return self._run_units(units)
+    
+    def _run_units(self, units: List[Tuple[Dict, List[Tuple[int, int]]]]) -> Iterator[Dict]:
+        executor = self._executor()
+        if executor is None:
+            for item, jobs in units:
+                yield from self.generate_chunk(item, jobs)
+            return
+        pending = {executor.submit(_generate_chunk, item, jobs) for item, jobs in units}
+        try:
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    yield from future.result()
+        finally:
+            # Client went away mid-stream
+            for future in pending:
+                future.cancel()
+    
     def _generate_tactics(self, monsters: List[Dict]) -> str:
         """Generate tactical suggestions for the encounter"""
         if not monsters:
@@ -132,5 +396,10 @@ class EncounterService:
             return f"Large group - Use area control and prioritize high-damage targets"
 
 
+def _generate_chunk(spec: Dict, jobs: List[Tuple[int, int]]) -> List[Dict]:
+    """Process pool entry point for ``EncounterService.generate_chunk``"""
+    return encounter_service.generate_chunk(spec, jobs)
+
+
 # Create global instance
 encounter_service = EncounterService()
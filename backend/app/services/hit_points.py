@@ -0,0 +1,93 @@
+"""
+Atomic hit point updates for combat
+
+Damage and healing are applied by a single ``UPDATE ... RETURNING``
+statement that clamps HP in SQL, so concurrent hits on the same character
+can never lose an update, and a whole area effect is one statement in one
+transaction (after taking its change version) instead of a
+read-modify-write per target.
+"""
+
+from typing import Dict, List, Tuple
+
+from sqlalchemy import case, update
+from sqlalchemy.orm import Session
+
+from app.models.character import CHARACTER_FIELDS, Character, bump_change_version
+
+
+def _apply(db: Session, deltas: Dict[int, int], healing: bool) -> Tuple[List[Dict], List[int]]:
+    """
+    Add a signed HP delta per character
+
+    Damage is clamped at 0 and healing at max_hit_points, matching the
+    old read-modify-write behaviour.
+
+    Returns:
+        Tuple of (updated characters, ids that do not exist)
+    """
+    if not deltas:
+        return [], []
+    table = Character.__table__
+    if len(set(deltas.values())) == 1:
+        delta = next(iter(deltas.values()))
+    else:
+        delta = case(deltas, value=table.c.id, else_=0)
+    changed = table.c.hit_points + delta
+    if healing:
+        clamped = case((changed > table.c.max_hit_points, table.c.max_hit_points), else_=changed)
+    else:
+        clamped = case((changed < 0, 0), else_=changed)
+    statement = (
+        update(table)
+        .where(table.c.id.in_(list(deltas)))
+        .values(hit_points=clamped)
+        .returning(*(table.c[field] for field in CHARACTER_FIELDS))
+    )
+    db.execute(bump_change_version())
+    rows = db.execute(statement).all()
+    db.commit()
+    characters = sorted(
+        (Character.row_to_dict(row, CHARACTER_FIELDS) for row in rows),
+        key=lambda character: character["id"],
+    )
+    found = {character["id"] for character in characters}
+    return characters, [character_id for character_id in deltas if character_id not in found]
+
+
+def apply_damage(db: Session, damage: Dict[int, int]) -> Tuple[List[Dict], List[int]]:
+    """
+    Damage one or more characters in one statement (HP never drops below 0)
+
+    Args:
+        db: Database session
+        damage: Damage per character id
+
+    Returns:
+        Tuple of (updated characters, ids that do not exist)
+
+    Raises:
+        ValueError: If any damage is negative
+    """
+    if any(amount < 0 for amount in damage.values()):
+        raise ValueError("Damage must not be negative")
+    return _apply(db, {character_id: -amount for character_id, amount in damage.items()}, healing=False)
+
+
+def apply_healing(db: Session, healing: Dict[int, int]) -> Tuple[List[Dict], List[int]]:
+    """
+    Heal one or more characters in one statement (HP never exceeds max)
+
+    Args:
+        db: Database session
+        healing: Hit points restored per character id
+
+    Returns:
+        Tuple of (updated characters, ids that do not exist)
+
+    Raises:
+        ValueError: If any healing is negative
+    """
+    if any(amount < 0 for amount in healing.values()):
+        raise ValueError("Healing must not be negative")
+    return _apply(db, dict(healing), healing=True)
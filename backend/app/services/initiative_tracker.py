@@ -0,0 +1,401 @@
+"""
+Initiative tracking for combat
+
+Turn order lives in two binary heaps keyed on initiative:
+- ``pending``: combatants still to act this round
+- ``acted``: combatants who have acted and wait for the next round
+
+Advancing pops the next combatant from ``pending`` and pushes the one whose
+turn ended onto ``acted``; when the round ends the two heaps swap, since
+``acted`` is already a valid heap. Adding, removing, delaying and
+advancing are all O(log n) and the order is never re-sorted. Removed
+combatants are deleted lazily and skipped when they reach the top.
+
+Sort keys are tuples ``(-initiative, side, -modifier, id)``, so higher
+initiative acts first and monsters win ties against PCs, as in PF2e. A
+combatant returning from Delay gets the key of the turn that just ended
+with one more element appended, which sorts right after it without
+renumbering anyone else.
+"""
+
+import heapq
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence
+
+from app.services.dice_service import DiceService, dice_service
+from app.services.roll_history import DEFAULT_TABLE
+
+
+PC = "pc"
+MONSTER = "monster"
+# Monsters act before PCs on tied initiative
+SIDE_RANK = {MONSTER: 0, PC: 1}
+
+MAX_COMBATANTS = 500
+# Combats kept in memory; older ones are restored from their snapshot on use
+MAX_TABLES = int(os.getenv("INITIATIVE_MAX_TABLES", "256"))
+
+
+@dataclass
+class Participant:
+    """One combatant in the initiative order"""
+    id: int
+    name: str
+    side: str
+    modifier: int
+    initiative: int
+    character_id: Optional[int] = None
+    hp: Optional[int] = None
+    delayed: bool = False
+    readied: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        """Convert to dictionary"""
+        return asdict(self)
+
+
+class InitiativeTracker:
+    """Turn order of one combat"""
+
+    def __init__(self):
+        self.round = 0
+        self.participants: Dict[int, Participant] = {}
+        self.current: Optional[int] = None
+        # Key of the turn in progress (or that just ended); anchors resumes
+        self._current_key: Optional[tuple] = None
+        self._pending: List[list] = []
+        self._acted: List[list] = []
+        # Live heap entry per participant; removed entries get id None
+        self._entries: Dict[int, list] = {}
+        self._removed = 0
+        self._next_id = 1
+        # Version of the stored snapshot this state was loaded from or saved as
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.participants)
+
+    def _push(self, heap: List[list], key: tuple, participant_id: int):
+        entry = [key, participant_id]
+        self._entries[participant_id] = entry
+        heapq.heappush(heap, entry)
+
+    def _pop(self, heap: List[list]) -> Optional[list]:
+        while heap:
+            entry = heapq.heappop(heap)
+            if entry[1] is not None:
+                del self._entries[entry[1]]
+                return entry
+            self._removed -= 1
+        return None
+
+    def _peek(self, heap: List[list]) -> Optional[int]:
+        while heap and heap[0][1] is None:
+            heapq.heappop(heap)
+            self._removed -= 1
+        return heap[0][1] if heap else None
+
+    def _participant(self, participant_id: int) -> Participant:
+        participant = self.participants.get(participant_id)
+        if participant is None:
+            raise ValueError(f"Unknown combatant {participant_id}")
+        return participant
+
+    def add(
+        self,
+        name: str,
+        side: str,
+        modifier: int,
+        initiative: int,
+        character_id: Optional[int] = None,
+        hp: Optional[int] = None,
+    ) -> Participant:
+        """
+        Add a combatant, e.g. a summon or reinforcements mid-fight
+
+        A combatant whose initiative has already come up this round acts
+        from the next round on.
+
+        Raises:
+            ValueError: If the side is unknown or the combat is full
+        """
+        if side not in SIDE_RANK:
+            raise ValueError(f"Side must be one of: {list(SIDE_RANK)}")
+        if len(self.participants) >= MAX_COMBATANTS:
+            raise ValueError(f"A combat holds at most {MAX_COMBATANTS} combatants")
+        participant = Participant(self._next_id, name, side, modifier, initiative, character_id, hp)
+        self._next_id += 1
+        self.participants[participant.id] = participant
+        key = (-initiative, SIDE_RANK[side], -modifier, participant.id)
+        if self._current_key is not None and key < self._current_key:
+            self._push(self._acted, key, participant.id)
+        else:
+            self._push(self._pending, key, participant.id)
+        return participant
+
+    def remove(self, participant_id: int) -> Participant:
+        """Remove a combatant (O(1); its heap entry is skipped later)"""
+        participant = self._participant(participant_id)
+        del self.participants[participant_id]
+        entry = self._entries.pop(participant_id, None)
+        if entry is not None:
+            entry[1] = None
+            self._removed += 1
+        if self.current == participant_id:
+            self.current = None
+        if self._removed > len(self._entries):
+            self._compact()
+        return participant
+
+    def _compact(self):
+        """Drop removed entries once they outnumber live ones (amortized O(1))"""
+        self._pending = [entry for entry in self._pending if entry[1] is not None]
+        self._acted = [entry for entry in self._acted if entry[1] is not None]
+        heapq.heapify(self._pending)
+        heapq.heapify(self._acted)
+        self._removed = 0
+
+    def advance(self) -> Participant:
+        """
+        End the current turn and start the next one
+
+        Returns:
+            The combatant whose turn it now is
+
+        Raises:
+            ValueError: If nobody is left in the order
+        """
+        if self.current is not None:
+            self._push(self._acted, self._current_key, self.current)
+            self.current = None
+        entry = self._pop(self._pending)
+        if entry is None:
+            # Everyone has acted: the next round's order is already a heap
+            self._pending, self._acted = self._acted, []
+            self.round += 1
+            entry = self._pop(self._pending)
+            if entry is None:
+                raise ValueError("No combatants are waiting to act")
+        if self.round == 0:
+            self.round = 1
+        self._current_key, self.current = tuple(entry[0]), entry[1]
+        participant = self.participants[self.current]
+        # A readied action lasts until the combatant's next turn
+        participant.readied = None
+        return participant
+
+    def delay(self, participant_id: int) -> Participant:
+        """Take the current combatant out of the order until it resumes"""
+        participant = self._participant(participant_id)
+        if participant_id != self.current:
+            raise ValueError("Only the combatant whose turn it is can delay")
+        participant.delayed = True
+        self.current = None
+        return participant
+
+    def resume(self, participant_id: int) -> Participant:
+        """
+        Return a delayed combatant to the order right after the current turn
+
+        Its new position is permanent, as in PF2e. A combatant can only
+        resume once some later turn has started, not in the turn it delayed.
+        """
+        participant = self._participant(participant_id)
+        if not participant.delayed:
+            raise ValueError(f"{participant.name} is not delaying")
+        if self.current is None or self._current_key[3] == participant_id:
+            raise ValueError(f"{participant.name} can resume only after another combatant's turn has started")
+        participant.delayed = False
+        key = self._current_key + (self._next_id,)
+        self._next_id += 1
+        self._push(self._pending, key, participant_id)
+        return participant
+
+    def ready(self, participant_id: int, trigger: str) -> Participant:
+        """Record the current combatant's readied action and its trigger"""
+        participant = self._participant(participant_id)
+        if participant_id != self.current:
+            raise ValueError("Only the combatant whose turn it is can ready an action")
+        participant.readied = trigger
+        return participant
+
+    def up_next(self) -> Optional[Participant]:
+        """Combatant who acts after the current turn (O(1) amortized)"""
+        participant_id = self._peek(self._pending)
+        if participant_id is None:
+            participant_id = self._peek(self._acted)
+        return None if participant_id is None else self.participants[participant_id]
+
+    def order(self) -> Dict:
+        """
+        Full turn order, for display
+
+        Sorts copies of the heaps; turn advancement never needs this.
+        """
+        def ordered(heap: List[list]) -> List[Dict]:
+            live = sorted(entry for entry in heap if entry[1] is not None)
+            return [self.participants[participant_id].to_dict() for _, participant_id in live]
+
+        current = self.participants.get(self.current) if self.current is not None else None
+        return {
+            "round": self.round,
+            "current": current.to_dict() if current else None,
+            "this_round": ordered(self._pending),
+            "next_round": ordered(self._acted),
+            "delayed": [p.to_dict() for p in self.participants.values() if p.delayed],
+        }
+
+    def snapshot(self) -> Dict:
+        """
+        JSON-compatible state, cheap to write
+
+        Heaps are saved as their live entries, so restoring is one O(n)
+        heapify rather than a sort.
+        """
+        return {
+            "round": self.round,
+            "current": self.current,
+            "current_key": list(self._current_key) if self._current_key is not None else None,
+            "next_id": self._next_id,
+            "participants": [p.to_dict() for p in self.participants.values()],
+            "pending": [[list(key), pid] for key, pid in self._pending if pid is not None],
+            "acted": [[list(key), pid] for key, pid in self._acted if pid is not None],
+        }
+
+    @classmethod
+    def from_snapshot(cls, state: Dict) -> "InitiativeTracker":
+        """Rebuild a tracker from ``snapshot()`` output"""
+        tracker = cls()
+        tracker.round = state["round"]
+        tracker.current = state["current"]
+        if state["current_key"] is not None:
+            tracker._current_key = tuple(state["current_key"])
+        tracker._next_id = state["next_id"]
+        tracker.participants = {p["id"]: Participant(**p) for p in state["participants"]}
+        for name in ("pending", "acted"):
+            heap = [[tuple(key), participant_id] for key, participant_id in state[name]]
+            heapq.heapify(heap)
+            setattr(tracker, f"_{name}", heap)
+            tracker._entries.update((entry[1], entry) for entry in heap)
+        return tracker
+
+
+class InitiativeService:
+    """Combats in progress, one per table, evicting the least recently used table"""
+
+    def __init__(self, dice: Optional[DiceService] = None, max_tables: int = MAX_TABLES):
+        self.dice = dice or dice_service
+        self.max_tables = max_tables
+        self._trackers: "OrderedDict[str, InitiativeTracker]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, table_id: Optional[str] = None) -> Optional[InitiativeTracker]:
+        """The table's combat, or None"""
+        table_id = table_id or DEFAULT_TABLE
+        with self._lock:
+            tracker = self._trackers.get(table_id)
+            if tracker is not None:
+                self._trackers.move_to_end(table_id)
+            return tracker
+
+    def put(self, table_id: Optional[str], tracker: InitiativeTracker):
+        """Install a tracker, e.g. one restored from a snapshot"""
+        table_id = table_id or DEFAULT_TABLE
+        with self._lock:
+            self._trackers[table_id] = tracker
+            self._trackers.move_to_end(table_id)
+            if len(self._trackers) > self.max_tables:
+                self._trackers.popitem(last=False)
+
+    def end(self, table_id: Optional[str] = None) -> bool:
+        """Forget the table's combat; returns whether there was one"""
+        with self._lock:
+            return self._trackers.pop(table_id or DEFAULT_TABLE, None) is not None
+
+    def discard(self, table_id: Optional[str], tracker: InitiativeTracker):
+        """Forget a tracker if it is still the table's, e.g. after a failed save"""
+        table_id = table_id or DEFAULT_TABLE
+        with self._lock:
+            if self._trackers.get(table_id) is tracker:
+                del self._trackers[table_id]
+
+    def tables(self) -> List[str]:
+        """Ids of tables with a combat in memory"""
+        with self._lock:
+            return list(self._trackers)
+
+    def roll_in(
+        self,
+        tracker: InitiativeTracker,
+        combatants: Sequence[Dict],
+        table_id: Optional[str] = None,
+        seed: Optional[int] = None,
+    ) -> List[Participant]:
+        """
+        Add combatants, rolling initiative for all of them in one batch
+
+        Each combatant is a dict with ``name``, ``side`` and ``modifier``
+        (plus optional ``character_id`` and ``hp``); one with an
+        ``initiative`` already set keeps it instead of rolling.
+
+        Raises:
+            ValueError: If a combatant is invalid or the combat would be too large
+        """
+        if len(tracker) + len(combatants) > MAX_COMBATANTS:
+            raise ValueError(f"A combat holds at most {MAX_COMBATANTS} combatants")
+        to_roll = [c for c in combatants if c.get("initiative") is None]
+        totals = iter([])
+        if to_roll:
+            batch = self.dice.roll_batch(
+                notations=[f"1d20{c['modifier']:+d}" if c["modifier"] else "1d20" for c in to_roll],
+                table_id=table_id,
+                seed=seed,
+            )
+            totals = iter(batch["totals"])
+        added = []
+        for combatant in combatants:
+            initiative = combatant.get("initiative")
+            added.append(tracker.add(
+                name=combatant["name"],
+                side=combatant["side"],
+                modifier=combatant["modifier"],
+                initiative=int(next(totals) if initiative is None else initiative),
+                character_id=combatant.get("character_id"),
+                hp=combatant.get("hp"),
+            ))
+        return added
+
+    def start(
+        self,
+        combatants: Sequence[Dict],
+        table_id: Optional[str] = None,
+        seed: Optional[int] = None,
+    ) -> InitiativeTracker:
+        """
+        Start a combat at a table, replacing any in progress
+
+        Args:
+            combatants: Combatants as accepted by ``roll_in``
+            table_id: Table whose dice stream rolls initiative
+            seed: Roll initiative from a one-off stream with this seed
+
+        Returns:
+            The tracker, positioned on the first turn
+
+        Raises:
+            ValueError: If there are no combatants or one is invalid
+        """
+        if not combatants:
+            raise ValueError("A combat needs at least one combatant")
+        tracker = InitiativeTracker()
+        self.roll_in(tracker, combatants, table_id=table_id, seed=seed)
+        tracker.advance()
+        self.put(table_id, tracker)
+        return tracker
+
+
+# Create global instance
+initiative_service = InitiativeService()
@@ -0,0 +1,184 @@
+"""
+Seedable, splittable random number streams
+
+Each table (campaign session) owns an independent stream, so concurrent
+tables never share generator state, and a table can be re-seeded to
+replay its rolls exactly. Streams split deterministically: a child's seed
+depends only on its parent's seed and the child's key, never on how many
+numbers the parent has drawn.
+"""
+
+import hashlib
+import random
+import secrets
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised when NumPy is absent
+    np = None
+
+
+MAX_TABLE_STREAMS = 1024
+
+
+def new_seed() -> int:
+    """Fresh 64-bit seed from the OS entropy pool"""
+    return secrets.randbits(64)
+
+
+def derive_seed(seed: int, *keys: str) -> int:
+    """Deterministically derive a 64-bit child seed"""
+    digest = hashlib.blake2b(digest_size=8)
+    digest.update(str(seed).encode())
+    for key in keys:
+        digest.update(b"/")
+        digest.update(str(key).encode())
+    return int.from_bytes(digest.digest(), "big")
+
+
+class RngStream:
+    """
+    An independent random stream
+
+    Exposes the ``randint``/``choice``/``choices`` API of ``random`` for
+    scalar draws, and ``vector`` (a NumPy Generator when installed) for
+    the vectorized batch paths.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = new_seed() if seed is None else seed
+        self._python = random.Random(self.seed)
+        self._vector = None
+        self._children: Dict[str, "RngStream"] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def vector(self):
+        """Generator for vectorized draws (NumPy if available)"""
+        if self._vector is None:
+            if np is not None:
+                self._vector = np.random.default_rng(derive_seed(self.seed, "vector"))
+            else:
+                self._vector = random.Random(derive_seed(self.seed, "vector"))
+        return self._vector
+
+    def spawn(self, key: str) -> "RngStream":
+        """
+        Get the child stream for ``key``
+
+        The child is created on first use from ``derive_seed(seed, key)``
+        and then reused, so its draws continue across calls.
+        """
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = RngStream(derive_seed(self.seed, key))
+                self._children[key] = child
+            return child
+
+    def randint(self, a: int, b: int) -> int:
+        return self._python.randint(a, b)
+
+    def random(self) -> float:
+        return self._python.random()
+
+    def randrange(self, *args) -> int:
+        return self._python.randrange(*args)
+
+    def choice(self, items: Sequence):
+        return self._python.choice(items)
+
+    def choices(self, population: Sequence, k: int = 1) -> list:
+        return self._python.choices(population, k=k)
+
+    def sample(self, population: Sequence, k: int) -> list:
+        return self._python.sample(population, k)
+
+    def shuffle(self, items: list):
+        self._python.shuffle(items)
+
+
+class RngRegistry:
+    """
+    Per-table RNG streams, evicting the least recently used table
+
+    A live stream's seed would let anyone predict the table's next rolls,
+    so it is only kept for sessions that have ended: ended explicitly,
+    replaced by a re-seed, or evicted.
+    """
+
+    def __init__(self, max_tables: int = MAX_TABLE_STREAMS):
+        self.max_tables = max_tables
+        self._streams: "OrderedDict[str, RngStream]" = OrderedDict()
+        # Seed of each table's most recently ended session
+        self._ended: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _retire(self, table_id: str, stream: RngStream):
+        """Remember an ended session's seed (call with the lock held)"""
+        self._ended[table_id] = stream.seed
+        self._ended.move_to_end(table_id)
+        if len(self._ended) > self.max_tables:
+            self._ended.popitem(last=False)
+
+    def _install(self, table_id: str, stream: RngStream):
+        """Make a stream the table's live one (call with the lock held)"""
+        previous = self._streams.get(table_id)
+        if previous is not None:
+            self._retire(table_id, previous)
+        self._streams[table_id] = stream
+        self._streams.move_to_end(table_id)
+        if len(self._streams) > self.max_tables:
+            self._retire(*self._streams.popitem(last=False))
+
+    def get(self, table_id: Optional[str] = None) -> RngStream:
+        """Get (or create with a fresh seed) the stream for a table"""
+        table_id = table_id or "default"
+        with self._lock:
+            stream = self._streams.get(table_id)
+            if stream is None:
+                stream = RngStream()
+                self._install(table_id, stream)
+            else:
+                self._streams.move_to_end(table_id)
+            return stream
+
+    def peek(self, table_id: Optional[str] = None) -> Optional[RngStream]:
+        """Get a table's live stream without creating it or evicting another (for reads)"""
+        with self._lock:
+            return self._streams.get(table_id or "default")
+
+    def reseed(self, table_id: Optional[str] = None, seed: Optional[int] = None) -> RngStream:
+        """Replace a table's stream, e.g. to replay a session from its seed"""
+        table_id = table_id or "default"
+        stream = RngStream(seed)
+        with self._lock:
+            self._install(table_id, stream)
+        return stream
+
+    def end(self, table_id: Optional[str] = None) -> Optional[RngStream]:
+        """End a table's session; its next roll starts a stream with a fresh seed"""
+        table_id = table_id or "default"
+        with self._lock:
+            stream = self._streams.pop(table_id, None)
+            if stream is not None:
+                self._retire(table_id, stream)
+            return stream
+
+    def ended_seed(self, table_id: Optional[str] = None) -> Optional[int]:
+        """Seed of the table's most recently ended session, if remembered"""
+        with self._lock:
+            return self._ended.get(table_id or "default")
+
+    def resolve(self, table_id: Optional[str] = None, seed: Optional[int] = None) -> RngStream:
+        """A one-off stream for ``seed`` if given, else the table's stream"""
+        if seed is not None:
+            return RngStream(seed)
+        return self.get(table_id)
+
+
+# Create global instance
+rng_registry = RngRegistry()
@@ -0,0 +1,150 @@
+"""
+Bounded roll history storage
+
+Each table (or session) gets a fixed-capacity ring buffer. Totals, ids and
+timestamps live in typed arrays and each roll's dice are kept as a compact
+array, so memory stays bounded no matter how long the server runs.
+"""
+
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+DEFAULT_TABLE = "default"
+DEFAULT_CAPACITY = int(os.getenv("ROLL_HISTORY_CAPACITY", "1000"))
+MAX_TABLES = int(os.getenv("ROLL_HISTORY_MAX_TABLES", "256"))
+
+
+class RollHistory:
+    """Fixed-capacity ring buffer of rolls with cursor pagination"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("History capacity must be at least 1")
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._totals = array("q", bytes(8 * capacity))
+        self._timestamps = array("d", bytes(8 * capacity))
+        self._notations: List[Optional[str]] = [None] * capacity
+        self._kinds: List[Optional[str]] = [None] * capacity
+        self._dice: List[Optional[array]] = [None] * capacity
+        self._last_id = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def last_id(self) -> int:
+        """Id of the newest roll (0 when empty)"""
+        return self._last_id
+
+    @property
+    def first_id(self) -> int:
+        """Id of the oldest retained roll"""
+        return self._last_id - self._size + 1
+
+    def append(self, notation: str, total: int, rolls: List[int], kind: str = "roll") -> int:
+        """
+        Record a roll, overwriting the oldest entry when full
+
+        Returns:
+            Id of the new entry
+        """
+        dice = array("l", rolls)
+        with self._lock:
+            self._last_id += 1
+            slot = (self._last_id - 1) % self.capacity
+            self._totals[slot] = total
+            self._timestamps[slot] = time.time()
+            self._notations[slot] = sys.intern(notation)
+            self._kinds[slot] = kind
+            self._dice[slot] = dice
+            self._size = min(self._size + 1, self.capacity)
+            return self._last_id
+
+    def _entry(self, entry_id: int) -> dict:
+        slot = (entry_id - 1) % self.capacity
+        return {
+            "id": entry_id,
+            "notation": self._notations[slot],
+            "rolls": self._dice[slot].tolist(),
+            "total": self._totals[slot],
+            "type": self._kinds[slot],
+            "timestamp": self._timestamps[slot],
+        }
+
+    def page(self, cursor: Optional[int] = None, limit: int = 50) -> Tuple[List[dict], Optional[int]]:
+        """
+        Read rolls newest first
+
+        Args:
+            cursor: Only return rolls with an id below this value
+            limit: Maximum number of rolls to return
+
+        Returns:
+            Tuple of (entries, cursor for the next page or None)
+        """
+        if limit < 1:
+            raise ValueError("Limit must be at least 1")
+        with self._lock:
+            if not self._size:
+                return [], None
+            first = self.first_id
+            start = self._last_id if cursor is None else min(cursor - 1, self._last_id)
+            stop = max(first, start - limit + 1)
+            entries = [self._entry(entry_id) for entry_id in range(start, stop - 1, -1)]
+            next_cursor = stop if entries and stop > first else None
+            return entries, next_cursor
+
+    def clear(self):
+        """Drop all entries (ids keep increasing)"""
+        with self._lock:
+            self._notations = [None] * self.capacity
+            self._kinds = [None] * self.capacity
+            self._dice = [None] * self.capacity
+            self._size = 0
+
+
+class HistoryRegistry:
+    """Per-table roll histories, evicting the least recently used table"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, max_tables: int = MAX_TABLES):
+        self.capacity = capacity
+        self.max_tables = max_tables
+        self._tables: "OrderedDict[str, RollHistory]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, table_id: Optional[str] = None) -> RollHistory:
+        """Get (or create) the history for a table"""
+        table_id = table_id or DEFAULT_TABLE
+        with self._lock:
+            history = self._tables.get(table_id)
+            if history is None:
+                history = RollHistory(self.capacity)
+                self._tables[table_id] = history
+                if len(self._tables) > self.max_tables:
+                    self._tables.popitem(last=False)
+            else:
+                self._tables.move_to_end(table_id)
+            return history
+
+    def peek(self, table_id: Optional[str] = None) -> Optional[RollHistory]:
+        """Get a table's history without creating it or evicting another (for reads)"""
+        with self._lock:
+            return self._tables.get(table_id or DEFAULT_TABLE)
+
+    def discard(self, table_id: Optional[str] = None):
+        """Forget a table's history entirely"""
+        with self._lock:
+            self._tables.pop(table_id or DEFAULT_TABLE, None)
+
+    def tables(self) -> List[str]:
+        """Ids of tables with retained history"""
+        with self._lock:
+            return list(self._tables)
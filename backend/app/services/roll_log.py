@@ -0,0 +1,216 @@
+"""
+Persistent roll log with a background, write-batched writer
+
+Rolls are queued in memory and a single writer thread coalesces them into
+batched inserts, so request latency never includes a database commit. The
+queue is bounded: if the database falls behind, new rolls are dropped (and
+counted) rather than growing memory without limit.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import insert, select
+
+from app.database import SessionLocal, engine
+from app.models.roll_log import RollLog
+
+
+FLUSH_INTERVAL = float(os.getenv("ROLL_LOG_FLUSH_INTERVAL", "0.05"))
+MAX_BATCH_ROWS = int(os.getenv("ROLL_LOG_BATCH_ROWS", "500"))
+MAX_PENDING = int(os.getenv("ROLL_LOG_MAX_PENDING", "10000"))
+
+# Column limits; longer values would fail the whole batched insert
+TABLE_ID_LENGTH = RollLog.__table__.c.table_id.type.length
+NOTATION_LENGTH = RollLog.__table__.c.notation.type.length
+
+
+class RollLogWriter:
+    """Background writer that batches roll inserts"""
+
+    def __init__(
+        self,
+        bind=engine,
+        flush_interval: float = FLUSH_INTERVAL,
+        max_batch_rows: int = MAX_BATCH_ROWS,
+        max_pending: int = MAX_PENDING,
+    ):
+        self.bind = bind
+        self.flush_interval = flush_interval
+        self.max_batch_rows = max_batch_rows
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the writer thread"""
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="roll-log-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Flush pending rolls and stop the writer thread"""
+        if not self.running:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit(
+        self,
+        table_id: str,
+        notation: str,
+        total: int,
+        rolls: List[int],
+        kind: str = "roll",
+    ):
+        """
+        Queue a roll for persistence (never blocks on the database)
+
+        Over-long table ids and notations are truncated to their column
+        sizes; the roll is dropped if the queue is full.
+        """
+        try:
+            self._queue.put_nowait({
+                "table_id": table_id[:TABLE_ID_LENGTH],
+                "notation": notation[:NOTATION_LENGTH],
+                "kind": kind,
+                "total": total,
+                "rolls": json.dumps(rolls),
+                "created_at": datetime.now(timezone.utc),
+            })
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 1.0) -> bool:
+        """
+        Wait until every roll queued so far has been written
+
+        Returns:
+            True if the queue drained within the timeout
+        """
+        if not self.running:
+            return False
+        deadline = time.monotonic() + timeout
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(max(0.0, deadline - time.monotonic()))
+
+    def _write(self, rows: List[dict]):
+        try:
+            with self.bind.begin() as connection:
+                connection.execute(insert(RollLog.__table__), rows)
+            self.written += len(rows)
+        except Exception:
+            # Logging must never take down the roll path; drop the batch
+            self.failed += len(rows)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            rows: List[dict] = []
+            waiters: List[threading.Event] = []
+            stop = False
+            deadline = None
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    rows.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+                if stop or waiters or len(rows) >= self.max_batch_rows:
+                    break
+                timeout = self.flush_interval if deadline is None else deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+            if rows:
+                self._write(rows)
+            for waiter in waiters:
+                waiter.set()
+            if stop:
+                self._drain()
+                return
+
+    def _drain(self):
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is not None:
+                rows.append(item)
+            if len(rows) >= self.max_batch_rows:
+                self._write(rows)
+                rows = []
+        if rows:
+            self._write(rows)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def query_roll_log(
+    table_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = 100,
+    db=None,
+) -> List[dict]:
+    """
+    Read logged rolls in a time range, newest first
+
+    Args:
+        table_id: Restrict to one table
+        since: Only rolls at or after this time
+        until: Only rolls before this time
+        limit: Maximum number of rolls
+        db: Optional session (a new one is opened otherwise)
+    """
+    statement = select(RollLog)
+    if table_id is not None:
+        statement = statement.where(RollLog.table_id == table_id)
+    if since is not None:
+        statement = statement.where(RollLog.created_at >= _as_utc(since))
+    if until is not None:
+        statement = statement.where(RollLog.created_at < _as_utc(until))
+    statement = statement.order_by(RollLog.created_at.desc(), RollLog.id.desc()).limit(limit)
+
+    session = db or SessionLocal()
+    try:
+        return [row.to_dict() for row in session.scalars(statement)]
+    finally:
+        if db is None:
+            session.close()
+
+
+# Create global instance
+roll_log_writer = RollLogWriter()
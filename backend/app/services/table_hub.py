@@ -0,0 +1,181 @@
+"""
+Real-time table sessions over WebSockets
+
+Everyone at a table subscribes to one feed of its dice rolls, hit point
+changes and generated encounters instead of polling for them.
+
+- Each event is encoded once, and the same string is queued for every
+  subscriber, so fan-out never copies the payload per connection
+- Each connection has its own bounded queue drained by its own sender
+  task, so a slow client never delays the others
+- Events with a coalescing key (e.g. one character's hit points) replace
+  any still-queued event with the same key, so a client that falls behind
+  only receives the latest state
+- A client that falls too far behind gets its queue replaced by a single
+  ``resync`` event, telling it to reload state over HTTP
+
+Fan-out happens within one process. When several uvicorn workers run, a
+table's clients only receive events published by the worker their
+WebSocket is connected to, so run one worker (or route a table's traffic
+to a single worker) for live sessions.
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.responses import dumps
+from app.services.roll_history import DEFAULT_TABLE
+
+
+TABLE_HUB_MAX_PENDING = int(os.getenv("TABLE_HUB_MAX_PENDING", "256"))
+
+RESYNC = dumps({"type": "resync"}).decode()
+
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """One connection's queue of encoded events"""
+
+    def __init__(self, max_pending: int = TABLE_HUB_MAX_PENDING):
+        self.max_pending = max_pending
+        self.pending: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.ready = asyncio.Event()
+        self.coalesced = 0
+        self.resyncs = 0
+        self._sequence = itertools.count()
+
+    def offer(self, message: str, key: Optional[Hashable] = None):
+        """Queue an event, replacing a pending one with the same key"""
+        if key is None:
+            key = next(self._sequence)
+        elif key in self.pending:
+            self.coalesced += 1
+            self.pending.move_to_end(key)
+        self.pending[key] = message
+        if len(self.pending) > self.max_pending:
+            self.pending.clear()
+            self.pending["resync"] = RESYNC
+            self.resyncs += 1
+        self.ready.set()
+
+    async def drain(self) -> List[str]:
+        """Wait for and take every pending event"""
+        await self.ready.wait()
+        self.ready.clear()
+        messages = list(self.pending.values())
+        self.pending.clear()
+        return messages
+
+
+class TableHub:
+    """Per-table fan-out of events to WebSocket subscribers"""
+
+    def __init__(self, max_pending: int = TABLE_HUB_MAX_PENDING):
+        self.max_pending = max_pending
+        self._tables: Dict[str, Set[Subscriber]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.published = 0
+
+    def start(self):
+        """Bind to the running event loop; events published before are dropped"""
+        self._loop = asyncio.get_running_loop()
+
+    def stop(self):
+        """Stop delivering events"""
+        self._loop = None
+
+    def publish(self, table_id: Optional[str], event: str, data, key: Optional[Hashable] = None):
+        """
+        Broadcast an event to everyone at a table
+
+        Safe to call from any thread; delivery happens on the event loop.
+
+        Args:
+            table_id: Table to broadcast to (default table when omitted)
+            event: Event type, e.g. ``roll`` or ``hit_points``
+            data: JSON-compatible payload
+            key: Coalescing key; a newer event with the same key replaces
+                an undelivered older one
+        """
+        table_id = table_id or DEFAULT_TABLE
+        loop = self._loop
+        if loop is None or not self._tables.get(table_id):
+            return
+        message = dumps({"type": event, "table_id": table_id, "data": data}).decode()
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._fan_out(table_id, message, key)
+        else:
+            loop.call_soon_threadsafe(self._fan_out, table_id, message, key)
+
+    def _fan_out(self, table_id: str, message: str, key: Optional[Hashable]):
+        self.published += 1
+        for subscriber in self._tables.get(table_id, ()):
+            subscriber.offer(message, key)
+
+    async def serve(self, websocket: WebSocket, table_id: str):
+        """Stream a table's events to a WebSocket until it disconnects"""
+        await websocket.accept()
+        subscriber = Subscriber(self.max_pending)
+        self._tables.setdefault(table_id, set()).add(subscriber)
+        sender = asyncio.create_task(self._send(websocket, subscriber))
+        try:
+            # Incoming messages are ignored; receiving only detects the disconnect
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+            # wait() rather than await: the sender's cancellation is expected
+            await asyncio.wait({sender})
+            subscribers = self._tables.get(table_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._tables[table_id]
+
+    @staticmethod
+    async def _send(websocket: WebSocket, subscriber: Subscriber):
+        try:
+            while True:
+                for message in await subscriber.drain():
+                    await websocket.send_text(message)
+        except WebSocketDisconnect:
+            # The receive loop notices the disconnect and cleans up
+            pass
+        except Exception:
+            # Any other failed send ends the session; closing the socket
+            # ends the receive loop, which unsubscribes the connection
+            logger.warning("Closing table session after a failed send", exc_info=True)
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict:
+        """Connection and delivery counters"""
+        subscribers = [s for table in self._tables.values() for s in table]
+        return {
+            "tables": {table_id: len(table) for table_id, table in self._tables.items()},
+            "connections": len(subscribers),
+            "published": self.published,
+            "coalesced": sum(s.coalesced for s in subscribers),
+            "resyncs": sum(s.resyncs for s in subscribers),
+        }
+
+
+# Create global instance
+table_hub = TableHub()
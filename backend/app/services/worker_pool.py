@@ -0,0 +1,79 @@
+"""
+Process pool shared by the CPU-bound services
+
+Combat simulation and batch encounter generation fan their chunks of work
+out to the same worker processes rather than each starting a pool.
+
+Workers are spawned, not forked: by the time the pool starts the server
+already runs threads (e.g. the roll-log writer), and forking a
+multi-threaded process can deadlock the child. Spawned workers import the
+app afresh, so they load the bestiary from disk when they start; the app
+starts them with the server so the first request does not wait for that.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Hashable, Optional
+
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+
+def _ready() -> int:
+    """No-op job that makes the executor spawn a worker"""
+    return os.getpid()
+
+
+class WorkerPool:
+    """Lazily started, spawn-based process pool"""
+
+    def __init__(self, processes: int = WORKER_PROCESSES):
+        self.processes = processes
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._version: Optional[Hashable] = None
+        self._lock = threading.Lock()
+
+    def executor(self, version: Optional[Hashable] = None) -> ProcessPoolExecutor:
+        """
+        The pool, started on first use
+
+        Args:
+            version: State the workers load when they start, e.g. a bestiary
+                generation. When it changes, new work goes to fresh workers
+                while the old ones finish what they were already given.
+        """
+        with self._lock:
+            if self._executor is not None and version is not None and version != self._version:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=multiprocessing.get_context("spawn")
+                )
+            if version is not None:
+                self._version = version
+            return self._executor
+
+    def start(self, version: Optional[Hashable] = None):
+        """
+        Spawn every worker now rather than on first use
+
+        Returns without waiting for the workers to finish starting.
+        """
+        executor = self.executor(version)
+        for _ in range(self.processes):
+            executor.submit(_ready)
+
+    def shutdown(self):
+        """Stop the worker processes, cancelling work not yet started"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+                self._version = None
+
+
+# Create global instance
+worker_pool = WorkerPool()
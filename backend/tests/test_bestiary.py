@@ -0,0 +1,222 @@
+"""
+Tests for bestiary lookups
+"""
+
+from app.services.bestiary import (
+    BESTIARY,
+    get_monster_by_name,
+    get_monsters_by_cr_range,
+    get_monsters_by_type,
+)
+
+
+def test_get_monster_by_name_is_case_insensitive():
+    """Test name lookup"""
+    assert get_monster_by_name("troll")["name"] == "Troll"
+    assert get_monster_by_name("HELL HOUND")["name"] == "Hell Hound"
+    assert get_monster_by_name("Tarrasque") is None
+
+
+def test_get_monsters_by_type():
+    """Test type lookup"""
+    undead = get_monsters_by_type("undead")
+    assert undead == [m for m in BESTIARY if m["type"] == "Undead"]
+    assert get_monsters_by_type("Ooze") == []
+
+
+def test_get_monsters_by_cr_range():
+    """Test CR range lookup"""
+    monsters = get_monsters_by_cr_range(1, 2)
+    expected = [m for m in BESTIARY if 1 <= m["cr"] <= 2]
+    
+    assert sorted(m["name"] for m in monsters) == sorted(m["name"] for m in expected)
+    assert [m["cr"] for m in monsters] == sorted(m["cr"] for m in monsters)
+    assert get_monsters_by_cr_range(30, 40) == []
+
+
+def test_load_creature_dumps(tmp_path):
+    """Test streaming JSON and NDJSON dumps into the columnar store"""
+    import json
+    from app.services.bestiary_store import Bestiary
+    
+    creatures = [
+        {"name": "Kobold Dragon Mage", "level": 2, "type": "Humanoid", "hp": 25, "ac": 17,
+         "abilities": ["Breath Weapon"], "description": "Wyrmkin ✦ devotee"},
+        {"name": "Ghast", "cr": 2, "xp": 60, "type": "Undead", "hit_points": 30, "armor_class": 16},
+        {"type": "Nameless"},
+    ]
+    (tmp_path / "book.json").write_text(json.dumps({"monsters": creatures}), encoding="utf-8")
+    (tmp_path / "extra.ndjson").write_text(
+        json.dumps({"name": "Ogre Boss", "cr": 9, "type": "Giant", "hp": 150, "ac": 25}) + "\n",
+        encoding="utf-8",
+    )
+    
+    bestiary = Bestiary(BESTIARY, data_dir=str(tmp_path))
+    assert len(bestiary) == len(BESTIARY) + 3
+    
+    mage = bestiary.get("kobold dragon mage")
+    assert mage["xp"] == 60
+    assert mage["abilities"] == ["Breath Weapon"]
+    assert mage["description"] == "Wyrmkin ✦ devotee"
+    assert bestiary.get("Ghast")["hp"] == 30
+    assert bestiary.get("Ogre Boss")["xp"] == 640
+    assert [m["name"] for m in bestiary.cr_range(9, 9)] == ["Ogre Boss"]
+    
+    generation = bestiary.generation
+    bestiary.reload()
+    assert bestiary.generation == generation + 1
+
+
+def test_malformed_creatures_are_skipped(tmp_path, caplog):
+    """Test that bad records and files are logged and loading continues"""
+    import json
+    from app.services.bestiary_store import Bestiary
+    
+    creatures = [
+        {"name": "Goblin Pyro", "cr": "1/2", "type": "Humanoid", "hp": "18 (4d8)", "ac": 16},
+        {"name": "Hpless Wisp", "cr": 1, "type": "Spirit", "ac": 19},
+        {"name": "Bad Cr", "cr": "high", "hp": 10},
+        {"name": "Bad Hp", "cr": 1, "hp": ["lots"]},
+    ]
+    wrapped = {"title": "Book [1]", "meta": {"tags": ["x"]}, "monsters": creatures}
+    (tmp_path / "a.json").write_text(json.dumps(wrapped), encoding="utf-8")
+    (tmp_path / "b.ndjson").write_text(
+        '{"name": "Mire Hag", "cr": 3, "hp": 60}\n{"name": "Broken\n{"name": "Bog Mummy", "cr": 4, "hp": 70}\n',
+        encoding="utf-8",
+    )
+    (tmp_path / "c.json").write_text('[{"name": "Cave Bear", "cr": 2, "hp": 40}, {"name": "Trunc', encoding="utf-8")
+    (tmp_path / "d.json").write_text("not json", encoding="utf-8")
+    
+    bestiary = Bestiary([], data_dir=str(tmp_path))
+    assert sorted(m["name"] for m in bestiary.all()) == ["Bog Mummy", "Cave Bear", "Goblin Pyro", "Mire Hag"]
+    pyro = bestiary.get("goblin pyro")
+    assert pyro["cr"] == 0.5 and pyro["hp"] == 18 and pyro["xp"] == 20
+    assert bestiary.get("Bog Mummy")["hp"] == 70
+    logged = caplog.text
+    assert "Hpless Wisp" in logged and "missing hp" in logged and "Bad Cr" in logged
+    assert "c.json" in logged and "d.json" in logged
+
+
+def test_malformed_array_record_stops_without_reading_on(tmp_path, monkeypatch):
+    """Test that a bad record in an array dump does not buffer the rest of the file"""
+    import json
+    import pytest
+    from app.services import bestiary_loader
+    
+    monkeypatch.setattr(bestiary_loader, "CHUNK_SIZE", 256)
+    fills = []
+    fill = bestiary_loader._ChunkReader.fill
+    monkeypatch.setattr(bestiary_loader._ChunkReader, "fill", lambda self: fills.append(1) or fill(self))
+    
+    good = [json.dumps({"name": f"Rat {i}", "cr": 1, "hp": 5, "description": "é" * 40}) for i in range(500)]
+    path = tmp_path / "big.json"
+    path.write_text("[" + ", ".join(good[:3] + ['{"name": "Bad" "cr": 1}'] + good[3:]) + "]", encoding="utf-8")
+    
+    names = []
+    with pytest.raises(ValueError):
+        for record, _, _ in bestiary_loader.iter_creature_records(str(path)):
+            names.append(record["name"])
+    assert names == ["Rat 0", "Rat 1", "Rat 2"]
+    assert len(fills) < 5
+    
+    # Records still decode when cut off anywhere by a chunk boundary
+    path.write_text("[" + ", ".join(good) + "]", encoding="utf-8")
+    records = list(bestiary_loader.iter_creature_records(str(path)))
+    assert [record["name"] for record, _, _ in records] == [f"Rat {i}" for i in range(500)]
+
+
+def test_query_filters_and_pagination():
+    """Test indexed filters and cursor pagination"""
+    from app.services.bestiary import bestiary
+    
+    rows = bestiary.query(monster_type="UNDEAD", min_cr=1, max_cr=4)
+    names = [bestiary.store.names[row] for row in rows]
+    assert names == ["Ghoul", "Shadow", "Specter", "Wraith"]
+    
+    rows = bestiary.query(name_prefix="gob")
+    assert [bestiary.store.names[row] for row in rows] == ["Goblin Warrior", "Goblin Commando"]
+    assert bestiary.query(monster_type="Ooze") == []
+    
+    everything = bestiary.query()
+    page, cursor = bestiary.page(everything, None, 12)
+    seen = list(page)
+    while cursor is not None:
+        page, cursor = bestiary.page(everything, cursor, 12)
+        seen.extend(page)
+    assert seen == everything
+    
+    assert bestiary.store.project(rows[0], ["name", "xp"]) == {"name": "Goblin Warrior", "xp": 20}
+
+
+def test_search_ranks_and_tolerates_typos(tmp_path):
+    """Test full-text search over names, types and stat-block text"""
+    import json
+    from app.services.bestiary import bestiary
+    from app.services.bestiary_store import Bestiary
+    
+    assert bestiary.search("troll")[0]["name"] == "Troll"
+    assert bestiary.search("goblim")[0]["name"].startswith("Goblin")
+    assert bestiary.search("dragn yung")[0]["name"] == "Young Dragon"
+    # Search-as-you-type: the last word matches as a prefix
+    assert bestiary.search("hill gi")[0]["name"] == "Hill Giant"
+    assert {m["name"] for m in bestiary.search("undead", 50)} >= {"Ghoul", "Wraith"}
+    assert bestiary.search("xyzzy") == []
+    
+    dump = tmp_path / "extra.ndjson"
+    dump.write_text(json.dumps({
+        "name": "Basilisk", "cr": 5, "type": "Monstrosity", "hp": 75,
+        "actions": [{"name": "Petrifying Gaze", "desc": "Turns flesh to stone"}],
+    }) + "\n")
+    extended = Bestiary([], data_dir=str(tmp_path))
+    results = extended.search("petrifying", fields=["name"])
+    assert [m["name"] for m in results] == ["Basilisk"]
+    assert set(results[0]) == {"name", "score"}
+
+
+def test_edit_distance_counts_transpositions():
+    """Test the bounded typo distance"""
+    from app.services.bestiary_search import edit_distance
+    
+    assert edit_distance("troll", "troll", 2) == 0
+    assert edit_distance("torll", "troll", 2) == 1
+    assert edit_distance("goblim", "goblin", 2) == 1
+    assert edit_distance("dragon", "wyvern", 2) == 3
+
+
+def test_encoded_payloads_are_cached_per_generation(tmp_path, monkeypatch):
+    """Test pre-encoded payloads, their invalidation on reload, and the stdlib fallback"""
+    import json
+    from app import responses
+    from app.responses import EncodedCache, dumps
+    from app.services.bestiary_store import Bestiary
+    
+    dump = tmp_path / "extra.ndjson"
+    dump.write_text(json.dumps({"name": "Basilisk", "cr": 5, "type": "Monstrosity", "hp": 75}) + "\n")
+    extended = Bestiary([], data_dir=str(tmp_path))
+    cache = EncodedCache(extended, max_size=2)
+    builds = []
+    
+    def build():
+        builds.append(1)
+        return extended.of_type("monstrosity")
+    
+    first = cache.get(("type", "monstrosity"), build)
+    assert json.loads(first.body)[0]["name"] == "Basilisk"
+    assert cache.get(("type", "monstrosity"), build) is first
+    assert first.response(first.etag).status_code == 304
+    assert first.response(f'W/"other", {first.etag}').status_code == 304
+    assert first.response('"other"').body == first.body
+    assert cache.get(("monster", "nobody"), lambda: extended.get("nobody")) is None
+    
+    dump.write_text(json.dumps({"name": "Cockatrice", "cr": 3, "type": "Monstrosity", "hp": 27}) + "\n")
+    extended.reload()
+    second = cache.get(("type", "monstrosity"), build)
+    assert [m["name"] for m in json.loads(second.body)] == ["Cockatrice"]
+    assert second.etag != first.etag
+    assert len(builds) == 2
+    assert cache.cache_info()["hits"] == 1
+    
+    payload = {"name": "Ogre", "cr": 3, "tags": ["giant"], "note": "é"}
+    encoded = dumps(payload)
+    monkeypatch.setattr(responses, "orjson", None)
+    assert dumps(payload) == encoded
@@ -0,0 +1,313 @@
+"""
+Tests for character queries
+"""
+
+import asyncio
+import json
+
+from fastapi import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.api.characters import list_characters
+from app.database import Base
+from app.models.character import Character
+from app.services.character_cache import character_cache
+
+
+async def make_async_session():
+    character_cache.clear()
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    return AsyncSession(engine, expire_on_commit=False)
+
+
+async def list_page(db, **params):
+    response = Response()
+    params = {
+        "cursor": None, "limit": 100, "fields": None, "level": None, "min_level": None,
+        "max_level": None, "class_name": None, "name_prefix": None, **params,
+    }
+    rows = await list_characters(response, db=db, **params)
+    return rows, response.headers.get("X-Next-Cursor")
+
+
+def test_list_characters_keyset_pagination_and_filters():
+    """Test cursor pagination, projection and indexed filters"""
+    async def scenario():
+        db = await make_async_session()
+        db.add_all([
+            Character(name=f"{'Amiri' if i % 2 else 'Ezren'} {i}", class_name="Wizard" if i % 3 else "Barbarian", level=i % 5 + 1)
+            for i in range(25)
+        ])
+        await db.commit()
+
+        seen = []
+        cursor = None
+        while True:
+            rows, cursor = await list_page(db, cursor=cursor, limit=10, fields="name")
+            assert all(set(row) == {"id", "name"} for row in rows)
+            seen.extend(row["id"] for row in rows)
+            if cursor is None:
+                break
+            cursor = int(cursor)
+        assert seen == list(range(1, 26))
+
+        rows, _ = await list_page(db, level=3, class_name="Wizard")
+        assert rows and all(row["level"] == 3 and row["class_name"] == "Wizard" for row in rows)
+        assert rows[0]["inventory"] == []
+
+        rows, _ = await list_page(db, name_prefix="amiri 1", fields="name")
+        assert [row["name"] for row in rows] == ["Amiri 1", "Amiri 11", "Amiri 13", "Amiri 15", "Amiri 17", "Amiri 19"]
+
+        # Without cursor or limit every character comes back, as the web client expects
+        rows, cursor = await list_page(db, limit=None, fields="name")
+        assert len(rows) == 25 and cursor is None
+        
+        # SQLite's lower() folds ASCII only: non-ASCII letters match in stored case
+        db.add(Character(name="Émile"))
+        await db.commit()
+        for prefix, found in (("ÉMILE", ["Émile"]), ("Ém", ["Émile"]), ("ém", [])):
+            rows, _ = await list_page(db, name_prefix=prefix, fields="name")
+            assert [row["name"] for row in rows] == found
+        await db.bind.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_json_columns_and_inventory_filter():
+    """Test native JSON columns, deferred loading and the carrying filter"""
+    async def scenario():
+        db = await make_async_session()
+        db.add_all([
+            Character(name="Valeros", inventory=["Longsword", "Rope"], skills=["Athletics"]),
+            Character(name="Kyra", inventory=["Scimitar"]),
+            Character(name="Merisiel"),
+        ])
+        await db.commit()
+        db.expunge_all()
+
+        rows, _ = await list_page(db, carrying="Rope", fields="name,inventory")
+        assert rows == [{"id": 1, "name": "Valeros", "inventory": ["Longsword", "Rope"]}]
+        rows, _ = await list_page(db, carrying="Rop")
+        assert rows == []
+
+        valeros = (await db.execute(select(Character).where(Character.name == "Valeros"))).scalar_one()
+        assert "inventory" not in valeros.__dict__  # deferred until accessed
+        assert (await db.run_sync(lambda _: valeros.to_dict()))["skills"] == ["Athletics"]
+        merisiel = (await db.execute(select(Character).where(Character.name == "Merisiel"))).scalar_one()
+        assert (await db.run_sync(lambda _: merisiel.to_dict()))["feats"] == []
+        await db.bind.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_character_crud_on_the_async_session():
+    """Test create, read, update and delete through the async routes"""
+    from fastapi import HTTPException
+    from app.api.characters import (
+        CharacterCreate, CharacterUpdate, create_character, delete_character, get_character, update_character,
+    )
+
+    async def scenario():
+        db = await make_async_session()
+        created = await create_character(CharacterCreate(name="Seelah", max_hit_points=18, feats=["Shield Block"]), db=db)
+        assert created["hit_points"] == 18 and created["feats"] == ["Shield Block"] and created["created_at"]
+
+        updated = await update_character(created["id"], CharacterUpdate(level=2, inventory=["Rope"]), Response(), db=db)
+        assert updated["level"] == 2 and updated["inventory"] == ["Rope"] and updated["feats"] == ["Shield Block"]
+        assert json.loads((await get_character(created["id"], None, db=db)).body) == updated
+
+        assert await delete_character(created["id"], db=db) == {"message": "Character Seelah deleted"}
+        for route in (get_character(created["id"], None, db=db), delete_character(created["id"], db=db)):
+            try:
+                await route
+                assert False, "expected a 404"
+            except HTTPException as e:
+                assert e.status_code == 404
+        await db.bind.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_etags_and_changes_feed(monkeypatch):
+    """Test conditional GETs on the version stamp and the /changes delta feed"""
+    from datetime import timedelta
+    from app.api import characters
+    from app.api.characters import (
+        CharacterCreate, CharacterUpdate, character_changes, create_character, delete_character,
+        get_character, update_character,
+    )
+
+    async def scenario():
+        db = await make_async_session()
+        for name in ("Amiri", "Ezren", "Kyra"):
+            await create_character(CharacterCreate(name=name), db=db)
+
+        etag = (await get_character(1, None, db=db)).headers["ETag"]
+        assert (await get_character(1, if_none_match=etag, db=db)).status_code == 304
+        await update_character(1, CharacterUpdate(level=2), Response(), db=db)
+        response = await get_character(1, if_none_match=etag, db=db)
+        assert json.loads(response.body)["level"] == 2
+        assert response.headers["ETag"] != etag
+
+        first = await character_changes(since=None, limit=2, fields="name", db=db)
+        assert [c["name"] for c in first["characters"]] == ["Ezren", "Kyra"] and first["more"]
+        rest = await character_changes(since=first["version"], limit=2, fields="name", db=db)
+        assert [c["name"] for c in rest["characters"]] == ["Amiri"] and not rest["more"]
+
+        await delete_character(2, db=db)
+        await update_character(3, CharacterUpdate(level=5), Response(), db=db)
+        delta = await character_changes(since=rest["version"], limit=10, fields="level", db=db)
+        assert delta["characters"] == [{"id": 3, "level": 5}]
+        assert delta["deleted"] == [2] and not delta["resync"]
+        empty = await character_changes(since=delta["version"], limit=10, fields=None, db=db)
+        assert empty["characters"] == [] and empty["deleted"] == []
+        assert not (await character_changes(since="0.0", limit=10, fields=None, db=db))["resync"]
+        
+        # Once a deletion is forgotten, older versions have to resync
+        monkeypatch.setattr(characters, "TOMBSTONE_RETENTION", timedelta(0))
+        await delete_character(3, db=db)
+        assert (await character_changes(since="0.0", limit=10, fields=None, db=db))["resync"]
+        latest = await character_changes(since=empty["version"], limit=10, fields=None, db=db)
+        assert latest["deleted"] == [3] and not latest["resync"]
+        # A token from another database (e.g. an old time-based one) is never ahead of the counter
+        assert (await character_changes(since="1700000000000000.0", limit=10, fields=None, db=db))["resync"]
+        await db.bind.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_damage_and_healing_are_clamped_in_one_statement():
+    """Test atomic single and area HP updates"""
+    from sqlalchemy import event
+    from app.services.hit_points import apply_damage, apply_healing
+
+    async def scenario():
+        db = await make_async_session()
+        db.add_all([Character(name=f"PC {i}", hit_points=20, max_hit_points=30) for i in range(4)])
+        await db.commit()
+
+        statements = []
+        event.listen(db.bind.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        characters, missing = await db.run_sync(apply_damage, {1: 12, 2: 12, 3: 6, 4: 25, 99: 5})
+        assert [c["hit_points"] for c in characters] == [8, 8, 14, 0]
+        assert missing == [99]
+        # One statement for every target, after taking the change version
+        assert len(statements) == 2 and "change_counters" in statements[0]
+        assert statements[1].startswith("UPDATE characters")
+
+        characters, _ = await db.run_sync(apply_healing, {1: 50})
+        assert characters[0]["hit_points"] == 30
+        characters, missing = await db.run_sync(apply_damage, {42: 1})
+        assert characters == [] and missing == [42]
+        await db.bind.dispose()
+
+    asyncio.run(scenario())
+
+
+class StreamedBody:
+    """Stand-in for a Request whose body arrives in small chunks"""
+
+    def __init__(self, body: bytes, chunk_size: int = 64):
+        self.body = body
+        self.chunk_size = chunk_size
+
+    async def stream(self):
+        for start in range(0, len(self.body), self.chunk_size):
+            yield self.body[start:start + self.chunk_size]
+
+
+def test_ndjson_import_and_export_round_trip():
+    """Test batched NDJSON import with validation, and streamed export"""
+    from app.api import characters
+    from app.api.characters import export_characters, import_characters
+
+    lines = [json.dumps({"name": f"PC {i}", "level": i % 5 + 1, "inventory": ["Rope"]}) for i in range(12)]
+    lines[3] = '{"level": 2}'
+    lines[7] = "not json"
+    body = "\n".join(lines).encode()
+
+    async def scenario():
+        db = await make_async_session()
+        result = await import_characters(StreamedBody(body), db=db)
+        assert result["imported"] == 10
+        assert [error["line"] for error in result["errors"]] == [4, 8]
+
+        response = await export_characters(fields="name,inventory", db=db)
+        exported = b"".join([chunk async for chunk in response.body_iterator])
+        await db.bind.dispose()
+        return exported
+
+    original = characters.TRANSFER_BATCH_SIZE
+    characters.TRANSFER_BATCH_SIZE = 5
+    try:
+        exported = asyncio.run(scenario())
+    finally:
+        characters.TRANSFER_BATCH_SIZE = original
+
+    rows = [json.loads(line) for line in exported.decode().splitlines()]
+    assert [row["id"] for row in rows] == list(range(1, 11))
+    assert rows[0] == {"id": 1, "name": "PC 0", "inventory": ["Rope"]}
+
+
+
+def test_ndjson_import_reports_an_over_long_line_once():
+    """Test that a line spanning many chunks past the limit is one failure"""
+    from app.api import characters
+    from app.api.characters import import_characters
+    
+    long_line = json.dumps({"name": "Verbose", "backstory": "x" * 1000})
+    body = "\n".join([json.dumps({"name": "Amiri"}), long_line, json.dumps({"name": "Ezren"})]).encode()
+    
+    async def scenario():
+        db = await make_async_session()
+        result = await import_characters(StreamedBody(body, chunk_size=64), db=db)
+        await db.bind.dispose()
+        return result
+    
+    original = characters.MAX_IMPORT_LINE_BYTES
+    characters.MAX_IMPORT_LINE_BYTES = 100
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        characters.MAX_IMPORT_LINE_BYTES = original
+    assert result["imported"] == 2 and result["failed"] == 1
+    assert [error["line"] for error in result["errors"]] == [2]
+
+
+def test_character_cache_invalidation_across_version_tables(tmp_path):
+    """Test read-through caching, write invalidation and the shared version table"""
+    from app.api.characters import CharacterCreate, apply_damage, create_character, DamageRequest, get_character
+    from app.services.character_cache import CharacterCache, SharedVersionTable
+
+    async def scenario():
+        db = await make_async_session()
+        await create_character(CharacterCreate(name="Harsk", max_hit_points=20), db=db)
+        before = character_cache.cache_info()
+        first = await get_character(1, None, db=db)
+        assert (await get_character(1, None, db=db)).body == first.body
+        await apply_damage(1, DamageRequest(damage=5), db=db)
+        assert json.loads((await get_character(1, None, db=db)).body)["hit_points"] == 15
+        info = character_cache.cache_info()
+        assert info["hits"] - before["hits"] == 1 and info["misses"] - before["misses"] == 2
+        await db.bind.dispose()
+
+    asyncio.run(scenario())
+
+    # Two workers mapping the same file see each other's writes
+    path = str(tmp_path / "versions")
+    worker_a = CharacterCache(versions=SharedVersionTable(path, slots=64))
+    worker_b = CharacterCache(versions=SharedVersionTable(path, slots=64))
+    worker_a.put(7, worker_a.version(7), "sheet")
+    assert worker_a.get(7) == "sheet"
+    worker_b.invalidate(7)
+    assert worker_a.get(7) is None
+    version = worker_a.version(7)
+    worker_b.invalidate(7)
+    worker_a.put(7, version, "stale sheet")
+    assert worker_a.get(7) is None and worker_a.cache_info()["stale"] == 1
+    worker_a.versions.close()
+    worker_b.versions.close()
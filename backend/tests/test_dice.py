@@ -117,3 +117,282 @@ def test_all_dice_types():
     for die in dice_types:
         result = service.roll_dice(f"1d{die}")
         assert 1 <= result["rolls"][0] <= die
+
+
+def test_compile_multiple_terms():
+    """Test compiling expressions with several terms"""
+    service = DiceService()
+    expression = service.compile_notation("2d6 + 1d4 + 3")
+    
+    assert expression.num_dice == 3
+    assert expression.modifier == 3
+    assert [term.sides for term in expression.terms] == [6, 4]
+    
+    result = service.roll_dice("2d6+1d4+3")
+    assert len(result["rolls"]) == 3
+    assert result["total"] == sum(result["rolls"]) + 3
+
+
+def test_compile_is_cached():
+    """Test that repeated notations reuse the compiled expression"""
+    service = DiceService()
+    assert service.compile_notation("4d6kh3") is service.compile_notation("4d6kh3")
+    assert service.compile_notation("4D6 KH3") is service.compile_notation("4d6kh3")
+
+
+def test_parse_notation_rejects_complex_expressions():
+    """Test that parse_notation only accepts the XdY+Z form"""
+    service = DiceService()
+    with pytest.raises(ValueError):
+        service.parse_notation("2d6+1d4")
+
+
+def test_keep_highest():
+    """Test keep/drop dice"""
+    service = DiceService()
+    result = service.roll_dice("4d6kh3")
+    
+    kept = result["terms"][0]["kept"]
+    assert len(kept) == 3
+    assert sorted(kept) == sorted(result["rolls"])[1:]
+    assert result["total"] == sum(kept)
+    
+    assert DiceService.calculate_average("4d6kh3") == pytest.approx(12.2446, abs=1e-4)
+    assert DiceService.calculate_average("4d6dl1") == DiceService.calculate_average("4d6kh3")
+    
+    with pytest.raises(ValueError):
+        service.parse_notation("4d6kh5")
+
+
+def test_exploding_dice():
+    """Test exploding dice"""
+    service = DiceService()
+    for _ in range(50):
+        result = service.roll_dice("1d4!")
+        assert result["total"] >= 1
+    
+    assert DiceService.calculate_average("1d6!") == pytest.approx(4.2, abs=1e-6)
+
+
+def test_critical_traits():
+    """Test fatal and deadly traits on critical hits"""
+    service = DiceService()
+    
+    result = service.roll_dice("1d8+4 fatal d12", critical=True)
+    assert result["die_size"] == 12
+    assert len(result["critical_extra_rolls"]) == 1
+    assert result["total"] == (sum(result["rolls"]) + 4) * 2 + result["critical_extra_rolls"][0]
+    
+    # Traits have no effect on a normal hit
+    assert DiceService.calculate_average("1d8+4 fatal d12") == 8.5
+    assert DiceService.calculate_average("1d8+4 fatal d12", critical=True) == 27.5
+    assert DiceService.calculate_average("1d6+2 deadly 2d8", critical=True) == 20.0
+
+    # Fatal upgrades the weapon dice only, not extra damage like sneak attack
+    result = service.roll_dice("1d8+1d6 fatal d12", critical=True)
+    assert [term["dice"] for term in result["terms"]] == ["1d12", "1d6"]
+    assert DiceService.calculate_average("1d8+1d6 fatal d12", critical=True) == 26.5
+
+
+def test_roll_batch_repeated_notation():
+    """Test rolling one notation many times"""
+    service = DiceService()
+    result = service.roll_batch(notation="1d20+5", count=40, detail=True)
+    
+    assert result["count"] == 40
+    assert len(result["totals"]) == 40
+    for total, rolls in zip(result["totals"], result["rolls"]):
+        assert len(rolls) == 1
+        assert total == rolls[0] + 5
+    
+    # The count is checked before the repeated list is built
+    for count in (0, 10 ** 9):
+        with pytest.raises(ValueError):
+            service.roll_batch(notation="1d20", count=count)
+
+
+def test_roll_batch_mixed_notations():
+    """Test rolling a list of different notations"""
+    service = DiceService()
+    notations = ["1d20+3", "2d6", "1d20+3", "4d6kh3"]
+    result = service.roll_batch(notations=notations)
+    
+    assert result["notations"] == notations
+    assert "rolls" not in result
+    assert 4 <= result["totals"][0] <= 23
+    assert 2 <= result["totals"][1] <= 12
+    assert 3 <= result["totals"][3] <= 18
+    
+    with pytest.raises(ValueError):
+        service.roll_batch(notations=[])
+    with pytest.raises(ValueError):
+        service.roll_batch(notations=["2d7"])
+
+
+def test_roll_many_python_fallback():
+    """Test the pure-Python batch path with a seeded generator"""
+    import random
+    from app.services.dice_engine import compile_notation
+    from app.services.dice_vector import roll_many
+    
+    expression = compile_notation("4d6kh3+1")
+    totals, rolls = roll_many(expression, 25, rng=random.Random(7), detail=True)
+    
+    assert len(totals) == 25
+    for total, dice in zip(totals, rolls):
+        assert total == sum(sorted(dice)[1:]) + 1
+    assert roll_many(expression, 25, rng=random.Random(7))[0] == totals
+
+
+def test_distribution_simple():
+    """Test exact distribution for plain dice"""
+    distribution = DiceService.calculate_distribution("2d6+3")
+    
+    assert distribution.minimum == 5
+    assert distribution.maximum == 15
+    assert distribution.probability(10) == pytest.approx(6 / 36)
+    assert distribution.mean == pytest.approx(10.0)
+    assert distribution.chance_to_meet(14) == pytest.approx(3 / 36)
+    assert distribution.percentile(50) == 10
+    assert DiceService.calculate_distribution("2d6+3") is distribution
+
+
+def test_distribution_matches_average():
+    """Test that distribution means agree with calculate_average"""
+    for notation in ["4d6kh3", "2d20kl1", "1d6!", "2d6+1d4-2", "3d8dh1"]:
+        distribution = DiceService.calculate_distribution(notation)
+        assert sum(distribution.probabilities) == pytest.approx(1.0)
+        assert distribution.mean == pytest.approx(DiceService.calculate_average(notation))
+    
+    critical = DiceService.calculate_distribution("1d8+4 fatal d12", critical=True)
+    assert critical.mean == pytest.approx(27.5)
+    assert critical.minimum == 11
+
+
+def test_distribution_large_dice_count():
+    """Test distribution for many dice"""
+    distribution = DiceService.calculate_distribution("100d100")
+    
+    assert distribution.minimum == 100
+    assert distribution.maximum == 10000
+    assert distribution.mean == pytest.approx(5050.0)
+    assert distribution.percentile(50) in (5050, 5051)
+
+
+def test_roll_history_is_bounded():
+    """Test that history keeps only the most recent rolls"""
+    service = DiceService(history_capacity=5)
+    for _ in range(12):
+        service.roll_dice("1d20")
+    
+    history = service.get_history()
+    assert len(history) == 5
+    assert [entry["id"] for entry in history] == [12, 11, 10, 9, 8]
+
+
+def test_roll_history_pagination():
+    """Test cursor pagination over roll history"""
+    service = DiceService(history_capacity=10)
+    for _ in range(7):
+        service.roll_dice("2d6")
+    
+    page = service.history_page(limit=3)
+    assert [entry["id"] for entry in page["history"]] == [7, 6, 5]
+    assert page["retained"] == 7
+    
+    page = service.history_page(cursor=page["next_cursor"], limit=3)
+    assert [entry["id"] for entry in page["history"]] == [4, 3, 2]
+    
+    page = service.history_page(cursor=page["next_cursor"], limit=3)
+    assert [entry["id"] for entry in page["history"]] == [1]
+    assert page["next_cursor"] is None
+
+
+def test_roll_history_per_table():
+    """Test that each table keeps its own history"""
+    service = DiceService()
+    service.roll_dice("1d20", table_id="alpha")
+    service.roll_with_advantage(table_id="beta")
+    service.roll_with_advantage(table_id="beta")
+    
+    assert len(service.get_history(table_id="alpha")) == 1
+    beta = service.get_history(table_id="beta")
+    assert len(beta) == 2
+    assert beta[0]["type"] == "advantage"
+    assert beta[0]["total"] == max(beta[0]["rolls"])
+    assert service.get_history() == []
+    
+    # Reading unknown tables neither creates them nor evicts live ones
+    service.histories.max_tables = 2
+    for table_id in range(10):
+        assert service.history_page(table_id=f"probe-{table_id}")["retained"] == 0
+    assert service.histories.tables() == ["alpha", "beta"]
+    assert len(service.get_history(table_id="alpha")) == 1
+
+
+def test_seeded_rolls_are_reproducible():
+    """Test that a per-request seed reproduces the same rolls"""
+    service = DiceService()
+    first = service.roll_dice("4d6kh3+2", seed=1234)
+    second = service.roll_dice("4d6kh3+2", seed=1234)
+    assert first["rolls"] == second["rolls"]
+    assert first["seed"] == 1234
+    
+    batch = service.roll_batch(notation="1d20", count=30, seed=99)
+    assert service.roll_batch(notation="1d20", count=30, seed=99)["totals"] == batch["totals"]
+
+
+def test_table_stream_replay():
+    """Test that re-seeding a table replays its rolls exactly"""
+    from app.services.rng import RngRegistry
+    
+    service = DiceService(streams=RngRegistry())
+    seed = service.reseed("replay-table", 42)
+    
+    def session():
+        rolls = [service.roll_dice("1d20", table_id="replay-table")["total"]]
+        rolls.append(service.roll_with_advantage(table_id="replay-table")["result"])
+        rolls.extend(service.roll_batch(notation="2d6", count=5, table_id="replay-table")["totals"])
+        return rolls
+    
+    original = session()
+    service.reseed("replay-table", seed)
+    assert session() == original
+
+
+def test_live_seed_is_only_revealed_once_the_session_ends():
+    """Test that reads never expose or create a live stream, and eviction keeps the old seed"""
+    from app.services.rng import RngRegistry
+    
+    service = DiceService(streams=RngRegistry(max_tables=2))
+    assert service.session_info("quiet") is None
+    assert service.streams.peek("quiet") is None
+    
+    service.roll_dice("1d20", table_id="quiet")
+    assert service.session_info("quiet") == {"active": True, "seed": None}
+    
+    seed = service.end_session("quiet")
+    assert service.session_info("quiet") == {"active": False, "seed": seed}
+    assert service.end_session("quiet") is None
+    
+    # Re-seeding or evicting a live stream ends its session too
+    first = service.reseed("busy", 5)
+    service.reseed("busy", 6)
+    assert service.session_info("busy") == {"active": True, "seed": first}
+    service.roll_dice("1d20", table_id="other")
+    service.roll_dice("1d20", table_id="third")
+    assert service.session_info("busy") == {"active": False, "seed": 6}
+
+
+def test_rng_spawn_is_deterministic():
+    """Test that child streams depend only on the parent seed and key"""
+    from app.services.rng import RngStream
+    
+    parent = RngStream(7)
+    parent.randint(1, 100)
+    child = parent.spawn("encounters")
+    assert child is parent.spawn("encounters")
+    
+    fresh = RngStream(7).spawn("encounters")
+    assert [child.randint(1, 1000) for _ in range(5)] == [fresh.randint(1, 1000) for _ in range(5)]
+    assert RngStream(7).spawn("other").seed != fresh.seed
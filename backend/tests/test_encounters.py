@@ -0,0 +1,234 @@
+"""
+Tests for encounter generation service
+"""
+
+import pytest
+from app.services.encounter_builder import EncounterSolver, build_xp_table
+from app.services.encounter_service import EncounterService
+from app.services.rng import RngStream
+from app.services.worker_pool import WorkerPool
+
+
+def test_encounter_fits_budget_exactly():
+    """Test that generated encounters spend the whole XP budget"""
+    service = EncounterService()
+    for party_level in range(1, 6):
+        encounter = service.generate_encounter(party_level, 4, "moderate", seed=party_level)
+        assert encounter["total_xp"] == encounter["xp_budget"]
+        assert encounter["monster_count"] <= 8
+
+
+def test_encounter_never_exceeds_budget():
+    """Test that the closest total under budget is used when nothing fits exactly"""
+    service = EncounterService()
+    encounter = service.generate_encounter(10, 4, "extreme", seed=3)
+    assert 0 < encounter["total_xp"] <= encounter["xp_budget"]
+
+
+def test_seeded_encounters_are_reproducible():
+    """Test that a seed reproduces the same encounter"""
+    service = EncounterService()
+    first = service.generate_encounter(3, 4, "severe", seed=11)
+    second = service.generate_encounter(3, 4, "severe", seed=11)
+    assert first == second
+
+
+def test_encounter_constraints():
+    """Test required types, duplicate and count constraints"""
+    service = EncounterService()
+    encounter = service.generate_encounter(
+        3, 4, "severe",
+        seed=5,
+        required_types=["Undead", "dragon"],
+        allow_duplicates=False,
+        max_monsters=5,
+    )
+    types = {m["type"] for m in encounter["monsters"]}
+    names = [m["name"] for m in encounter["monsters"]]
+    
+    assert {"Undead", "Dragon"} <= types
+    assert len(names) == len(set(names))
+    assert encounter["monster_count"] <= 5
+    
+    with pytest.raises(ValueError):
+        service.generate_encounter(1, 4, "moderate", required_types=["Dragon"])
+    with pytest.raises(ValueError):
+        service.generate_encounter(1, 4, "impossible")
+
+
+def test_solver_counts_and_samples_uniformly():
+    """Test that the solver counts multisets and samples each of them"""
+    monsters = [
+        {"name": "a", "xp": 10, "type": "x"},
+        {"name": "b", "xp": 10, "type": "x"},
+        {"name": "c", "xp": 20, "type": "y"},
+    ]
+    solver = EncounterSolver(build_xp_table(monsters), 40, max_count=4)
+    
+    # aaaa aaab aabb abbb bbbb aac abc bbc cc
+    assert solver.count() == 9
+    
+    rng = RngStream(1)
+    seen = {tuple(sorted(m["name"] for m in solver.sample(rng))) for _ in range(500)}
+    assert len(seen) == 9
+
+
+def test_combat_simulation_is_reproducible_and_bounded():
+    """Test Monte Carlo combat estimates"""
+    from types import SimpleNamespace
+    from app.services.bestiary import get_monster_by_name
+    from app.services.combat_simulator import Combatant, CombatSimulator, wilson_interval
+    
+    pc = SimpleNamespace(
+        name="Fighter", level=3, strength=16, dexterity=14,
+        hit_points=45, max_hit_points=45, armor_class=19, initiative=6,
+    )
+    party = [Combatant.from_character(pc) for _ in range(4)]
+    simulator = CombatSimulator(workers=0)
+    
+    rat = [Combatant.from_monster(get_monster_by_name("Giant Rat"))]
+    easy = simulator.simulate(party, rat, seed=5)
+    again = simulator.simulate(party, rat, seed=5)
+    assert easy["win_rate"] > 0.99
+    assert easy["stopped"] == "confidence"
+    assert again["trials"] == easy["trials"]
+    assert again["expected_rounds"] == easy["expected_rounds"]
+    
+    dragon = [Combatant.from_monster(get_monster_by_name("Adult Dragon"))]
+    deadly = simulator.simulate(party, dragon, max_trials=2000, seed=5)
+    assert deadly["win_rate"] < easy["win_rate"]
+    assert deadly["pc_death_probability"] > 0.5
+    assert deadly["trials"] <= 2000
+    
+    low, high = wilson_interval(50, 100)
+    assert low < 0.5 < high
+    
+    with pytest.raises(ValueError):
+        simulator.simulate([], dragon)
+    
+    # Pooled chunks are counted in order, so a seeded run stops at the same chunk
+    golem = [Combatant.from_monster(get_monster_by_name("Stone Golem"))]
+    pool = WorkerPool(processes=3)
+    try:
+        parallel = CombatSimulator(workers=3, pool=pool).simulate(
+            party, golem, max_trials=6000, time_budget=60, precision=0.015, seed=9
+        )
+    finally:
+        pool.shutdown()
+    serial = simulator.simulate(party, golem, max_trials=6000, time_budget=60, precision=0.015, seed=9)
+    assert parallel["stopped"] == serial["stopped"] == "confidence"
+    assert 1000 < serial["trials"] < 6000
+    for result in (parallel, serial):
+        del result["elapsed_ms"]
+    assert parallel == serial
+    
+    # A cold pool does not stretch the time budget: the first chunk runs inline
+    pool = WorkerPool(processes=2)
+    try:
+        cold = CombatSimulator(workers=2, pool=pool).simulate(party, golem, time_budget=0.01, seed=9)
+    finally:
+        pool.shutdown()
+    quick = simulator.simulate(party, golem, time_budget=0.01, seed=9)
+    assert cold["stopped"] == quick["stopped"] == "time_budget"
+    assert cold["elapsed_ms"] < 1000
+    for result in (cold, quick):
+        del result["elapsed_ms"]
+    assert cold == quick
+
+
+def test_batch_generation_matches_single_encounters():
+    """Test that batch entries are reproducible one by one from their seeds"""
+    service = EncounterService(workers=0)
+    specs = [
+        {"party_level": 3},
+        {"party_level": 5, "difficulty": "severe"},
+        {"party_level": 99},
+        {"party_level": 3},
+    ]
+    results = sorted(service.generate_batch(specs=specs, seed=7), key=lambda r: r["index"])
+    
+    assert [r["index"] for r in results] == [0, 1, 2, 3]
+    assert "No suitable monsters" in results[2]["error"]
+    for spec, result in zip(specs, results):
+        if "error" in result:
+            continue
+        single = service.generate_encounter(seed=result["seed"], **spec)
+        assert single["monsters"] == result["encounter"]["monsters"]
+    
+    again = sorted(service.generate_batch(specs=specs, seed=7), key=lambda r: r["index"])
+    assert again == results
+    
+    # The shared worker pool gives the same batch
+    pool = WorkerPool(processes=2)
+    try:
+        pooled = EncounterService(workers=2, pool=pool).generate_batch(specs=specs, seed=7)
+        assert sorted(pooled, key=lambda r: r["index"]) == results
+    finally:
+        pool.shutdown()
+    
+    for count in (0, 10 ** 9):
+        with pytest.raises(ValueError):
+            service.generate_batch(spec={"party_level": 1}, count=count)
+    [empty_party] = service.generate_batch(specs=[{"party_level": 3, "party_size": 0}])
+    assert empty_party["error"] == "Party size must be at least 1"
+
+
+def test_candidate_pool_cache_reuses_and_invalidates():
+    """Test that repeated specs hit the cache and a bestiary reload clears it"""
+    from app.services.bestiary import BESTIARY
+    from app.services.bestiary_store import Bestiary
+    
+    bestiary = Bestiary(BESTIARY, data_dir=None)
+    cached = EncounterService(bestiary=bestiary, workers=0)
+    uncached = EncounterService(bestiary=bestiary, workers=0, cache_size=0)
+    
+    for seed in range(5):
+        assert cached.generate_encounter(4, 4, "severe", seed=seed) == uncached.generate_encounter(4, 4, "severe", seed=seed)
+    info = cached.cache_info()
+    assert info["misses"] == 2  # one candidate pool, one solver
+    assert info["hits"] == 8
+    
+    bestiary.reload()
+    cached.generate_encounter(4, 4, "severe", seed=0)
+    info = cached.cache_info()
+    assert info["generation"] == bestiary.generation
+    assert info["misses"] == 4
+
+
+def test_reload_route_invalidates_solvers_and_encoded_payloads(tmp_path, monkeypatch):
+    """Test that the admin reload route reaches every generation-keyed cache"""
+    import asyncio
+    import json
+    from app.api import encounters
+    from app.responses import EncodedCache
+    from app.services import bestiary as bestiary_module
+    from app.services.bestiary import BESTIARY
+    from app.services.bestiary_store import Bestiary
+    
+    dump = tmp_path / "giants.ndjson"
+    dump.write_text(json.dumps({"name": "Cave Troll", "cr": 3, "type": "Giant", "hp": 60}) + "\n")
+    extended = Bestiary(BESTIARY, data_dir=str(tmp_path))
+    service = EncounterService(bestiary=extended, workers=0)
+    monkeypatch.setattr(bestiary_module, "bestiary", extended)
+    monkeypatch.setattr(encounters, "bestiary", extended)
+    monkeypatch.setattr(encounters, "bestiary_payloads", EncodedCache(extended, max_size=8))
+    monkeypatch.setattr(encounters, "encounter_service", service)
+    
+    def giants():
+        response = asyncio.run(encounters.get_monsters_by_type_endpoint("giant", if_none_match=None))
+        return {m["name"] for m in json.loads(response.body)["monsters"]}
+    
+    assert "Cave Troll" in giants()
+    service.generate_encounter(4, 4, "severe", seed=0)
+    service.generate_encounter(4, 4, "severe", seed=1)
+    assert service.cache_info()["misses"] == 2
+    
+    dump.write_text(json.dumps({"name": "Hill Titan", "cr": 3, "type": "Giant", "hp": 90}) + "\n")
+    reloaded = asyncio.run(encounters.reload_bestiary_endpoint())
+    assert reloaded == {"count": len(BESTIARY) + 1, "generation": extended.generation}
+    
+    assert "Hill Titan" in giants() and "Cave Troll" not in giants()
+    service.generate_encounter(4, 4, "severe", seed=0)
+    info = service.cache_info()
+    assert info["generation"] == extended.generation
+    assert info["misses"] == 4
@@ -0,0 +1,188 @@
+"""
+Tests for the initiative tracker
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from app.api.initiative import CombatRequest, end_combat, get_combat, load_tracker, next_turn, save, start_combat
+from app.database import Base
+from app.services.dice_service import DiceService
+from app.services.initiative_tracker import (
+    MONSTER, PC, InitiativeService, InitiativeTracker, initiative_service,
+)
+
+
+def make_tracker():
+    tracker = InitiativeTracker()
+    tracker.add("Valeros", PC, 5, 20)
+    tracker.add("Goblin", MONSTER, 3, 20)
+    tracker.add("Ezren", PC, 2, 12)
+    tracker.add("Ogre", MONSTER, 7, 8)
+    return tracker
+
+
+def test_turn_order_rounds_and_ties():
+    """Test that higher initiative acts first, monsters win ties, and rounds wrap"""
+    tracker = make_tracker()
+    names = [tracker.advance().name for _ in range(5)]
+    assert names == ["Goblin", "Valeros", "Ezren", "Ogre", "Goblin"]
+    assert tracker.round == 2
+    assert tracker.up_next().name == "Valeros"
+
+
+def test_add_remove_mid_round():
+    """Test summons joining mid-round and lazy removal"""
+    tracker = make_tracker()
+    tracker.advance()  # Goblin
+    tracker.advance()  # Valeros
+    tracker.add("Summoned Wolf", PC, 1, 15)   # comes up later this round
+    tracker.add("Imp", MONSTER, 6, 25)        # already passed: next round
+    tracker.remove(3)  # Ezren drops out
+    names = [tracker.advance().name for _ in range(5)]
+    assert names == ["Summoned Wolf", "Ogre", "Imp", "Goblin", "Valeros"]
+    with pytest.raises(ValueError):
+        tracker.remove(3)
+
+
+def test_delay_resume_and_ready():
+    """Test Delay moving a combatant permanently behind a later turn"""
+    tracker = make_tracker()
+    goblin = tracker.advance()
+    with pytest.raises(ValueError):
+        tracker.delay(4)  # not the Ogre's turn
+    tracker.ready(goblin.id, "when a PC moves adjacent")
+    valeros = tracker.advance()
+    tracker.delay(valeros.id)
+    with pytest.raises(ValueError):
+        tracker.resume(valeros.id)  # not in the turn it delayed
+    assert tracker.advance().name == "Ezren"
+    tracker.resume(valeros.id)
+    assert tracker.up_next().name == "Valeros"
+    names = [tracker.advance().name for _ in range(5)]
+    assert names == ["Valeros", "Ogre", "Goblin", "Ezren", "Valeros"]
+    assert tracker.participants[goblin.id].readied is None
+
+
+def test_snapshot_round_trip_and_batch_rolls():
+    """Test snapshots restore the same order, and initiative is rolled in one batch"""
+    tracker = make_tracker()
+    tracker.advance()
+    tracker.remove(4)
+    restored = InitiativeTracker.from_snapshot(tracker.snapshot())
+    assert restored.order() == tracker.order()
+    assert [restored.advance().name for _ in range(3)] == [tracker.advance().name for _ in range(3)]
+
+    dice = DiceService()
+    service = InitiativeService(dice)
+    combatants = [{"name": f"Skeleton {i}", "side": MONSTER, "modifier": 2} for i in range(60)]
+    combatants.append({"name": "Kyra", "side": PC, "modifier": 1, "initiative": 30})
+    big = service.start(combatants, table_id="battle", seed=7)
+    assert big.participants[big.current].name == "Kyra"
+    assert len(dice.history("battle")) == 60
+    assert all(3 <= p.initiative <= 22 for p in big.participants.values() if p.side == MONSTER)
+    order = big.order()["this_round"]
+    keys = [(-p["initiative"], -p["modifier"]) for p in order]
+    assert keys == sorted(keys)
+
+
+def test_service_evicts_least_recently_used_table():
+    """Test that only max_tables combats stay in memory"""
+    service = InitiativeService(DiceService(), max_tables=2)
+    first, second, third = InitiativeTracker(), InitiativeTracker(), InitiativeTracker()
+    service.put("a", first)
+    service.put("b", second)
+    assert service.get("a") is first
+    service.put("c", third)
+    assert service.tables() == ["a", "c"]
+    service.discard("a", second)  # no longer a's tracker: kept
+    assert service.get("a") is first
+
+
+def test_saves_are_versioned_across_workers():
+    """Test that a stale in-memory combat is reloaded and never overwrites a newer one"""
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        db = AsyncSession(engine, expire_on_commit=False)
+        request = CombatRequest(combatants=[
+            {"name": "Valeros", "side": PC, "initiative": 20},
+            {"name": "Goblin", "side": MONSTER, "initiative": 15},
+            {"name": "Ezren", "side": PC, "initiative": 10},
+        ])
+        await start_combat("versioned", request, db=db)
+        stale = initiative_service.get("versioned")
+        assert stale.version == 1
+        
+        # Another worker advances the combat from the snapshot
+        initiative_service.end("versioned")
+        assert (await next_turn("versioned", db=db))["current"]["name"] == "Goblin"
+        initiative_service.put("versioned", stale)
+        
+        # This worker's stale copy is replaced rather than acted on
+        summary = await next_turn("versioned", db=db)
+        assert summary["current"]["name"] == "Ezren"
+        assert initiative_service.get("versioned").version == 3
+        
+        # A write based on an older version is refused and the copy dropped
+        stale = InitiativeTracker.from_snapshot(stale.snapshot())
+        stale.version = 1
+        initiative_service.put("versioned", stale)
+        with pytest.raises(HTTPException) as conflict:
+            await save("versioned", stale, db)
+        assert conflict.value.status_code == 409
+        assert initiative_service.get("versioned") is None
+        assert (await get_combat("versioned", db=db))["round"] == 1
+        
+        # Ending the combat while a request holds its tracker does not revive it
+        tracker = await load_tracker("versioned", db)
+        await end_combat("versioned", db=db)
+        with pytest.raises(HTTPException) as ended:
+            await save("versioned", tracker, db)
+        assert ended.value.status_code == 409
+        with pytest.raises(HTTPException) as missing:
+            await get_combat("versioned", db=db)
+        assert missing.value.status_code == 404
+        
+        await db.close()
+        await engine.dispose()
+    
+    asyncio.run(scenario())
+
+
+def test_failed_commit_drops_changed_tracker():
+    """Test that a change whose save fails is not served from memory"""
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        db = AsyncSession(engine, expire_on_commit=False)
+        request = CombatRequest(combatants=[
+            {"name": "A", "side": PC, "initiative": 20},
+            {"name": "B", "side": MONSTER, "initiative": 15},
+        ])
+        await start_combat("unsaved", request, db=db)
+        
+        async def locked():
+            raise OperationalError("COMMIT", {}, Exception("database is locked"))
+        
+        commit, db.commit = db.commit, locked
+        with pytest.raises(OperationalError):
+            await next_turn("unsaved", db=db)
+        db.commit = commit
+        await db.rollback()
+        assert initiative_service.get("unsaved") is None
+        combat = await get_combat("unsaved", db=db)
+        assert combat["current"]["name"] == "A"
+        assert initiative_service.get("unsaved").version == 1
+        
+        await db.close()
+        await engine.dispose()
+    
+    asyncio.run(scenario())
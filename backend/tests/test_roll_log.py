@@ -0,0 +1,78 @@
+"""
+Tests for the persistent roll log
+"""
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.services.dice_service import DiceService
+from app.services.roll_log import RollLogWriter, query_roll_log
+
+
+def make_engine():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def test_writer_batches_rolls():
+    """Test that queued rolls are written in batches"""
+    engine = make_engine()
+    writer = RollLogWriter(bind=engine, flush_interval=0.01, max_batch_rows=50)
+    writer.start()
+    
+    service = DiceService()
+    service.roll_log = writer
+    service.roll_dice("1d20", table_id="alpha")
+    service.roll_batch(notation="2d6", count=120, table_id="beta")
+    
+    assert writer.flush()
+    writer.stop()
+    assert writer.written == 121
+    
+    db = sessionmaker(bind=engine)()
+    alpha = query_roll_log(table_id="alpha", db=db)
+    assert len(alpha) == 1
+    assert alpha[0]["notation"] == "1d20"
+    assert alpha[0]["total"] == alpha[0]["rolls"][0]
+    assert len(query_roll_log(table_id="beta", limit=500, db=db)) == 120
+    db.close()
+
+
+def test_writer_flushes_on_stop():
+    """Test that stopping the writer persists pending rolls"""
+    engine = make_engine()
+    writer = RollLogWriter(bind=engine, flush_interval=10)
+    writer.start()
+    for _ in range(3):
+        writer.submit("default", "1d4", 2, [2])
+    writer.stop()
+    
+    db = sessionmaker(bind=engine)()
+    assert len(query_roll_log(db=db)) == 3
+    db.close()
+
+
+def test_writer_bounds_queue_and_truncates_long_values():
+    """Test that a full queue drops rolls and over-long notations still insert"""
+    engine = make_engine()
+    writer = RollLogWriter(bind=engine, flush_interval=10, max_pending=5)
+    for _ in range(8):
+        writer.submit("default", "1d4", 2, [2])
+    assert writer.dropped == 3
+    
+    writer.start()
+    assert writer.flush()
+    writer.submit("t" * 300, "1d4+" + "1" * 300, 2, [2])
+    writer.stop()
+    assert writer.written == 6 and writer.failed == 0
+    
+    db = sessionmaker(bind=engine)()
+    assert len(query_roll_log(db=db)[0]["notation"]) == 100
+    db.close()
@@ -0,0 +1,145 @@
+"""
+Tests for live table sessions
+"""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from app.services.dice_service import DiceService
+from app.services.table_hub import RESYNC, Subscriber, TableHub
+
+
+def test_subscriber_coalesces_and_resyncs_when_behind():
+    """Test per-connection coalescing and the bounded queue"""
+    subscriber = Subscriber(max_pending=3)
+    subscriber.offer("roll 1")
+    subscriber.offer("hp 10", key=("hit_points", 1))
+    subscriber.offer("hp 7", key=("hit_points", 1))
+    assert list(subscriber.pending.values()) == ["roll 1", "hp 7"]
+    assert subscriber.coalesced == 1
+    
+    subscriber.offer("roll 2")
+    subscriber.offer("roll 3")
+    assert list(subscriber.pending.values()) == [RESYNC]
+    assert subscriber.resyncs == 1
+
+
+def test_table_session_fans_out_to_one_table():
+    """Test broadcasting dice rolls and other events to everyone at a table"""
+    hub = TableHub()
+    dice = DiceService()
+    dice.hub = hub
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        hub.start()
+        yield
+        hub.stop()
+    
+    app = FastAPI(lifespan=lifespan)
+    
+    @app.websocket("/ws/{table_id}")
+    async def session(websocket: WebSocket, table_id: str):
+        await hub.serve(websocket, table_id)
+    
+    @app.post("/roll/{table_id}")
+    async def roll(table_id: str):
+        return dice.roll_dice("1d20+2", table_id=table_id)
+    
+    @app.post("/hit_points/{table_id}")
+    async def hit_points(table_id: str):
+        hub.publish(table_id, "hit_points", {"id": 1, "hit_points": 7}, key=("hit_points", 1))
+    
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/crypt") as first, \
+                client.websocket_connect("/ws/crypt") as second, \
+                client.websocket_connect("/ws/elsewhere") as other:
+            assert hub.stats()["tables"] == {"crypt": 2, "elsewhere": 1}
+            client.post("/roll/crypt")
+            client.post("/hit_points/crypt")
+            client.post("/roll/elsewhere")
+            
+            for socket in (first, second):
+                events = [json.loads(socket.receive_text()) for _ in range(2)]
+                assert [event["type"] for event in events] == ["roll", "hit_points"]
+                assert events[0]["data"]["notation"] == "1d20+2"
+                assert events[1] == {"type": "hit_points", "table_id": "crypt", "data": {"id": 1, "hit_points": 7}}
+            assert json.loads(other.receive_text())["table_id"] == "elsewhere"
+    assert hub.stats()["connections"] == 0
+
+
+class FailingSocket:
+    """Stand-in for a WebSocket whose sends fail with an unexpected error"""
+    
+    def __init__(self):
+        self.closed = asyncio.Event()
+    
+    async def accept(self):
+        pass
+    
+    async def receive(self):
+        await self.closed.wait()
+        return {"type": "websocket.disconnect"}
+    
+    async def send_text(self, message):
+        raise ValueError("encoder exploded")
+    
+    async def close(self):
+        self.closed.set()
+
+
+def test_failed_send_closes_and_unsubscribes():
+    """Test that any send error ends the session instead of leaving it silent"""
+    async def scenario():
+        hub = TableHub()
+        hub.start()
+        socket = FailingSocket()
+        session = asyncio.create_task(hub.serve(socket, "crypt"))
+        await asyncio.sleep(0)
+        assert hub.stats()["connections"] == 1
+        hub.publish("crypt", "roll", {"total": 12})
+        await asyncio.wait_for(session, timeout=5)
+        assert socket.closed.is_set()
+        assert hub.stats()["connections"] == 0
+    
+    asyncio.run(scenario())
+
+
+def test_batch_encounters_reach_the_table(monkeypatch):
+    """Test that every streamed batch encounter is broadcast like a single one"""
+    from app.api import encounters
+    from app.services.encounter_service import EncounterService
+    
+    hub = TableHub()
+    monkeypatch.setattr(encounters, "table_hub", hub)
+    monkeypatch.setattr(encounters, "encounter_service", EncounterService(workers=0))
+    
+    @asynccontextmanager
+    async def lifespan(app):
+        hub.start()
+        yield
+        hub.stop()
+    
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(encounters.router, prefix="/encounters")
+    
+    @app.websocket("/ws/{table_id}")
+    async def session(websocket: WebSocket, table_id: str):
+        await hub.serve(websocket, table_id)
+    
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/crypt") as socket:
+            response = client.post("/encounters/generate/batch", json={
+                "specs": [{"party_level": 2}, {"party_level": 99}, {"party_level": 4}],
+                "seed": 3,
+                "table_id": "crypt",
+            })
+            streamed = [json.loads(line) for line in response.text.splitlines()]
+            expected = sorted(json.dumps(r["encounter"], sort_keys=True) for r in streamed if "encounter" in r)
+            events = [json.loads(socket.receive_text()) for _ in range(2)]
+            assert {event["type"] for event in events} == {"encounter"}
+            assert sorted(json.dumps(e["data"], sort_keys=True) for e in events) == expected